@@ -0,0 +1,346 @@
+"""
+Пакетное извлечение глубины из записанных поездок (видеофайлы и папки с картинками).
+
+Кадры читаются генератором в отдельном потоке, препроцессинг идёт в пуле
+потоков, модель получает батчи. Глубина (float16, разрешение сети) пишется
+сразу на диск — в memory-mapped .npy или в отдельные .npy-чанки, так что
+длинная запись никогда не лежит в памяти целиком. Повторный запуск с теми же
+аргументами продолжает с места остановки: рядом с выходом хранится номер
+следующего непрочитанного кадра источника (source_pos). Он не равен числу
+записанных depth-карт, если какие-то картинки не прочитались.
+
+Все depth-карты источника в выходе одного размера — как у первого кадра.
+Кадр другого размера (папка со снимками разных камер) считается сетью как
+есть, а его depth масштабируется к этому размеру.
+
+    python BatchDepth.py drive1.mp4 frames_dir/ -o out/ --batch-size 4 --format chunks
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import torch
+
+from DepthEstimator import DepthEstimator, parse_resolution
+from FrameSource import count_frames, iter_frames
+
+_END = object()
+
+
+def threaded_iter(iterable, maxsize):
+    """Крутит генератор в отдельном потоке (декодирование параллельно с моделью)."""
+    q = queue.Queue(maxsize)
+
+    def produce():
+        try:
+            for item in iterable:
+                q.put(item)
+        except Exception as e:  # пробрасываем ошибку чтения в основной поток
+            q.put(e)
+        q.put(_END)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item = q.get()
+        if item is _END:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+def bounded_map(pool, fn, iterable, prefetch):
+    """Как pool.map, но держит в работе не больше prefetch задач и сохраняет порядок."""
+    pending = deque()
+    for item in iterable:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= prefetch:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def batched(iterable, size, key=None):
+    """Режет поток на батчи по size; при смене key (например, формы входа) начинает новый батч."""
+    batch = []
+    batch_key = None
+    for item in iterable:
+        item_key = key(item) if key is not None else None
+        if batch and item_key != batch_key:
+            yield batch
+            batch = []
+        batch.append(item)
+        batch_key = item_key
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def fit_depth(depth_batch, shape):
+    """Depth-карты батча (N, H, W) -> (N, *shape), билинейно; того же размера — как есть."""
+    shape = tuple(shape)
+    if depth_batch.shape[1:] == shape:
+        return depth_batch
+    return np.stack([
+        cv2.resize(depth.astype(np.float32), shape[::-1], interpolation=cv2.INTER_LINEAR)
+        for depth in depth_batch
+    ]).astype(depth_batch.dtype)
+
+
+class NpyWriter:
+    """
+    Один memory-mapped .npy (N, H', W') float16 на источник + <имя>.npy.json с прогрессом рядом.
+    N берётся из числа кадров файла; если видео оказалось короче (или часть
+    картинок не прочиталась), лишнее остаётся нулями, а реальное число кадров
+    записано в frames_done.
+    """
+
+    def __init__(self, path, total):
+        self.path = path
+        self.meta_path = path + ".json"
+        self.total = total
+        self.array = None
+        self.meta = {"frames_done": 0, "total": total}
+        if os.path.exists(self.meta_path) and os.path.exists(self.path):
+            with open(self.meta_path) as f:
+                self.meta = json.load(f)
+
+    @property
+    def frames_done(self):
+        return self.meta["frames_done"]
+
+    @property
+    def source_pos(self):
+        """Номер кадра источника, с которого продолжать (старые meta — без него)."""
+        return self.meta.get("source_pos", self.frames_done)
+
+    @property
+    def depth_shape(self):
+        """(H', W') depth-карт в файле или None, пока ничего не записано."""
+        shape = self.meta.get("depth_shape")
+        return tuple(shape) if shape else None
+
+    def write(self, depth_batch, frame_size, positions):
+        """positions — номера кадров источника для depth_batch."""
+        if self.array is None:
+            shape = (self.total,) + depth_batch.shape[1:]
+            if os.path.exists(self.path) and self.frames_done:
+                self.array = np.load(self.path, mmap_mode="r+")
+            else:
+                self.array = np.lib.format.open_memmap(self.path, mode="w+", dtype=np.float16, shape=shape)
+            self.meta.update(depth_shape=list(shape[1:]), frame_size=list(frame_size))
+
+        start = self.frames_done
+        n = min(len(depth_batch), self.total - start)
+        self.array[start:start + n] = depth_batch[:n]
+        self.meta["frames_done"] = start + n
+        if n:
+            self.meta["source_pos"] = positions[n - 1] + 1
+        self._save_meta()
+        return n
+
+    def _save_meta(self):
+        self.array.flush()
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self.meta_path)
+
+    def close(self):
+        if self.array is not None:
+            self.array.flush()
+            del self.array
+            self.array = None
+
+
+class ChunkWriter:
+    """
+    Папка с чанками chunk_00000000.npy (по chunk_size кадров), номер в имени —
+    индекс первого кадра. Чанк сначала пишется во временный файл, поэтому
+    на диске бывают только целые чанки, и продолжение начинается после последнего.
+    meta.json после каждого чанка: frames_done и source_pos (номер следующего
+    кадра источника).
+    """
+
+    def __init__(self, folder, chunk_size):
+        self.folder = folder
+        self.chunk_size = chunk_size
+        os.makedirs(folder, exist_ok=True)
+        chunks = sorted(name for name in os.listdir(folder) if name.startswith("chunk_") and name.endswith(".npy"))
+        self._frames_done = 0
+        self._depth_shape = None
+        self._frame_size = None
+        if chunks:
+            last = chunks[-1]
+            last_chunk = np.load(os.path.join(folder, last), mmap_mode="r")
+            self._frames_done = int(last[6:-4]) + len(last_chunk)
+            self._depth_shape = last_chunk.shape[1:]
+        self._source_pos = self._frames_done
+        meta_path = os.path.join(folder, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            # meta.json пишется после чанка: если он отстал (обрыв между ними), верим чанкам
+            if meta.get("frames_done") == self._frames_done:
+                self._source_pos = meta.get("source_pos", self._frames_done)
+                self._frame_size = meta.get("frame_size")
+        self._buffer = []
+        self._positions = []
+
+    @property
+    def frames_done(self):
+        return self._frames_done + len(self._buffer)
+
+    @property
+    def source_pos(self):
+        """Номер кадра источника, с которого продолжать: после последнего целого чанка."""
+        return self._source_pos
+
+    @property
+    def depth_shape(self):
+        """(H', W') depth-карт в чанках или None, пока ничего не записано."""
+        return self._depth_shape
+
+    def write(self, depth_batch, frame_size, positions):
+        """positions — номера кадров источника для depth_batch."""
+        if self._depth_shape is None:
+            self._depth_shape = depth_batch.shape[1:]
+            self._frame_size = frame_size
+        for depth, position in zip(depth_batch, positions):
+            self._buffer.append(depth)
+            self._positions.append(position)
+            if len(self._buffer) == self.chunk_size:
+                self._flush()
+        return len(depth_batch)
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        path = os.path.join(self.folder, f"chunk_{self._frames_done:08d}.npy")
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, np.stack(self._buffer))
+        os.replace(tmp, path)
+        self._frames_done += len(self._buffer)
+        self._source_pos = self._positions[-1] + 1
+        self._buffer = []
+        self._positions = []
+
+        with open(os.path.join(self.folder, "meta.json"), "w") as f:
+            json.dump({"frames_done": self._frames_done, "source_pos": self._source_pos,
+                       "frame_size": list(self._frame_size)}, f)
+
+    def close(self):
+        self._flush()
+
+
+def output_name(source):
+    name = os.path.basename(os.path.normpath(str(source)))
+    return os.path.splitext(name)[0] or "source"
+
+
+def process_source(estimator, source, args, pool, local):
+    if args.format == "npy":
+        total = count_frames(source)
+        if total is None:
+            raise ValueError(f"{source}: для формата npy нужно известное число кадров, используйте --format chunks")
+        writer = NpyWriter(os.path.join(args.output, output_name(source) + ".npy"), total)
+        if writer.frames_done >= total or writer.source_pos >= total:
+            print(f"{source}: уже обработан")
+            return 0
+    else:
+        writer = ChunkWriter(os.path.join(args.output, output_name(source)), args.chunk_size)
+
+    # Продолжаем с кадра источника, а не с числа записанных depth: нечитаемые картинки пропущены
+    start = writer.source_pos
+    if start:
+        print(f"{source}: продолжаем с кадра {start} (записано {writer.frames_done})")
+
+    def prepare(item):
+        # У каждого потока пула свой трансформ (у трансформа свои буферы)
+        if not hasattr(local, "transform"):
+            local.transform = estimator.make_transform()
+        index, frame = item
+        h, w = frame.shape[:2]
+        net_w, net_h = local.transform.get_size(w, h)
+        inp = np.empty((3, net_h, net_w), dtype=np.float32)
+        local.transform(frame, out=inp)
+        return inp, (h, w), index
+
+    frames = threaded_iter(iter_frames(source, start=start, with_index=True), maxsize=args.batch_size * 2)
+    prepared = bounded_map(pool, prepare, frames, prefetch=args.batch_size * 2)
+
+    written = 0
+    resized = 0
+    try:
+        # Батч — кадры одной формы входа сети, так что кадры разных размеров в один forward не попадают
+        for batch in batched(prepared, args.batch_size, key=lambda item: item[0].shape):
+            inputs = torch.from_numpy(np.stack([inp for inp, _, _ in batch]))
+            depth = estimator.forward(inputs).to(torch.float16).cpu().numpy()
+            if writer.depth_shape is not None and depth.shape[1:] != tuple(writer.depth_shape):
+                if not resized:
+                    h, w = batch[0][1]
+                    print(f"{source}: кадр {batch[0][2]} размера {w}x{h} не как первый, "
+                          f"depth приводится к {writer.depth_shape[1]}x{writer.depth_shape[0]}")
+                resized += len(batch)
+                depth = fit_depth(depth, writer.depth_shape)
+            written += writer.write(depth, batch[0][1], [index for _, _, index in batch])
+    finally:
+        writer.close()
+    if resized:
+        print(f"{source}: depth {resized} кадров другого размера масштабирована")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sources", nargs="+", help="видеофайлы или папки с картинками")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("--encoder", default="vitl", choices=["vits", "vitb", "vitl"])
+    parser.add_argument("--precision", default="fp32", choices=["fp32", "bf16", "int8"])
+    parser.add_argument("--backend", default="eager", choices=["eager", "trace", "compile", "onnx"])
+    parser.add_argument("--cache-dir", default=None, help="куда сохранять trace/onnx-артефакты")
+    parser.add_argument("--batch-size", default=4, type=int)
+    parser.add_argument("--workers", default=os.cpu_count() or 1, type=int,
+                        help="потоков на препроцессинг")
+    parser.add_argument("--format", default="chunks", choices=["npy", "chunks"])
+    parser.add_argument("--chunk-size", default=256, type=int)
+    parser.add_argument("--resolution", default="full",
+                        help="пресет (full/high/medium/low/tiny), короткая сторона или patches:N")
+    args = parser.parse_args()
+    # Размер depth-карт в выходном файле должен быть постоянным
+    if parse_resolution(args.resolution)[0] == "adaptive":
+        parser.error("--resolution adaptive не подходит для пакетной обработки")
+
+    os.makedirs(args.output, exist_ok=True)
+    estimator = DepthEstimator(args.encoder, resolution=args.resolution, precision=args.precision,
+                               backend=args.backend, cache_dir=args.cache_dir)
+    local = threading.local()
+
+    total_frames = 0
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(args.workers) as pool:
+        for source in args.sources:
+            source_start = time.perf_counter()
+            n = process_source(estimator, source, args, pool, local)
+            elapsed = time.perf_counter() - source_start
+            total_frames += n
+            if n:
+                print(f"{source}: {n} кадров за {elapsed:.1f} с ({n / elapsed:.2f} кадр/с)")
+
+    elapsed = time.perf_counter() - start_time
+    fps = total_frames / elapsed if elapsed > 0 else 0.0
+    print(f"Итого: {total_frames} кадров за {elapsed:.1f} с, {fps:.2f} кадр/с")
+
+
+if __name__ == '__main__':
+    main()
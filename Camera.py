@@ -1,124 +1,395 @@
 import sys
-import cv2
+import time
 import numpy as np
 
-from PySide6.QtCore import QThread, Signal, Slot, QObject, Qt
-from PySide6.QtGui import QImage, QPixmap
+from PySide6.QtCore import QThread, QTimer, Signal, Slot, QObject, Qt
+from PySide6.QtGui import QImage
 from PySide6.QtWidgets import (
     QApplication, QLabel, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout
 )
-from Reimage import ImageProcessor
-import time
+
+from CpuScheduler import pin_current_thread
+from FrameSource import open_capture
+from FrameView import FramePresenter, FrameView
+from PipelineMetrics import format_overlay
+from SharedRing import FrameRing
+
+
+def read_into_ring(cap, ring, ring_size, retrieve=False):
+    """
+    Кадр с cap прямо в свободный слот кольца, без нового массива на кадр.
+    Возвращает (FrameHandle или None, кольцо, ok): кольцо создаётся по первому
+    кадру (размер заранее неизвестен) и пересоздаётся при смене разрешения.
+    ok=False — кадра с cap нет (конец файла/записи, камера отключена); при
+    ok=True и None кадр пропущен, потому что все слоты заняты.
+    retrieve=True — кадр уже захвачен cap.grab(), забираем его cap.retrieve().
+    """
+    read = cap.retrieve if retrieve else cap.read
+    if ring is not None:
+        handle = ring.acquire()
+        if handle is None:
+            # Все слоты у потребителей: кадр пропускаем, но с камеры забираем
+            ok = retrieve or cap.grab()
+            return None, ring, ok
+        ret, frame = read(image=handle.array)
+        if ret and frame is handle.array:
+            return handle, ring, True
+        handle.release()
+        if not ret:
+            return None, ring, False
+    else:
+        ret, frame = read()
+        if not ret:
+            return None, ring, False
+
+    # Первый кадр или новое разрешение: OpenCV выделил массив сам, под него и кольцо
+    ring = FrameRing(ring_size, frame.shape, frame.dtype)
+    handle = ring.acquire()
+    handle.array[...] = frame
+    return handle, ring, True
 
 
 class CaptureWorker(QObject):
+    """
+    Захват кадров в кольцо FrameRing: cap.read() пишет прямо в свободный слот,
+    без нового массива на каждый кадр. Кольцо создаётся по первому кадру
+    (размер заранее неизвестен) и пересоздаётся, если камера сменила разрешение.
+    rawFrameCaptured отдаёт FrameHandle; получатель, которому кадр нужен
+    после возврата из слота, берёт handle.retain() (подключение — DirectConnection).
+    """
     rawFrameCaptured = Signal(object)
+    # Захват кончился сам (конец файла/записи, камера пропала): причина для показа
+    captureEnded = Signal(str)
 
-    def __init__(self, parent=None):
+    def __init__(self, camera_index=0, mailbox=None, cores=None, ring_size=8, metrics=None, source=None,
+                 parent=None):
         super().__init__(parent)
         self._is_running = False
         self.cap = None
+        self.camera_index = camera_index
+        # Ящик для обработчика: кладём туда каждый кадр, старые вытесняются
+        self.mailbox = mailbox
+        # Ядра под поток захвата (CpuScheduler.CpuPlan.capture[i]); None — без закрепления
+        self.cores = cores
+        # Слотов хватает на ящик обработчика, препроцессинг и показ; если все
+        # заняты, кадр пропускается (политика "drop")
+        self.ring_size = ring_size
+        self.ring = None
+        # Замеры (PipelineMetrics): стадия capture для камеры source
+        self.metrics = metrics
+        self.source = source
+        # Живая камера, не отдавшая кадр, опрашивается с паузой (удвоение до max_backoff, с);
+        # после max_failures неудач подряд захват останавливается
+        self.max_failures = 30
+        self.max_backoff = 0.5
+
+    def _readFrame(self):
+        """(следующий кадр в слоте кольца (FrameHandle) или None, ok как у read_into_ring)."""
+        start = time.perf_counter()
+        handle, ok = self._readIntoRing()
+        if handle is not None:
+            handle.timestamp = time.perf_counter()
+            if self.metrics is not None:
+                self.metrics.record("capture", handle.timestamp - start, self.source)
+        return handle, ok
+
+    def _readIntoRing(self):
+        handle, self.ring, ok = read_into_ring(self.cap, self.ring, self.ring_size)
+        return handle, ok
+
+    def isLive(self):
+        """Камера (индекс), а не видеофайл или запись: у неё нет конца."""
+        return isinstance(self.camera_index, int)
 
     def startCapture(self):
-        self.cap = cv2.VideoCapture(0)  # или (0, cv2.CAP_DSHOW) на Windows
+        pin_current_thread(self.cores)
+        # Индекс камеры, видеофайл или запись .depthrec (ReplayCapture, в темпе записи).
+        # Для камеры на Windows может понадобиться cv2.VideoCapture(index, cv2.CAP_DSHOW)
+        self.cap = open_capture(self.camera_index)
         if not self.cap.isOpened():
             print("Не удалось открыть камеру!")
             return
         self._is_running = True
+        self.ring = None
 
+        failures = 0
         while self._is_running:
-            ret, frame = self.cap.read()
-            if not ret:
+            handle, ok = self._readFrame()
+            if handle is not None:
+                # Темп задаёт сама камера: cap.read() блокирует до следующего кадра
+                failures = 0
+                self._publish(handle)
+                continue
+            if ok:
+                # Кадр пропущен (слоты заняты), камера в порядке
                 continue
 
-            # Отправляем кадр
-            self.rawFrameCaptured.emit(frame)
-
-            # "задержка" ~ 1 сек => 1 кадр/сек
-            time.sleep(1)
+            # Кадра нет: read() возвращается сразу, без паузы цикл занял бы ядро целиком
+            failures += 1
+            if not self.isLive():
+                self._endCapture(f"Конец записи {self.camera_index!r}")
+                break
+            if failures >= self.max_failures:
+                self._endCapture(f"Камера {self.camera_index!r} не отдаёт кадры")
+                break
+            time.sleep(min(self.max_backoff, 0.01 * 2 ** failures))
 
         self.cap.release()
 
+    def _endCapture(self, reason):
+        print(reason)
+        self._is_running = False
+        self.captureEnded.emit(reason)
+
+    def _publish(self, handle):
+        """Кадр обработчику — через ящик (без очереди), на экран — сигналом; ссылку захвата отпускаем."""
+        if self.mailbox is not None:
+            self.mailbox.put(handle.retain())
+        self.rawFrameCaptured.emit(handle)
+        handle.release()
+
     def stopCapture(self):
         self._is_running = False
 
 
+# Бэкенды захвата: название для комбобокса MainWindow
+CAPTURE_BACKENDS = {"opencv": "OpenCV capture", "qt": "Qt Multimedia capture"}
+
+
+def create_capture_worker(backend, camera_index=0, mailbox=None, cores=None, metrics=None, source=None):
+    """CaptureWorker ("opencv") или QtCaptureWorker ("qt") — у обоих один интерфейс."""
+    if backend == "qt":
+        # QtMultimedia нужен только этому бэкенду
+        from QtCapture import QtCaptureWorker
+
+        return QtCaptureWorker(camera_index, mailbox, cores, metrics=metrics, source=source)
+    if backend != "opencv":
+        raise ValueError(f"Неизвестный бэкенд захвата {backend!r}, есть: {', '.join(CAPTURE_BACKENDS)}")
+    return CaptureWorker(camera_index, mailbox, cores, metrics=metrics, source=source)
+
+
 class CameraWidget(QWidget):
-    def __init__(self, parent=None):
+    """
+    Виджет одной камеры: сырой кадр слева, depth-карта справа.
+    Обработчик (ImageProcessor) общий для всех камер и живёт в MainWindow,
+    виджет только регистрируется в нём как источник кадров.
+    backend — чем захватывать кадры (CAPTURE_BACKENDS), меняется через setBackend().
+    """
+    def __init__(self, processor, camera_index=0, capture_cores=None, backend="opencv", parent=None):
         super().__init__(parent)
 
-        # Два QLabel рядом, в HBox
-        self.label_raw = QLabel("Raw")
-        self.label_processed = QLabel("Processed")
-        self.label_raw.setAlignment(Qt.AlignCenter)
-        self.label_processed.setAlignment(Qt.AlignCenter)
+        # Подготовка картинок к показу (масштаб, QImage) — в отдельном потоке.
+        # Сырой кадр показываем как есть в BGR, depth-карта уже RGB.
+        self.rawPresenter = FramePresenter(QImage.Format_BGR888)
+        self.processedPresenter = FramePresenter(QImage.Format_RGB888)
+        self.displayThread = QThread()
+        self.rawPresenter.moveToThread(self.displayThread)
+        self.processedPresenter.moveToThread(self.displayThread)
+
+        # Два вида рядом, в HBox
+        self.view_raw = FrameView("Raw", self.rawPresenter)
+        self.view_processed = FrameView("Processed", self.processedPresenter)
+        self.view_raw.setMinimumSize(160, 120)
+        self.view_processed.setMinimumSize(160, 120)
 
         layout = QHBoxLayout(self)
-        layout.addWidget(self.label_raw)
-        layout.addWidget(self.label_processed)
+        layout.addWidget(self.view_raw)
+        layout.addWidget(self.view_processed)
         self.setLayout(layout)
 
-        # Создаём объекты для захвата и обработки
-        self.captureWorker = CaptureWorker()
-        self.processorWorker = ImageProcessor()
+        # Регистрируемся в общем обработчике и получаем свой ящик.
+        # Между захватом и обработкой одноместный ящик: обработка всегда берёт самый свежий кадр.
+        self.processorWorker = processor
+        self.source_id, self.mailbox = processor.addSource()
+        self.metrics = processor.metrics
+        self.capture_cores = capture_cores
+        self.backend = backend
+        # Кадры приходят извне (синхронный захват MainWindow), свой захват не запускаем
+        self.external_capture = False
+        self.processedPresenter.metrics = self.metrics
+        self.processedPresenter.source = self.source_id
+        # Depth-карта из DepthColorizer — его буфер, который перезапишут через
+        # num_buffers раскрасок; показ идёт в displayThread, поэтому карта копируется
+        # в слот своего кольца, а слот освобождает presenter после масштабирования
+        self.processedRing = None
+        self._started = False
+
+        # Оверлей с замерами конвейера поверх depth-карты (setMetricsOverlay), раз в секунду
+        self.metricsTimer = QTimer(self)
+        self.metricsTimer.setInterval(1000)
+        self.metricsTimer.timeout.connect(self.updateMetricsOverlay)
+        self._metricsWindow = None
 
-        # И потоки под них
+        # Поток под захват (поток обработки общий, им управляет MainWindow)
         self.captureThread = QThread()
-        self.processorThread = QThread()
+        self.captureWorker = None
+        self._createCaptureWorker(camera_index)
 
-        # Переносим воркеров в потоки
+        # Готовый обработанный (RGB) кадр → показываем справа (только свой source_id)
+        self.processorWorker.processedFrame.connect(self.onProcessedFrame, Qt.DirectConnection)
+        # Счётчики обработанных/выброшенных кадров
+        self.processorWorker.frameStats.connect(self.onFrameStats)
+
+    def _createCaptureWorker(self, camera_index):
+        """Worker захвата под текущий self.backend, в потоке captureThread."""
+        if self.captureWorker is not None:
+            self.captureThread.started.disconnect(self.captureWorker.startCapture)
+            self.captureWorker.rawFrameCaptured.disconnect(self.updateRawFrame)
+            self.captureWorker.captureEnded.disconnect(self.onCaptureEnded)
+        self.captureWorker = create_capture_worker(self.backend, camera_index, self.mailbox, self.capture_cores,
+                                                   metrics=self.metrics, source=self.source_id)
         self.captureWorker.moveToThread(self.captureThread)
-        self.processorWorker.moveToThread(self.processorThread)
 
-        # Связываем сигналы/слоты
         # Когда captureThread стартует, worker начинает чтение камеры
         self.captureThread.started.connect(self.captureWorker.startCapture)
 
-        # Сырый кадр (BGR) → сразу показываем (updateRawFrame) и отправляем на обработку
-        self.captureWorker.rawFrameCaptured.connect(self.updateRawFrame)
-        self.captureWorker.rawFrameCaptured.connect(self.processorWorker.processFrame)
-
-        # Готовый обработанный (RGB) кадр → показываем справа
-        self.processorWorker.processedFrame.connect(self.updateProcessedFrame)
+        # Сырый кадр (BGR) → сразу на показ. DirectConnection: submit()
+        # потокобезопасен, и кадр не проходит через очередь GUI-потока
+        self.captureWorker.rawFrameCaptured.connect(self.updateRawFrame, Qt.DirectConnection)
+        self.captureWorker.captureEnded.connect(self.onCaptureEnded)
 
     def startCamera(self):
-        """Старт потоков (запуск захвата и обработки)."""
-        self.captureThread.start()
-        self.processorThread.start()
+        """Старт потоков захвата и показа."""
+        self._started = True
+        self.displayThread.start()
+        if not self.external_capture:
+            self.captureThread.start()
 
     def stopCamera(self):
-        """Остановка захвата и завершение потоков."""
-        # Сначала просим captureWorker остановиться
+        """Остановка захвата и завершение потока."""
+        self._started = False
         self.captureWorker.stopCapture()
 
-        # Завершаем поток захвата
         self.captureThread.quit()
-        self.captureThread.wait()
+        while not self.captureThread.wait(50):
+            # Поток мог дойти до startCapture() уже после stopCapture() и снова взвести флаг
+            self.captureWorker.stopCapture()
+
+        self.displayThread.quit()
+        self.displayThread.wait()
 
-        # Завершаем поток обработки (если там что-то крутится)
-        self.processorThread.quit()
-        self.processorThread.wait()
+        # Непрочитанный кадр больше не нужен
+        self.mailbox.clear()
 
-    @Slot(np.ndarray)
-    def updateRawFrame(self, frame: np.ndarray):
+    def setCamera(self, camera_index: int):
         """
-        Получаем "сырое" (BGR) изображение,
-        конвертируем в RGB и выводим в левый QLabel.
+        Переключение на другую камеру (из комбобокса MainWindow).
+        Перезапускаем захват и сбрасываем кеши обработчика под старое разрешение.
         """
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_frame.shape
-        bytesPerLine = ch * w
-
-        qimg = QImage(rgb_frame.data, w, h, bytesPerLine, QImage.Format_RGB888)
-        pixmap = QPixmap.fromImage(qimg)
-        self.label_raw.setPixmap(pixmap)
-
-    @Slot(np.ndarray)
-    def updateProcessedFrame(self, rgb_frame: np.ndarray):
-        """Готовый (уже RGB) кадр выводим в правый QLabel."""
-        h, w, ch = rgb_frame.shape
-        bytesPerLine = ch * w
-
-        qimg = QImage(rgb_frame.data, w, h, bytesPerLine, QImage.Format_RGB888)
-        pixmap = QPixmap.fromImage(qimg)
-        self.label_processed.setPixmap(pixmap)
+        if camera_index == self.captureWorker.camera_index:
+            return
+
+        was_started = self._started
+        if was_started:
+            self.stopCamera()
+
+        self.captureWorker.camera_index = camera_index
+        self.processorWorker.resetSource(self.source_id)
+
+        if was_started:
+            self.startCamera()
+
+    def setExternalCapture(self, external: bool):
+        """
+        external=True: свой захват останавливается, кадры в ящик и на показ
+        (updateRawFrame) подаёт кто-то другой — MultiCapture.SyncCaptureWorker.
+        """
+        if external == self.external_capture:
+            return
+
+        was_started = self._started
+        if was_started:
+            self.stopCamera()
+
+        self.external_capture = external
+        self.processorWorker.resetSource(self.source_id)
+
+        if was_started:
+            self.startCamera()
+
+    def setBackend(self, backend: str):
+        """Смена бэкенда захвата (из комбобокса MainWindow): та же камера, новый worker."""
+        if backend == self.backend:
+            return
+
+        was_started = self._started
+        if was_started:
+            self.stopCamera()
+
+        self.backend = backend
+        self._createCaptureWorker(self.captureWorker.camera_index)
+        self.processorWorker.resetSource(self.source_id)
+
+        if was_started:
+            self.startCamera()
+
+    @Slot(str)
+    def onCaptureEnded(self, reason: str):
+        """Захват остановился сам: причину — в подсказку левого вида."""
+        self.view_raw.setToolTip(reason)
+
+    def onProcessedFrame(self, source_id: int, rgb_frame: np.ndarray, captured_at: float):
+        if source_id == self.source_id:
+            self.updateProcessedFrame(rgb_frame, captured_at)
+
+    @Slot(int, dict)
+    def onFrameStats(self, source_id: int, stats: dict):
+        if source_id == self.source_id:
+            self.updateStats(stats)
+
+    def updateRawFrame(self, frame):
+        """
+        Получаем "сырое" (BGR) изображение (FrameHandle из кольца захвата)
+        и отдаём его на показ в левый вид, со своей ссылкой на слот.
+        Конвертации в RGB нет: QImage читает BGR напрямую (Format_BGR888).
+        """
+        self.rawPresenter.submit(frame.retain())
+
+    def updateProcessedFrame(self, rgb_frame: np.ndarray, captured_at=None):
+        """
+        Готовый (уже RGB) кадр отдаём на показ в правый вид — копией в слоте
+        processedRing: буфер раскраски может понадобиться обработчику раньше,
+        чем presenter его дочитает.
+        """
+        if self.processedRing is None or self.processedRing.shape != rgb_frame.shape:
+            # Слоты: ждущий в ящике presenter'а, масштабируемый и заполняемый сейчас
+            self.processedRing = FrameRing(FramePresenter.NUM_BUFFERS, rgb_frame.shape, np.uint8)
+        handle = self.processedRing.acquire()
+        if handle is None:
+            return
+        np.copyto(handle.array, rgb_frame)
+        self.processedPresenter.submit(handle, captured_at)
+
+    def setMetricsOverlay(self, enabled: bool):
+        """Показывать ли поверх depth-карты p50/p95/p99 стадий и FPS этой камеры."""
+        if enabled:
+            self._metricsWindow = self.metrics.window()
+            self.metricsTimer.start()
+        else:
+            self.metricsTimer.stop()
+            self._metricsWindow = None
+            self.view_processed.setOverlay(None)
+
+    @Slot()
+    def updateMetricsOverlay(self):
+        # Стадии камеры (захват, раскраска, показ) и общие на батч (препроцессинг, forward)
+        snapshot = self._metricsWindow.snapshot()
+        stages = dict(snapshot.get("all", {}))
+        stages.update(snapshot.get(str(self.source_id), {}))
+        self.view_processed.setOverlay(format_overlay(stages))
+
+    @Slot(dict)
+    def updateStats(self, stats: dict):
+        """Показываем счётчики кадров во всплывающей подсказке правого вида."""
+        text = (
+            f"captured: {stats['captured']}  "
+            f"processed: {stats['processed']}  "
+            f"dropped: {stats['dropped']}"
+        )
+        if "reused" in stats:
+            text += (
+                f"\nreused: {stats['reused']}  "
+                f"recomputed: {stats['recomputed']}  "
+                f"motion: {stats['motion']:.3f}"
+            )
+        self.view_processed.setToolTip(text)
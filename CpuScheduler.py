@@ -0,0 +1,84 @@
+"""
+Распределение ядер CPU между захватом, препроцессингом и инференсом.
+
+По умолчанию пул потоков torch (intra-op), внутренние потоки OpenCV и потоки
+захвата берут все ядра сразу и вытесняют друг друга. CpuPlan делит доступные
+ядра на непересекающиеся группы: своя группа ядер у захвата камер (по одной
+на камеру, пока ядер хватает), у препроцессинга и у инференса; размеры пулов
+torch и OpenCV выставляются под свои группы. Потоки закрепляются за группой
+через sched_setaffinity (только Linux; на других ОС — только размеры пулов).
+
+torch здесь импортируется лениво: план строится в GUI-потоке, а пулы
+torch настраиваются уже в потоке обработки.
+"""
+import os
+
+import cv2
+
+
+def available_cores():
+    """Ядра, на которых процессу разрешено работать (с учётом taskset/cgroups)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class CpuPlan:
+    """
+    Группы ядер конвейера:
+      capture[i] — поток захвата камеры i,
+      preprocess — препроцессинг (ресайз, нормализация) и потоки OpenCV,
+      inference  — forward, по потоку torch на ядро.
+    Меньше чем на 4 ядрах делить нечего: все группы совпадают.
+    """
+
+    def __init__(self, num_cameras=1, cores=None):
+        cores = list(cores) if cores is not None else available_cores()
+        self.cores = cores
+        n = len(cores)
+
+        if n < 4:
+            self.capture = [cores] * num_cameras
+            self.preprocess = cores
+            self.inference = cores
+            return
+
+        # Захват почти всё время ждёт драйвер: по ядру на камеру, но не больше четверти ядер.
+        # Препроцессинг — около восьмой части (минимум одно ядро), остальное — инференсу.
+        num_capture = min(num_cameras, max(1, n // 4))
+        num_preprocess = max(1, n // 8)
+        capture_cores = cores[:num_capture]
+        self.capture = [[capture_cores[i % num_capture]] for i in range(num_cameras)]
+        self.preprocess = cores[num_capture:num_capture + num_preprocess]
+        self.inference = cores[num_capture + num_preprocess:]
+
+    def __repr__(self):
+        return (f"CpuPlan(capture={self.capture}, preprocess={self.preprocess}, "
+                f"inference={self.inference})")
+
+    def configure_opencv(self):
+        """Потоки OpenCV — по числу ядер препроцессинга (глобально на процесс)."""
+        cv2.setNumThreads(len(self.preprocess))
+
+    def configure_torch(self):
+        """
+        Пулы torch: intra-op по числу ядер инференса, inter-op — один поток
+        (граф модели последовательный). Звать до первого forward: inter-op
+        пул после старта torch не меняется, тогда оставляем как есть.
+        """
+        import torch
+
+        torch.set_num_threads(len(self.inference))
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass
+
+
+def pin_current_thread(cores):
+    """
+    Закрепляет вызывающий поток за ядрами cores (Linux). Потоки, которые
+    он создаст потом (например, OpenMP-пул torch), наследуют это закрепление.
+    """
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
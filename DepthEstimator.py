@@ -0,0 +1,334 @@
+import time
+
+import cv2  # type: ignore
+import numpy as np
+import torch
+
+from depth_anything.backends import cache_tag, make_backend
+from depth_anything.feature_cache import FeatureCache, merge_batch, split_batch
+from depth_anything.fused_head import fuse_depth_head
+from depth_anything.precision import PrecisionModel
+from depth_anything.util.postprocess import DepthColorizer
+from depth_anything.util.transform import Resize, PatchBudgetResize, FusedPreprocess
+from depth_anything.weights import load_depth_anything
+# RESOLUTION_PRESETS и parse_resolution по-прежнему доступны и отсюда
+from InferenceResolution import RESOLUTION_PRESETS, AdaptiveResolution, parse_resolution  # noqa: F401
+from TemporalReuse import TemporalReuse
+
+
+class PreparedFrames:
+    """Кадры после DepthEstimator.prepare(): батчи на forward и уже готовые (переиспользованные) depth."""
+
+    def __init__(self, count, keys, temporal):
+        self.keys = keys
+        self.temporal = temporal
+        self.depths = [None] * count
+        self.thumbs = {}
+        self.batches = []          # [(индексы кадров, батч (N, 3, H', W'))]
+        self.prepare_time = 0.0
+
+
+class DepthEstimator:
+    """
+    Обёртка над DepthAnything без Qt: одна копия весов на процесс,
+    инференс сразу пачкой кадров с нескольких камер.
+    """
+
+    def __init__(self, encoder="vitl", device=None, resolution="full", target_fps=10.0, precision="fp32",
+                 backend="eager", cache_dir=None, fuse_head=True):
+        # Определяем устройство (CPU / CUDA)
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = torch.device(device)
+        print("Using device:", self.device)
+
+        # Загружаем модель (можно менять "vitl" на "vitb"/"vits" в зависимости от версии).
+        # Архитектура собирается локально (без torch.hub), веса отображаются в память
+        # из кеша в cache_dir; в сеть идём, только если их нет ни там, ни в кеше HF.
+        print(f"Loading DepthAnything: {encoder}")
+        self.load_timings = {}
+        model = load_depth_anything(encoder, self.device, cache_dir=cache_dir, timings=self.load_timings)
+        # Голова DPT для инференса: 1x1-проекции свёрнуты в следующие свёртки там,
+        # где это дешевле, out_conv до апсемплинга и т. д. (см. fused_head)
+        if fuse_head:
+            model = fuse_depth_head(model)
+
+        # Точность: fp32, bf16 (autocast) или int8 (динамическая квантизация Linear, только CPU)
+        if precision == "int8" and self.device.type != "cpu":
+            raise ValueError("int8 поддерживается только на CPU")
+        self.precision = precision
+        self.depth_model = PrecisionModel(model, precision).eval()
+
+        # Чем исполнять модель: eager, trace / compile (под фиксированную форму входа)
+        # или onnx (onnxruntime). Артефакты кешируются на диске по энкодеру, точности,
+        # слиянию головы (граф у слитой и обычной головы разный) и форме.
+        if backend == "onnx" and (precision != "fp32" or self.device.type != "cpu"):
+            raise ValueError("onnx-бэкенд поддерживает только fp32 на CPU")
+        self.backend = make_backend(backend, self.depth_model, cache_tag(encoder, precision, fuse_head), cache_dir)
+
+        # Разрешение инференса: трансформы кешируются по настройке,
+        # чтобы переключение туда-обратно не выделяло буферы заново
+        self._transforms = {}
+        self.adaptive = None
+        self.target_fps = target_fps
+        self.set_resolution(resolution)
+
+        # Переиспользование depth на почти неподвижных кадрах (по умолчанию выключено)
+        self.temporal = None
+        # Признаки энкодера по id кадра для encode()/decode() (LRU)
+        self.feature_cache = FeatureCache(max_entries=8)
+        # Замеры стадий (PipelineMetrics), см. set_metrics()
+        self.metrics = None
+        self._metric_hooks = []
+        self._head_times = []
+
+        # Параметры отображения depth-карты
+        self.colormap = cv2.COLORMAP_INFERNO  # Или COLORMAP_JET, COLORMAP_TURBO и т. д.
+        self.colorizer = DepthColorizer(self.colormap)
+
+    def set_resolution(self, resolution, target_fps=None):
+        """
+        Меняет разрешение инференса на лету (см. parse_resolution).
+        В режиме "adaptive" стартуем с "full" и подстраиваемся под target_fps.
+        """
+        mode, value = parse_resolution(resolution)
+        self.resolution = resolution
+        if target_fps is not None:
+            self.target_fps = target_fps
+        if mode == "adaptive":
+            self.adaptive = AdaptiveResolution(self.target_fps)
+            self._resize_key = ("short_side", self.adaptive.short_side)
+        else:
+            self.adaptive = None
+            self._resize_key = (mode, value)
+        self.transform = self._get_transform(self._resize_key)
+
+    def set_temporal_reuse(self, threshold=0.02, keyframe_interval=30, warp=False):
+        """
+        Включает переиспользование depth-карты на почти неподвижных кадрах
+        (см. TemporalReuse); threshold=None выключает. Работает для кадров,
+        переданных в infer/process с ключами источников.
+        """
+        if threshold is None:
+            self.temporal = None
+        else:
+            self.temporal = TemporalReuse(threshold, keyframe_interval, warp)
+
+    def _get_transform(self, key):
+        transform = self._transforms.get(key)
+        if transform is None:
+            transform = self.make_transform(key)
+            self._transforms[key] = transform
+        return transform
+
+    def make_transform(self, resize_key=None):
+        """
+        Трансформ (см. оригинальный скрипт) одним проходом:
+        Resize по uint8-кадру + нормализация в переиспользуемые буферы,
+        вместо цепочки Resize -> NormalizeImage -> PrepareForNet на float64.
+        У трансформа свои буферы, поэтому потокам нужны отдельные экземпляры.
+        resize_key — ("short_side", px) или ("patches", n), по умолчанию текущая настройка.
+        """
+        mode, value = resize_key or self._resize_key
+        if mode == "patches":
+            resize = PatchBudgetResize(
+                value,
+                patch_size=14,
+                resize_target=False,
+                image_interpolation_method=cv2.INTER_CUBIC,
+            )
+        else:
+            resize = Resize(
+                width=value,
+                height=value,
+                resize_target=False,
+                keep_aspect_ratio=True,
+                ensure_multiple_of=14,
+                resize_method='lower_bound',
+                image_interpolation_method=cv2.INTER_CUBIC,
+            )
+
+        return FusedPreprocess(
+            resize,
+            mean=[0.485, 0.456, 0.406],
+            std=[0.229, 0.224, 0.225],
+            resize_dtype="uint8",
+            image_interpolation_method=cv2.INTER_CUBIC,
+        )
+
+    def set_metrics(self, metrics):
+        """
+        Пишет в metrics (PipelineMetrics) время preprocess и forward на батч.
+        Forward-хук на голове DPT делит forward на head и encoder (остаток);
+        хук срабатывает только у eager-модели — trace/onnx исполняют её
+        целиком, и тогда есть только forward. metrics=None выключает замеры.
+        """
+        for handle in self._metric_hooks:
+            handle.remove()
+        self._metric_hooks = []
+        self.metrics = metrics
+        if metrics is None:
+            return
+
+        head = self.depth_model.model.depth_head
+        started = []
+        self._metric_hooks.append(head.register_forward_pre_hook(
+            lambda m, args: started.append(time.perf_counter())))
+        self._metric_hooks.append(head.register_forward_hook(
+            lambda m, args, out: self._head_times.append(time.perf_counter() - started.pop())))
+
+    def reset_cache(self):
+        """Сбрасывает закешированные размеры и буферы (после смены камеры)."""
+        for transform in self._transforms.values():
+            transform.reset()
+        self.colorizer.reset()
+        if self.temporal is not None:
+            self.temporal.reset()
+
+    def preprocess(self, frame_bgr: np.ndarray, out=None) -> np.ndarray:
+        """
+        BGR uint8 кадр -> нормированный (C, H', W') float32 вход сети.
+        out — куда писать (например, срез батча); без него результат лежит
+        во внутреннем буфере до следующего вызова с тем же размером кадра.
+        """
+        return self.transform(frame_bgr, out=out)
+
+    def infer(self, frames_bgr, keys=None):
+        """
+        Прогоняет несколько кадров через модель.
+        Кадры с одинаковым размером входа складываются в один батч (N, 3, H', W')
+        и идут одним forward; разные разрешения — отдельными батчами.
+        Возвращает список depth-карт (H', W') в том же порядке, что и кадры.
+        keys — источники кадров; с ними и включённым set_temporal_reuse
+        почти неподвижные кадры получают depth keyframe'а без forward.
+        В адаптивном режиме после прохода по замеренной задержке может
+        поменяться разрешение для следующих кадров.
+        """
+        return self.run_prepared(self.prepare(frames_bgr, keys))
+
+    def prepare(self, frames_bgr, keys=None):
+        """
+        Первая половина infer(): препроцессинг в батчи, без forward.
+        Можно звать из другого потока, пока run_prepared() считает предыдущие
+        кадры (конвейер: препроцессинг N+1 параллельно с инференсом N),
+        но не из двух потоков сразу — у трансформа свои буферы.
+        """
+        start = time.perf_counter()
+        transform = self.transform
+        temporal = self.temporal if keys is not None else None
+
+        # Группируем индексы кадров по размеру входа сети
+        prepared = PreparedFrames(len(frames_bgr), keys, temporal)
+        groups = {}
+        for i, frame in enumerate(frames_bgr):
+            h, w = frame.shape[:2]
+            net_w, net_h = transform.get_size(w, h)
+            if temporal is not None:
+                prepared.thumbs[i] = temporal.thumbnail(frame)
+                prepared.depths[i] = temporal.lookup(keys[i], prepared.thumbs[i], (net_h, net_w))
+                if prepared.depths[i] is not None:
+                    continue
+            groups.setdefault((net_w, net_h), []).append(i)
+
+        for (net_w, net_h), indices in groups.items():
+            # Препроцессинг пишет прямо в батч, без промежуточных копий
+            batch = torch.empty((len(indices), 3, net_h, net_w), dtype=torch.float32)
+            batch_np = batch.numpy()
+            for j, i in enumerate(indices):
+                transform(frames_bgr[i], out=batch_np[j])
+            prepared.batches.append((indices, batch))
+
+        prepared.prepare_time = time.perf_counter() - start
+        if self.metrics is not None and prepared.batches:
+            self.metrics.record("preprocess", prepared.prepare_time)
+        return prepared
+
+    def run_prepared(self, prepared):
+        """Вторая половина infer(): forward подготовленных батчей -> список depth-карт."""
+        start = time.perf_counter()
+        depths = prepared.depths
+        temporal = prepared.temporal
+
+        for indices, batch in prepared.batches:
+            forward_start = time.perf_counter()
+            depth_batch = self.forward(batch)  # (N, H', W')
+            if self.metrics is not None:
+                self._record_forward(time.perf_counter() - forward_start)
+            for i, depth in zip(indices, depth_batch):
+                depths[i] = depth
+                if temporal is not None:
+                    temporal.update(prepared.keys[i], prepared.thumbs[i], depth)
+
+        # Задержку учитываем, только если был forward: переиспользованные кадры почти бесплатны
+        if self.adaptive is not None and prepared.batches:
+            latency = prepared.prepare_time + time.perf_counter() - start
+            short_side = self.adaptive.update(latency)
+            if short_side != self._resize_key[1]:
+                self._resize_key = ("short_side", short_side)
+                self.transform = self._get_transform(self._resize_key)
+        return depths
+
+    def _record_forward(self, seconds):
+        self.metrics.record("forward", seconds)
+        if self._head_times:
+            head = sum(self._head_times)
+            self._head_times.clear()
+            self.metrics.record("head", head)
+            self.metrics.record("encoder", seconds - head)
+
+    def forward(self, batch: torch.Tensor) -> torch.Tensor:
+        """Уже подготовленный батч (N, 3, H', W') -> depth (N, H', W')."""
+        return self.backend(batch.to(self.device))
+
+    def encode(self, batch: torch.Tensor, frame_ids=None):
+        """
+        Только энкодер DINOv2: батч (N, 3, H', W') -> список EncoderFeatures по кадрам.
+        С frame_ids признаки берутся из feature_cache и кладутся туда: кадр,
+        который уже проходил энкодер, повторно не считается, а голова DPT
+        и другие потребители (сегментация, детекция) берут его признаки по id.
+        Идёт мимо бэкенда (trace/onnx): они исполняют модель целиком.
+        """
+        h, w = batch.shape[-2:]
+        if frame_ids is None:
+            with torch.no_grad():
+                return split_batch(self.depth_model.encode(batch.to(self.device)), (h, w))
+
+        features = [self.feature_cache.get(frame_id) for frame_id in frame_ids]
+        missing = [j for j, f in enumerate(features) if f is None or f.image_size != (h, w)]
+        if missing:
+            with torch.no_grad():
+                layers = self.depth_model.encode(batch[missing].to(self.device))
+            for j, f in zip(missing, split_batch(layers, (h, w))):
+                features[j] = f
+                self.feature_cache.put(frame_ids[j], f)
+        return features
+
+    def decode(self, features) -> torch.Tensor:
+        """Только голова DPT: список EncoderFeatures одного размера входа -> depth (N, H', W')."""
+        h, w = features[0].image_size
+        with torch.no_grad():
+            return self.depth_model.decode(merge_batch(features), h, w)
+
+    def colorize(self, depth: torch.Tensor, size, key=None) -> np.ndarray:
+        """
+        Depth-карта сети (H', W') -> раскрашенный RGB-кадр размера size = (h, w).
+        1) Нормируем в [0..255] и квантуем в uint8 ещё на разрешении сети
+        2) Растягиваем uint8 до исходного размера
+        3) Накладываем colormap через RGB-таблицу (без BGR -> RGB)
+        Результат лежит в переиспользуемом буфере (свой набор на каждый key).
+        """
+        return self.colorizer(depth, size, key)
+
+    def process(self, frames_bgr, keys=None):
+        """
+        Полный путь: список BGR-кадров -> список раскрашенных depth-карт (RGB).
+        keys — по одному на кадр (например, source_id), чтобы у каждой камеры
+        были свои выходные буферы и свой keyframe для переиспользования.
+        """
+        depths = self.infer(frames_bgr, keys)
+        if keys is None:
+            keys = range(len(frames_bgr))
+        return [
+            self.colorize(depth, frame.shape[:2], key)
+            for depth, frame, key in zip(depths, frames_bgr, keys)
+        ]
@@ -0,0 +1,368 @@
+"""
+Запись и воспроизведение: сырые кадры, depth (float16) и время в одном файле.
+
+Формат .depthrec:
+
+    заголовок   MAGIC (8 байт), версия (uint32), резерв (uint32)
+    чанки       подряд; в чанке до chunk_frames кадров вместе с их depth,
+                сжатых zlib одним куском (или как есть, compression="none")
+    индекс      JSON с параметрами и таблицей чанков [offset, length, raw_length],
+                за ним таблица кадров (FRAME_DTYPE): время, источник, чанк,
+                смещения и формы кадра и depth внутри распакованного чанка
+    хвост       offset и длина JSON, offset таблицы кадров, число кадров, MAGIC
+
+Индекс пишется в close(): незакрытая запись (например, после падения) не читается.
+Чтение идёт через mmap: к любому кадру — по индексу, без чтения файла целиком;
+распаковывается только его чанк (последние чанки кешируются). Без сжатия кадр —
+это view прямо на отображённый файл.
+
+    with DepthRecorder("drive.depthrec") as rec:
+        rec.write(frame_bgr, depth, timestamp, source=0)
+
+    rec = DepthRecording("drive.depthrec")
+    rec[i].frame, rec[i].depth, rec.seek(timestamp)
+
+ReplayCapture подставляется вместо cv2.VideoCapture (см. FrameSource.open_capture).
+"""
+import json
+import mmap
+import struct
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+EXTENSION = ".depthrec"
+MAGIC = b"DEPTHREC"
+VERSION = 1
+_HEADER = struct.Struct("<8sII")
+_FOOTER = struct.Struct("<QQQQ8s")
+
+FRAME_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("source", "<i4"),
+    ("chunk", "<i4"),
+    ("frame_offset", "<i8"),
+    ("frame_h", "<i4"),
+    ("frame_w", "<i4"),
+    ("frame_c", "<i4"),
+    ("depth_offset", "<i8"),    # -1 — кадр записан без depth
+    ("depth_h", "<i4"),
+    ("depth_w", "<i4"),
+])
+
+
+class DepthRecorder:
+    """
+    Пишет кадры в .depthrec. write() только копирует кадр в текущий чанк;
+    сжатие и запись на диск идут в отдельном потоке, по порядку чанков.
+    Если диск или zlib не успевают, write() ждёт, когда в очереди больше
+    max_pending_chunks чанков, — память не растёт без предела.
+    """
+
+    def __init__(self, path, chunk_frames=16, compression="zlib", level=1, max_pending_chunks=2):
+        if compression not in ("zlib", "none"):
+            raise ValueError(f"неизвестное сжатие {compression!r}, нужно 'zlib' или 'none'")
+        self.path = path
+        self.chunk_frames = chunk_frames
+        self.compression = compression
+        self.level = level
+        self.max_pending_chunks = max_pending_chunks
+
+        self._file = open(path, "wb")
+        self._file.write(_HEADER.pack(MAGIC, VERSION, 0))
+        self._parts = []
+        self._chunk_size = 0
+        self._num_chunks = 0
+        self._chunks = []
+        self._entries = []
+        self._writer = ThreadPoolExecutor(1)
+        self._pending = []
+        self.closed = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def write(self, frame, depth=None, timestamp=None, source=0):
+        """frame — BGR uint8 (h, w, 3) или (h, w); depth — (H', W') в любом float, хранится float16."""
+        if self.closed:
+            raise ValueError("запись уже закрыта")
+        timestamp = time.time() if timestamp is None else timestamp
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        h, w = frame.shape[:2]
+        c = frame.shape[2] if frame.ndim == 3 else 1
+
+        frame_offset = self._append(frame)
+        if depth is not None:
+            depth = np.ascontiguousarray(depth, dtype=np.float16)
+            depth_offset = self._append(depth)
+            depth_h, depth_w = depth.shape
+        else:
+            depth_offset, depth_h, depth_w = -1, 0, 0
+
+        self._entries.append((timestamp, source, self._num_chunks, frame_offset, h, w, c,
+                              depth_offset, depth_h, depth_w))
+        if len(self._entries) % self.chunk_frames == 0:
+            self._flush()
+
+    def _append(self, array):
+        offset = self._chunk_size
+        self._parts.append(array.tobytes())
+        self._chunk_size += array.nbytes
+        return offset
+
+    def _flush(self):
+        if not self._parts:
+            return
+        data = b"".join(self._parts)
+        self._parts = []
+        self._chunk_size = 0
+        self._num_chunks += 1
+
+        self._pending = [f for f in self._pending if not f.done()]
+        while len(self._pending) >= self.max_pending_chunks:
+            self._pending.pop(0).result()
+        self._pending.append(self._writer.submit(self._write_chunk, data))
+
+    def _write_chunk(self, data):
+        # Поток записи один, так что чанки ложатся в файл по порядку номеров
+        payload = zlib.compress(data, self.level) if self.compression == "zlib" else data
+        self._chunks.append([self._file.tell(), len(payload), len(data)])
+        self._file.write(payload)
+
+    def close(self):
+        if self.closed:
+            return
+        self._flush()
+        self._writer.shutdown(wait=True)
+        for future in self._pending:
+            future.result()  # ошибки записи чанков — наружу
+
+        meta = json.dumps({
+            "version": VERSION,
+            "compression": self.compression,
+            "chunk_frames": self.chunk_frames,
+            "chunks": self._chunks,
+        }).encode()
+        meta_offset = self._file.tell()
+        self._file.write(meta)
+        frames_offset = self._file.tell()
+        self._file.write(np.array(self._entries, dtype=FRAME_DTYPE).tobytes())
+        self._file.write(_FOOTER.pack(meta_offset, len(meta), frames_offset, len(self._entries), MAGIC))
+        self._file.close()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RecordedFrame:
+    __slots__ = ("index", "timestamp", "source", "frame", "depth")
+
+    def __init__(self, index, timestamp, source, frame, depth):
+        self.index = index
+        self.timestamp = timestamp
+        self.source = source
+        self.frame = frame      # BGR uint8, только чтение
+        self.depth = depth      # float16 (H', W') или None
+
+
+class DepthRecording:
+    """
+    Чтение .depthrec с произвольным доступом. Массивы кадров и depth —
+    только для чтения (view на чанк или на отображённый файл), живут,
+    пока открыт файл; что нужно дольше — копировать.
+    """
+
+    def __init__(self, path, cache_chunks=2):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < _HEADER.size or _HEADER.unpack_from(self._mmap, 0)[0] != MAGIC:
+            raise IOError(f"{path}: не запись .depthrec")
+        if len(self._mmap) < _HEADER.size + _FOOTER.size:
+            raise IOError(f"{path}: запись не закрыта (нет индекса)")
+        meta_offset, meta_len, frames_offset, count, magic = _FOOTER.unpack_from(
+            self._mmap, len(self._mmap) - _FOOTER.size)
+        if magic != MAGIC:
+            raise IOError(f"{path}: запись не закрыта (нет индекса)")
+
+        meta = json.loads(bytes(self._mmap[meta_offset:meta_offset + meta_len]))
+        self.version = meta["version"]
+        self.compression = meta["compression"]
+        self.chunks = meta["chunks"]
+        self.index = np.frombuffer(self._mmap, FRAME_DTYPE, count, frames_offset)
+
+        self._cache = OrderedDict()
+        self.cache_chunks = cache_chunks
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def timestamps(self):
+        return self.index["timestamp"]
+
+    @property
+    def sources(self):
+        return sorted(int(s) for s in np.unique(self.index["source"]))
+
+    def frame_indices(self, source=None):
+        """Номера кадров источника (все кадры при source=None) по порядку записи."""
+        if source is None:
+            return np.arange(len(self.index))
+        return np.flatnonzero(self.index["source"] == source)
+
+    def seek(self, timestamp, source=None):
+        """Номер первого кадра (источника source) со временем >= timestamp или None."""
+        indices = self.frame_indices(source)
+        i = np.searchsorted(self.index["timestamp"][indices], timestamp)
+        return int(indices[i]) if i < len(indices) else None
+
+    def _chunk(self, c):
+        offset, length, raw_length = self.chunks[c]
+        if self.compression == "none":
+            return memoryview(self._mmap)[offset:offset + length]
+
+        data = self._cache.get(c)
+        if data is None:
+            data = zlib.decompress(self._mmap[offset:offset + length], bufsize=raw_length)
+            self._cache[c] = data
+            while len(self._cache) > self.cache_chunks:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(c)
+        return data
+
+    def frame(self, i):
+        entry = self.index[i]
+        h, w, c = int(entry["frame_h"]), int(entry["frame_w"]), int(entry["frame_c"])
+        shape = (h, w, c) if c > 1 else (h, w)
+        return np.frombuffer(self._chunk(entry["chunk"]), np.uint8, h * w * c,
+                             int(entry["frame_offset"])).reshape(shape)
+
+    def depth(self, i):
+        entry = self.index[i]
+        if entry["depth_offset"] < 0:
+            return None
+        h, w = int(entry["depth_h"]), int(entry["depth_w"])
+        return np.frombuffer(self._chunk(entry["chunk"]), np.float16, h * w,
+                             int(entry["depth_offset"])).reshape(h, w)
+
+    def __getitem__(self, i):
+        entry = self.index[i]
+        return RecordedFrame(i, float(entry["timestamp"]), int(entry["source"]), self.frame(i), self.depth(i))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def close(self):
+        self._cache.clear()
+        self.index = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Кто-то ещё держит view на файл без сжатия: mmap закроется вместе с ним
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ReplayCapture:
+    """
+    Замена cv2.VideoCapture поверх записи: кадры одного источника в темпе
+    записи (realtime=True, ускорение speed) или так быстро, как читают.
+    Поддерживает то, чем пользуются CaptureWorker и FrameSource: read(image=...),
+    grab()/retrieve(), get/set(CAP_PROP_POS_FRAMES), release().
+    """
+
+    def __init__(self, path, source=0, realtime=True, loop=False, speed=1.0):
+        self.recording = DepthRecording(path)
+        self.indices = self.recording.frame_indices(source)
+        self.realtime = realtime
+        self.loop = loop
+        self.speed = speed
+        self.pos = 0
+        self.current = None
+        self._restart_clock()
+
+    def _restart_clock(self):
+        self._clock = None  # (время на часах, время записи) первого кадра после старта/перемотки
+
+    def isOpened(self):
+        return self.recording is not None and len(self.indices) > 0
+
+    def grab(self):
+        if self.pos >= len(self.indices):
+            if not self.loop or not len(self.indices):
+                return False
+            self.pos = 0
+            self._restart_clock()
+
+        i = int(self.indices[self.pos])
+        self.pos += 1
+        if self.realtime:
+            recorded = float(self.recording.index[i]["timestamp"])
+            if self._clock is None:
+                self._clock = (time.monotonic(), recorded)
+            delay = self._clock[0] + (recorded - self._clock[1]) / self.speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        self.current = i
+        return True
+
+    def retrieve(self, image=None):
+        if self.current is None:
+            return False, None
+        frame = self.recording.frame(self.current)
+        if image is not None and image.shape == frame.shape and image.dtype == frame.dtype:
+            np.copyto(image, frame)
+            return True, image
+        return True, frame.copy()
+
+    def read(self, image=None):
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def depth(self):
+        """Записанная depth последнего кадра (float16) или None."""
+        return None if self.current is None else self.recording.depth(self.current)
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.pos)
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self.indices))
+        if prop == cv2.CAP_PROP_FPS:
+            times = self.recording.index["timestamp"][self.indices]
+            return float((len(times) - 1) / (times[-1] - times[0])) if len(times) > 1 and times[-1] > times[0] else 0.0
+        if prop in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT) and len(self.indices):
+            entry = self.recording.index[self.indices[0]]
+            return float(entry["frame_w"] if prop == cv2.CAP_PROP_FRAME_WIDTH else entry["frame_h"])
+        return 0.0
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.pos = min(max(0, int(value)), len(self.indices))
+            self._restart_clock()
+            return True
+        return False
+
+    def release(self):
+        if self.recording is not None:
+            self.recording.close()
+            self.recording = None
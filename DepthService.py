@@ -0,0 +1,464 @@
+"""
+Headless-сервис глубины: тот же DepthEstimator, что и в GUI, но без Qt.
+
+Кадры берутся из камеры, видеофайла или папки с картинками, depth-карты
+раздаются по HTTP (TCP-порт и/или unix-сокет) потоком multipart/x-mixed-replace:
+
+    GET /depth/<source>?format=f16|rgb|jpeg|png
+    GET /status
+    GET /metrics        — задержки стадий (PipelineMetrics) в формате Prometheus
+
+    f16  — сырая глубина сети (H', W') float16 little-endian
+    rgb  — раскрашенная карта (h, w, 3) uint8 размера исходного кадра
+    jpeg, png — она же, сжатая
+
+Размеры и номер кадра приходят в заголовках каждой части (X-Width, X-Height,
+X-Frame-Id, X-Timestamp). Все клиенты делят одну модель и один цикл инференса;
+медленный клиент просто пропускает кадры, а не копит очередь.
+
+С --workers N инференс идёт в пуле из N процессов (InferencePool): кадры
+разных источников считаются параллельно, в этом процессе остаются только
+чтение, раскраска и HTTP.
+
+    python DepthService.py --source 0 --source drive.mp4 --port 8080
+    python DepthService.py --source 0 --source 1 --source 2 --source 3 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from urllib.parse import urlsplit, parse_qs
+
+import cv2
+import numpy as np
+import torch
+
+from CpuScheduler import CpuPlan, pin_current_thread
+from DepthEstimator import DepthEstimator
+from FrameMailbox import LatestFrameMailbox
+from FrameSource import iter_frames
+from InferencePool import InferencePool
+from PipelineMetrics import JsonlExporter, PipelineMetrics
+from depth_anything.util.postprocess import DepthColorizer
+
+BOUNDARY = "depthframe"
+FORMATS = {
+    "f16": "application/octet-stream",
+    "rgb": "application/octet-stream",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+}
+
+
+class DepthResult:
+    """Depth-карта одного кадра; представления в разных форматах кодируются один раз и кешируются."""
+
+    def __init__(self, source_id, frame_id, timestamp, depth, frame_size):
+        self.source_id = source_id
+        self.frame_id = frame_id
+        self.timestamp = timestamp
+        self.depth = depth              # torch (H', W') float32 на CPU
+        self.frame_size = frame_size    # (h, w) исходного кадра
+        self._encoded = {}              # format -> asyncio.Future с (payload, width, height)
+
+    def encode(self, service, fmt):
+        """Кодирует результат в fmt в пуле потоков; параллельные запросы одного формата ждут одну задачу."""
+        future = self._encoded.get(fmt)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(None, service.encode, self, fmt)
+            self._encoded[fmt] = future
+        return future
+
+
+class FrameReader(threading.Thread):
+    """Поток чтения одного источника в одноместный ящик (старые кадры вытесняются)."""
+
+    def __init__(self, source, mailbox, fps=None, loop=False, cores=None, metrics=None, source_id=None):
+        super().__init__(daemon=True)
+        self.source = source
+        self.mailbox = mailbox
+        self.fps = fps
+        self.loop = loop
+        self.cores = cores
+        self.metrics = metrics
+        self.source_id = source_id
+        self._is_running = True
+
+    def run(self):
+        pin_current_thread(self.cores)
+        try:
+            start = time.perf_counter()
+            for frame in iter_frames(self.source, fps=self.fps, loop=self.loop):
+                if not self._is_running:
+                    break
+                if self.metrics is not None:
+                    now = time.perf_counter()
+                    self.metrics.record("capture", now - start, self.source_id)
+                    start = now
+                self.mailbox.put(frame)
+        except IOError as e:
+            print(e)
+
+    def stop(self):
+        self._is_running = False
+
+
+class DepthService:
+    def __init__(self, sources, encoder="vitl", fps=None, loop=False, jpeg_quality=85,
+                 resolution="full", target_fps=10.0, precision="fp32", backend="eager", cache_dir=None,
+                 reuse_threshold=None, keyframe_interval=30, warp=False, pin_cores=False, workers=0,
+                 metrics_jsonl=None):
+        self.sources = list(sources)
+        self.metrics = PipelineMetrics()
+        self.metrics_exporter = JsonlExporter(self.metrics, metrics_jsonl) if metrics_jsonl else None
+        # Ядра под чтение источников и инференс (см. CpuScheduler); пулы torch — до загрузки модели
+        self.cpu_plan = CpuPlan(num_cameras=len(self.sources)) if pin_cores else None
+        if self.cpu_plan is not None:
+            self.cpu_plan.configure_torch()
+            self.cpu_plan.configure_opencv()
+
+        self.pool = None
+        self.estimator = None
+        if workers > 0:
+            # Модель только в процессах пула. Переиспользование depth по кадрам здесь
+            # не работает: соседние кадры источника попадают в разные процессы.
+            if reuse_threshold is not None:
+                print("--reuse-threshold is ignored with --workers")
+            self.pool = InferencePool(workers, encoder=encoder, resolution=resolution,
+                                      target_fps=target_fps, precision=precision,
+                                      backend=backend, cache_dir=cache_dir)
+            self.colorizer = DepthColorizer(cv2.COLORMAP_INFERNO)
+        else:
+            self.estimator = DepthEstimator(encoder, resolution=resolution, target_fps=target_fps,
+                                            precision=precision, backend=backend, cache_dir=cache_dir)
+            self.estimator.set_temporal_reuse(reuse_threshold, keyframe_interval, warp)
+            self.estimator.set_metrics(self.metrics)
+            self.colorizer = self.estimator.colorizer
+        self._colorize_lock = threading.Lock()
+        self.jpeg_quality = jpeg_quality
+
+        # Как в ImageProcessor: общий condition, чтобы ждать кадр с любого источника
+        self._cond = threading.Condition()
+        self.mailboxes = [LatestFrameMailbox(self._cond) for _ in self.sources]
+        self.readers = [
+            FrameReader(source, mailbox, fps, loop,
+                        cores=self.cpu_plan.capture[i] if self.cpu_plan is not None else None,
+                        metrics=self.metrics, source_id=i)
+            for i, (source, mailbox) in enumerate(zip(self.sources, self.mailboxes))
+        ]
+
+        self.latest = [None] * len(self.sources)
+        self.processed_counts = [0] * len(self.sources)
+        # Ошибки инференса: цикл их пропускает и идёт дальше, в /status — число и последняя;
+        # inference_failed — цикл остановился совсем (в пуле не осталось процессов)
+        self.inference_errors = 0
+        self.last_error = None
+        self.inference_failed = False
+        self.clients = 0
+        self._frame_id = 0
+        self._is_running = False
+
+        self._loop = None
+        self._updated = None
+
+    # --- инференс (отдельный поток) ---
+
+    def _wait_frames(self, timeout):
+        with self._cond:
+            self._cond.wait_for(
+                lambda: not self._is_running or any(m.has_frame() for m in self.mailboxes),
+                timeout,
+            )
+            return [
+                (source_id, frame)
+                for source_id, frame in ((i, m.poll()) for i, m in enumerate(self.mailboxes))
+                if frame is not None
+            ]
+
+    def _inference_loop(self):
+        if self.cpu_plan is not None:
+            pin_current_thread(self.cpu_plan.inference)
+        while self._is_running:
+            batch = self._wait_frames(timeout=0.1)
+            if not batch:
+                continue
+
+            timestamp = time.time()
+            source_ids = [source_id for source_id, _ in batch]
+            try:
+                depths = self.estimator.infer([frame for _, frame in batch], source_ids)
+            except Exception as e:
+                # Битый кадр, нехватка памяти, сбой бэкенда: этот батч пропускаем, цикл живёт
+                self._report_error(source_ids, e)
+                continue
+
+            results = []
+            for (source_id, frame), depth in zip(batch, depths):
+                self._frame_id += 1
+                results.append(DepthResult(
+                    source_id, self._frame_id, timestamp, depth.float().cpu(), frame.shape[:2]
+                ))
+            self._loop.call_soon_threadsafe(self._publish, results)
+
+    def _pool_loop(self):
+        """
+        Инференс в пуле процессов: пока есть свободные слоты, раздаём свежие кадры,
+        в остальное время ждём результаты. Результаты источника могут прийти
+        не по порядку (разные процессы) — более старый, чем уже показанный, отбрасываем.
+        """
+        last_request = [-1] * len(self.sources)
+        while self._is_running:
+            if self.pool.can_submit():
+                batch = self._wait_frames(timeout=0.005 if self.pool.busy() else 0.1)
+                for source_id, frame in batch:
+                    self.pool.submit(frame, key=source_id)
+
+            try:
+                ready = self.pool.results(timeout=0.1 if not self.pool.can_submit() else 0.005)
+            except RuntimeError as e:
+                # Ни один процесс пула не загрузил модель: считать больше нечем
+                self._report_error(list(range(len(self.sources))), e)
+                self.inference_failed = True
+                return
+            results = []
+            for result in ready:
+                # Время от отправки в пул до готовой depth (очередь + препроцессинг + forward)
+                self.metrics.record("pool", result.latency, result.key)
+                if result.request_id < last_request[result.key]:
+                    continue
+                last_request[result.key] = result.request_id
+                self._frame_id += 1
+                results.append(DepthResult(
+                    result.key, self._frame_id, time.time(), torch.from_numpy(result.depth), result.frame_size
+                ))
+            if results:
+                self._loop.call_soon_threadsafe(self._publish, results)
+
+    def _report_error(self, source_ids, error):
+        self.inference_errors += 1
+        self.last_error = {
+            "sources": source_ids,
+            "error": f"{type(error).__name__}: {error}",
+            "time": time.time(),
+        }
+        print(f"Inference failed for sources {source_ids}: {self.last_error['error']}")
+
+    async def _notify(self):
+        async with self._updated:
+            self._updated.notify_all()
+
+    def _publish(self, results):
+        for result in results:
+            self.latest[result.source_id] = result
+            self.processed_counts[result.source_id] += 1
+        asyncio.ensure_future(self._notify())
+
+    # --- кодирование (пул потоков) ---
+
+    def encode(self, result, fmt):
+        """Возвращает (payload bytes, width, height) для результата в формате fmt."""
+        if fmt == "f16":
+            depth = result.depth.numpy().astype("<f2")
+            return depth.tobytes(), depth.shape[1], depth.shape[0]
+
+        h, w = result.frame_size
+        rgb = np.empty((h, w, 3), dtype=np.uint8)
+        with self._colorize_lock, self.metrics.timer("postprocess", result.source_id):
+            self.colorizer(result.depth, (h, w), key=result.source_id, out=rgb)
+
+        if fmt == "rgb":
+            return rgb.tobytes(), w, h
+
+        bgr = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality] if fmt == "jpeg" else []
+        ok, encoded = cv2.imencode("." + fmt, bgr, params)
+        if not ok:
+            raise RuntimeError(f"Не удалось закодировать кадр в {fmt}")
+        return encoded.tobytes(), w, h
+
+    # --- HTTP ---
+
+    async def handle_client(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").strip()
+            # Заголовки запроса нам не нужны, просто дочитываем до пустой строки
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+
+            parts = request_line.split()
+            if len(parts) < 2 or parts[0] != "GET":
+                await self._respond(writer, 405, "text/plain", b"only GET is supported\n")
+                return
+
+            url = urlsplit(parts[1])
+            query = parse_qs(url.query)
+            path = url.path.rstrip("/").split("/")[1:]
+
+            if path == ["status"]:
+                await self._respond(writer, 200, "application/json", json.dumps(self.status()).encode())
+            elif path == ["metrics"]:
+                await self._respond(writer, 200, "text/plain; version=0.0.4", self.metrics.to_prometheus().encode())
+            elif path and path[0] == "depth":
+                source_id = int(path[1]) if len(path) > 1 and path[1].isdigit() else 0
+                fmt = query.get("format", ["jpeg"])[0]
+                if fmt not in FORMATS or not 0 <= source_id < len(self.sources):
+                    await self._respond(writer, 400, "text/plain", b"bad source or format\n")
+                    return
+                await self._stream(writer, source_id, fmt)
+            else:
+                await self._respond(writer, 404, "text/plain", b"not found\n")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, code, content_type, body):
+        writer.write(
+            f"HTTP/1.1 {code} {'OK' if code == 200 else 'Error'}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+    async def _stream(self, writer, source_id, fmt):
+        writer.write(
+            "HTTP/1.1 200 OK\r\n"
+            f"Content-Type: multipart/x-mixed-replace; boundary={BOUNDARY}\r\n"
+            "Cache-Control: no-cache\r\n"
+            "Connection: close\r\n\r\n".encode()
+        )
+        self.clients += 1
+        try:
+            last_id = None
+            while True:
+                async with self._updated:
+                    await self._updated.wait_for(
+                        lambda: self.latest[source_id] is not None
+                        and self.latest[source_id].frame_id != last_id
+                    )
+                    result = self.latest[source_id]
+
+                payload, width, height = await result.encode(self, fmt)
+                writer.write(
+                    f"--{BOUNDARY}\r\n"
+                    f"Content-Type: {FORMATS[fmt]}\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"X-Width: {width}\r\n"
+                    f"X-Height: {height}\r\n"
+                    f"X-Frame-Id: {result.frame_id}\r\n"
+                    f"X-Timestamp: {result.timestamp:.6f}\r\n\r\n".encode()
+                )
+                writer.write(payload)
+                writer.write(b"\r\n")
+                await writer.drain()
+                last_id = result.frame_id
+        finally:
+            self.clients -= 1
+
+    def status(self):
+        status = {
+            "sources": [str(source) for source in self.sources],
+            "clients": self.clients,
+            "processed": self.processed_counts,
+            "dropped": [m.dropped for m in self.mailboxes],
+            "inference": "failed" if self.inference_failed else "running",
+            "inference_errors": self.inference_errors,
+            "last_error": self.last_error,
+        }
+        if self.pool is not None:
+            status["pool"] = self.pool.stats()
+        elif self.estimator.temporal is not None:
+            status["temporal"] = [self.estimator.temporal.stats(i) for i in range(len(self.sources))]
+        return status
+
+    # --- запуск ---
+
+    async def serve(self, host=None, port=None, unix_path=None):
+        self._loop = asyncio.get_running_loop()
+        self._updated = asyncio.Condition()
+        self._is_running = True
+
+        for reader in self.readers:
+            reader.start()
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.start()
+        inference = threading.Thread(
+            target=self._pool_loop if self.pool is not None else self._inference_loop, daemon=True
+        )
+        inference.start()
+
+        servers = []
+        if port is not None:
+            servers.append(await asyncio.start_server(self.handle_client, host, port))
+            print(f"Serving depth on http://{host or '0.0.0.0'}:{port}/depth/0")
+        if unix_path is not None:
+            servers.append(await asyncio.start_unix_server(self.handle_client, unix_path))
+            print(f"Serving depth on unix:{unix_path}")
+
+        try:
+            await asyncio.gather(*(server.serve_forever() for server in servers))
+        finally:
+            self._is_running = False
+            for reader in self.readers:
+                reader.stop()
+            with self._cond:
+                self._cond.notify_all()
+            inference.join(timeout=5)
+            if self.metrics_exporter is not None:
+                self.metrics_exporter.stop()
+            if self.pool is not None:
+                self.pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", action="append", required=True,
+                        help="индекс камеры, видеофайл или папка с картинками (можно несколько)")
+    parser.add_argument("--encoder", default="vitl", choices=["vits", "vitb", "vitl"])
+    parser.add_argument("--precision", default="fp32", choices=["fp32", "bf16", "int8"])
+    parser.add_argument("--backend", default="eager", choices=["eager", "trace", "compile", "onnx"])
+    parser.add_argument("--cache-dir", default=None, help="куда сохранять trace/onnx-артефакты")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", default=8080, type=int)
+    parser.add_argument("--unix", default=None, help="путь unix-сокета (вместо/вместе с TCP)")
+    parser.add_argument("--no-tcp", action="store_true")
+    parser.add_argument("--fps", default=None, type=float, help="темп чтения файлов/папок")
+    parser.add_argument("--loop", action="store_true", help="зацикливать файлы/папки")
+    parser.add_argument("--resolution", default="full",
+                        help="пресет (full/high/medium/low/tiny), короткая сторона, patches:N или adaptive")
+    parser.add_argument("--target-fps", default=10.0, type=float, help="цель для --resolution adaptive")
+    parser.add_argument("--reuse-threshold", default=None, type=float,
+                        help="переиспользовать depth, если кадр изменился меньше (0..1, например 0.02)")
+    parser.add_argument("--keyframe-interval", default=30, type=int,
+                        help="не больше стольких переиспользований подряд")
+    parser.add_argument("--warp", action="store_true", help="сдвигать переиспользуемую depth за камерой")
+    parser.add_argument("--pin-cores", action="store_true",
+                        help="разделить ядра между чтением источников и инференсом (Linux)")
+    parser.add_argument("--workers", default=0, type=int,
+                        help="инференс в N отдельных процессах (для нескольких камер)")
+    parser.add_argument("--metrics-jsonl", default=None,
+                        help="дописывать сюда замеры стадий (JSON lines, раз в 5 с); они же — GET /metrics")
+    args = parser.parse_args()
+
+    service = DepthService(args.source, args.encoder, fps=args.fps, loop=args.loop,
+                           resolution=args.resolution, target_fps=args.target_fps,
+                           precision=args.precision, backend=args.backend,
+                           cache_dir=args.cache_dir, reuse_threshold=args.reuse_threshold,
+                           keyframe_interval=args.keyframe_interval, warp=args.warp,
+                           pin_cores=args.pin_cores, workers=args.workers,
+                           metrics_jsonl=args.metrics_jsonl)
+    try:
+        asyncio.run(service.serve(
+            host=args.host,
+            port=None if args.no_tcp else args.port,
+            unix_path=args.unix,
+        ))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,383 @@
+"""
+Граф фильтров OpenCV для кадров камеры: список шагов описывается один раз,
+компилируется под размер кадра и дальше исполняется без выделения памяти.
+
+    graph = FilterGraph([Resize(scale=0.5), Blur(10), Resize(size="input"),
+                         ConvertColor(cv2.COLOR_BGR2RGB)])
+    rgb = graph(frame)          # первый вызов (и смена размера кадра) компилирует
+    print(graph.describe())     # план после слияний
+
+    FilterGraph.from_spec([{"op": "crop", "x": 0, "y": 0, "width": 320, "height": 240},
+                           {"op": "convert", "code": "BGR2GRAY"},
+                           {"op": "colormap", "colormap": "INFERNO"}])
+
+Что делает компиляция (результат тот же, работы меньше):
+  - перестановка каналов (BGR2RGB и т.п.) и перевод в серый переезжают через
+    соседние resize/blur/crop туда, где всему графу меньше работы: в примере
+    выше BGR2RGB делается на уменьшенном кадре, и последний resize сразу даёт
+    RGB, а серый считается до blur, и тот размывает один канал, а не три;
+  - перестановка каналов сразу после ColorMap уходит в таблицу цветов;
+  - взаимно обратные перестановки каналов сокращаются (и через resize/blur/crop
+    между ними), resize в тот же размер выбрасывается;
+  - Crop — срез без копии, следующий шаг читает прямо из него.
+Серый, посчитанный до resize/blur, отличается от "после" на 1-2 (округление uint8).
+
+Промежуточные буферы выделяются при компиляции и переиспользуются (dst=).
+Выход — кольцо из outputs буферов: результат вызова остаётся целым ещё
+outputs - 1 вызовов, копировать его перед показом не нужно.
+"""
+import time
+
+import cv2
+import numpy as np
+
+
+def _channels(shape):
+    return shape[2] if len(shape) == 3 else 1
+
+
+def _with_channels(shape, channels):
+    return shape[:2] if channels == 1 else shape[:2] + (channels,)
+
+
+def _color_code(code):
+    return getattr(cv2, "COLOR_" + code) if isinstance(code, str) else code
+
+
+def _colormap_code(colormap):
+    return getattr(cv2, "COLORMAP_" + colormap) if isinstance(colormap, str) else colormap
+
+
+class Resize:
+    """
+    Масштаб до size=(w, h), в scale раз (число или (fx, fy)) или,
+    при size="input", обратно до размера входного кадра графа.
+    """
+    view = False
+
+    def __init__(self, size=None, scale=None, interpolation=cv2.INTER_LINEAR):
+        if (size is None) == (scale is None):
+            raise ValueError("Resize: нужен ровно один из size и scale")
+        self.size = size if size is None or size == "input" else tuple(size)
+        self.scale = scale
+        self.interpolation = interpolation
+
+    def bind(self, shape, input_shape):
+        h, w = shape[:2]
+        if self.size == "input":
+            size = (input_shape[1], input_shape[0])
+        elif self.size is not None:
+            size = self.size
+        else:
+            fx, fy = self.scale if isinstance(self.scale, (tuple, list)) else (self.scale, self.scale)
+            size = (max(1, int(w * fx)), max(1, int(h * fy)))
+        return Resize(size, interpolation=self.interpolation)
+
+    def output_shape(self, shape):
+        return (self.size[1], self.size[0]) + shape[2:]
+
+    def apply(self, src, dst):
+        return cv2.resize(src, self.size, dst=dst, interpolation=self.interpolation)
+
+    def __repr__(self):
+        return f"resize {self.size[0]}x{self.size[1]}" if self.scale is None else f"resize x{self.scale}"
+
+
+class Blur:
+    """Гауссово размытие; ksize=(0, 0) — размер ядра по sigma."""
+    view = False
+
+    def __init__(self, sigma, ksize=(0, 0)):
+        self.sigma = sigma
+        self.ksize = tuple(ksize)
+
+    def bind(self, shape, input_shape):
+        return self
+
+    def output_shape(self, shape):
+        return shape
+
+    def apply(self, src, dst):
+        return cv2.GaussianBlur(src, self.ksize, self.sigma, dst=dst)
+
+    def __repr__(self):
+        return f"blur sigma={self.sigma}"
+
+
+class Crop:
+    """Прямоугольник (x, y, width, height); None в width/height — до края кадра."""
+    view = True
+
+    def __init__(self, x, y, width=None, height=None):
+        self.x, self.y = x, y
+        self.width, self.height = width, height
+
+    def bind(self, shape, input_shape):
+        h, w = shape[:2]
+        width = w - self.x if self.width is None else self.width
+        height = h - self.y if self.height is None else self.height
+        if self.x < 0 or self.y < 0 or width <= 0 or height <= 0 or self.x + width > w or self.y + height > h:
+            raise ValueError(f"Crop ({self.x}, {self.y}, {width}, {height}) не помещается в кадр {w}x{h}")
+        return Crop(self.x, self.y, width, height)
+
+    def output_shape(self, shape):
+        return (self.height, self.width) + shape[2:]
+
+    def apply(self, src, dst=None):
+        return src[self.y:self.y + self.height, self.x:self.x + self.width]
+
+    def __repr__(self):
+        return f"crop {self.width}x{self.height}+{self.x}+{self.y}"
+
+
+class ConvertColor:
+    """
+    cv2.cvtColor с кодом code (cv2.COLOR_* или имя без префикса: "BGR2RGB").
+    При компиляции код пробуется на одном пикселе: так узнаём число каналов
+    на выходе и то, не перестановка ли это каналов.
+    """
+    view = False
+    _GRAY = {cv2.COLOR_BGR2GRAY, cv2.COLOR_RGB2GRAY, cv2.COLOR_BGRA2GRAY, cv2.COLOR_RGBA2GRAY}
+
+    def __init__(self, code):
+        self.code = _color_code(code)
+        self.channels = None
+        self.permutation = None
+
+    def bind(self, shape, input_shape):
+        bound = ConvertColor(self.code)
+        channels = _channels(shape)
+        probe = np.arange(1, channels + 1, dtype=np.uint8).reshape(1, 1, channels)
+        out = cv2.cvtColor(probe, self.code).reshape(-1)
+        bound.channels = out.size
+        if out.size == channels and sorted(out) == list(range(1, channels + 1)):
+            bound.permutation = out.astype(np.intp) - 1
+        return bound
+
+    @property
+    def movable(self):
+        """Перестановка каналов или линейный перевод в серый: коммутирует с resize/blur/crop."""
+        return self.permutation is not None or self.code in self._GRAY
+
+    def output_shape(self, shape):
+        return _with_channels(shape, self.channels)
+
+    def apply(self, src, dst):
+        return cv2.cvtColor(src, self.code, dst=dst)
+
+    def __repr__(self):
+        names = [name[6:] for name in dir(cv2) if name.startswith("COLOR_") and getattr(cv2, name) == self.code]
+        return f"convert {names[0] if names else self.code}"
+
+
+class ColorMap:
+    """cv2.applyColorMap (кадр uint8, 1 или 3 канала); rgb=True — сразу в RGB."""
+    view = False
+
+    def __init__(self, colormap=cv2.COLORMAP_INFERNO, rgb=False):
+        self.colormap = _colormap_code(colormap)
+        self.rgb = rgb
+        self._lut = None
+
+    def bind(self, shape, input_shape):
+        return ColorMap(self.colormap, self.rgb)
+
+    def swapped(self):
+        """Тот же ColorMap с переставленными R и B в таблице."""
+        return ColorMap(self.colormap, not self.rgb)
+
+    def output_shape(self, shape):
+        return shape[:2] + (3,)
+
+    def apply(self, src, dst):
+        if not self.rgb:
+            return cv2.applyColorMap(src, self.colormap, dst=dst)
+        if self._lut is None:
+            lut_bgr = cv2.applyColorMap(np.arange(256, dtype=np.uint8).reshape(256, 1), self.colormap)
+            self._lut = np.ascontiguousarray(lut_bgr[:, :, ::-1])
+        return cv2.applyColorMap(src, self._lut, dst=dst)
+
+    def __repr__(self):
+        names = [name[9:] for name in dir(cv2) if name.startswith("COLORMAP_") and getattr(cv2, name) == self.colormap]
+        return f"colormap {names[0] if names else self.colormap}" + (" rgb" if self.rgb else "")
+
+
+STEPS = {"resize": Resize, "blur": Blur, "crop": Crop, "convert": ConvertColor, "colormap": ColorMap}
+_COMMUTING = (Resize, Blur, Crop)
+
+
+def _shapes(steps, shape):
+    """Форма кадра перед каждым шагом и после последнего."""
+    shapes = [shape]
+    for step in steps:
+        shapes.append(step.output_shape(shapes[-1]))
+    return shapes
+
+
+def _cost(steps, shape):
+    """Сколько значений пишут шаги (срезы бесплатны) — мера работы для выбора порядка."""
+    cost = 0
+    for step, out in zip(steps, _shapes(steps, shape)[1:]):
+        if not step.view:
+            cost += out[0] * out[1] * _channels(out)
+    return cost
+
+
+def _inverse(first, second):
+    return (isinstance(first, ConvertColor) and isinstance(second, ConvertColor)
+            and first.permutation is not None and second.permutation is not None
+            and len(first.permutation) == len(second.permutation)
+            and (first.permutation[second.permutation] == np.arange(len(first.permutation))).all())
+
+
+def _optimize(steps, shape):
+    """Слияния и перестановки над уже привязанными к размерам шагами."""
+    steps = [step for step, before in zip(steps, _shapes(steps, shape))
+             if not (isinstance(step, Resize) and step.output_shape(before) == before)]
+
+    # Взаимно обратные перестановки каналов, между которыми только resize/blur/crop
+    i = 0
+    while i < len(steps):
+        j = i + 1
+        while j < len(steps) and isinstance(steps[j], _COMMUTING):
+            j += 1
+        if j < len(steps) and _inverse(steps[i], steps[j]):
+            del steps[j], steps[i]
+        else:
+            i += 1
+
+    for convert in [step for step in steps if isinstance(step, ConvertColor) and step.movable]:
+        i = steps.index(convert)
+        rest = steps[:i] + steps[i + 1:]
+        lo, hi = i, i
+        while lo > 0 and isinstance(rest[lo - 1], _COMMUTING):
+            lo -= 1
+        while hi < len(rest) and isinstance(rest[hi], _COMMUTING):
+            hi += 1
+
+        # Перестановка R и B сразу после ColorMap — это другая таблица цветов
+        if (convert.permutation is not None and lo > 0 and isinstance(rest[lo - 1], ColorMap)
+                and list(convert.permutation) == [2, 1, 0]):
+            rest[lo - 1] = rest[lo - 1].swapped()
+            steps = rest
+            continue
+
+        best = min(range(lo, hi + 1), key=lambda k: (_cost(rest[:k] + [convert] + rest[k:], shape), k))
+        steps = rest[:best] + [convert] + rest[best:]
+    return steps
+
+
+class FilterGraph:
+    """
+    Последовательность шагов (Resize, Blur, Crop, ConvertColor, ColorMap).
+    Не потокобезопасен: один граф — один поток обработки.
+    """
+
+    def __init__(self, steps, outputs=3):
+        self.steps = list(steps)
+        self.outputs = outputs
+        self._key = None
+        self.plan = []          # [(шаг, индекс буфера или None для среза)]
+        self._buffers = []
+        self._output_ring = []
+        self._next_output = 0
+
+    @classmethod
+    def from_spec(cls, spec, outputs=3):
+        """Граф из списка словарей {"op": "resize"|"blur"|"crop"|"convert"|"colormap", **параметры}."""
+        steps = []
+        for item in spec:
+            params = dict(item)
+            steps.append(STEPS[params.pop("op")](**params))
+        return cls(steps, outputs)
+
+    def compile(self, shape, dtype=np.uint8):
+        """План и буферы под кадр формы shape; вызывается сам при смене размера."""
+        shape = tuple(shape)
+        bound, current = [], shape
+        for step in self.steps:
+            step = step.bind(current, shape)
+            bound.append(step)
+            current = step.output_shape(current)
+        steps = _optimize(bound, shape)
+        shapes = _shapes(steps, shape)
+
+        # Последний шаг пишет в кольцо выходов; если это срез — докопируем
+        if steps and steps[-1].view:
+            steps.append(_Copy())
+            shapes.append(shapes[-1])
+
+        # Буфер шага — любой свободный той же формы, кроме того, из которого шаг читает
+        buffers, plan, source = [], [], None
+        for i, step in enumerate(steps[:-1]):
+            if step.view:
+                plan.append((step, None))
+                continue
+            out_shape = shapes[i + 1]
+            index = next((j for j, buf in enumerate(buffers) if buf.shape == out_shape and j != source), None)
+            if index is None:
+                buffers.append(np.empty(out_shape, dtype))
+                index = len(buffers) - 1
+            plan.append((step, index))
+            source = index
+        if steps:
+            plan.append((steps[-1], -1))
+
+        self.plan = plan
+        self._buffers = buffers
+        self._output_ring = [np.empty(shapes[-1], dtype) for _ in range(self.outputs)] if steps else []
+        self._next_output = 0
+        self._key = (shape, np.dtype(dtype))
+
+    def __call__(self, frame, timings=None):
+        """
+        Прогон кадра. timings (dict) — если передан, в него копятся секунды по шагам плана.
+        Возвращает буфер из кольца выходов (без шагов — сам кадр).
+        """
+        if self._key != (frame.shape, frame.dtype):
+            self.compile(frame.shape, frame.dtype)
+        src = frame
+        for step, index in self.plan:
+            if index == -1:
+                dst = self._output_ring[self._next_output]
+                self._next_output = (self._next_output + 1) % self.outputs
+            else:
+                dst = None if index is None else self._buffers[index]
+            if timings is None:
+                src = step.apply(src, dst)
+            else:
+                start = time.perf_counter()
+                src = step.apply(src, dst)
+                key = repr(step)
+                timings[key] = timings.get(key, 0.0) + time.perf_counter() - start
+        return src
+
+    def naive(self, frame):
+        """Шаги как написаны, без слияний и с новым массивом на каждом — для проверки и сравнения."""
+        shape = frame.shape
+        for step in self.steps:
+            step = step.bind(frame.shape, shape)
+            frame = step.apply(frame, None)
+        return frame
+
+    def describe(self):
+        """План после компиляции, по строке на шаг."""
+        lines = []
+        for step, index in self.plan:
+            target = "view" if index is None else "output" if index == -1 else f"buffer {index}"
+            lines.append(f"{step!r} -> {target}")
+        return "\n".join(lines)
+
+
+class _Copy:
+    view = False
+
+    def output_shape(self, shape):
+        return shape
+
+    def apply(self, src, dst):
+        np.copyto(dst, src)
+        return dst
+
+    def __repr__(self):
+        return "copy"
@@ -0,0 +1,94 @@
+import threading
+
+from SharedRing import release
+
+
+class LatestFrameMailbox:
+    """
+    Одноместный "почтовый ящик" между захватом и обработкой.
+
+    Захват кладёт кадр через put(), обработка забирает через take().
+    Если обработка не успевает, старый непрочитанный кадр просто
+    заменяется новым (latest-frame-wins) и учитывается в счётчике dropped.
+    Так очередь не растёт, а задержка ограничена одним кадром.
+    Кадр может быть FrameHandle (SharedRing.FrameRing): ящик владеет одной
+    его ссылкой — вытесненный или выброшенный кадр отпускается, а забравший
+    кадр через take()/poll() отпускает его сам.
+    """
+
+    def __init__(self, condition=None):
+        # Общий condition позволяет одному потребителю ждать сразу несколько ящиков
+        self._cond = condition if condition is not None else threading.Condition()
+        self._frame = None
+        self._closed = False
+
+        self.put_count = 0
+        self.dropped = 0
+        self.taken = 0
+
+    @property
+    def condition(self):
+        return self._cond
+
+    def put(self, frame):
+        """Кладёт кадр, вытесняя непрочитанный. Никогда не блокирует захват."""
+        with self._cond:
+            if self._frame is not None:
+                self.dropped += 1
+                release(self._frame)
+            self._frame = frame
+            self.put_count += 1
+            self._cond.notify_all()
+
+    def _pop(self):
+        # Вызывается только под self._cond
+        frame = self._frame
+        if frame is not None:
+            self._frame = None
+            self.taken += 1
+        return frame
+
+    def poll(self):
+        """Забирает кадр без ожидания (или None)."""
+        with self._cond:
+            return self._pop()
+
+    def take(self, timeout=None):
+        """
+        Ждёт и забирает самый свежий кадр.
+        Возвращает None по таймауту или после close().
+        """
+        with self._cond:
+            if self._frame is None and not self._closed:
+                self._cond.wait_for(lambda: self._frame is not None or self._closed, timeout)
+            return self._pop()
+
+    def has_frame(self):
+        return self._frame is not None
+
+    def clear(self):
+        """Выбрасывает непрочитанный кадр (например, при смене камеры)."""
+        with self._cond:
+            release(self._frame)
+            self._frame = None
+
+    def close(self):
+        """Будит всех ожидающих, дальнейшие take() сразу возвращают None."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def reopen(self):
+        with self._cond:
+            self._closed = False
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def stats(self):
+        return {
+            "captured": self.put_count,
+            "dropped": self.dropped,
+            "taken": self.taken,
+        }
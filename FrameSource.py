@@ -0,0 +1,117 @@
+import os
+import time
+
+import cv2
+
+from DepthRecording import EXTENSION as RECORDING_EXTENSION, ReplayCapture
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+
+
+def parse_source(source):
+    """
+    Строка из командной строки -> источник кадров:
+    число — индекс камеры, папка — набор картинок, иначе — видеофайл.
+    """
+    if isinstance(source, int):
+        return source
+    if isinstance(source, str) and source.isdigit():
+        return int(source)
+    return source
+
+
+def open_capture(source, realtime=True):
+    """
+    cv2.VideoCapture для камеры/видеофайла или ReplayCapture для записи .depthrec.
+    У записи с несколькими камерами источник выбирается суффиксом: drive.depthrec#1.
+    realtime — отдавать кадры записи в её темпе (как живая камера).
+    """
+    if isinstance(source, str):
+        path, _, index = source.partition("#")
+        if path.lower().endswith(RECORDING_EXTENSION):
+            return ReplayCapture(path, source=int(index or 0), realtime=realtime)
+    return cv2.VideoCapture(source)
+
+
+def list_images(folder):
+    """Картинки в папке в порядке имён (кадры записи обычно пронумерованы)."""
+    return [
+        os.path.join(folder, name)
+        for name in sorted(os.listdir(folder))
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    ]
+
+
+def count_frames(source):
+    """Число кадров в файле/папке (для камеры — None). У видео это оценка из контейнера."""
+    source = parse_source(source)
+    if isinstance(source, int):
+        return None
+    if os.path.isdir(source):
+        return len(list_images(source))
+    cap = open_capture(source, realtime=False)
+    try:
+        n = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        return n if n > 0 else None
+    finally:
+        cap.release()
+
+
+def iter_frames(source, start=0, fps=None, loop=False, with_index=False):
+    """
+    Генератор BGR-кадров из камеры, видеофайла, записи .depthrec или папки с картинками.
+    Кадры читаются по одному, так что длинная запись не лежит в памяти целиком.
+
+    start — с какого кадра источника начать (для продолжения прерванной обработки);
+    fps — выдавать не быстрее этой частоты (имитация живой камеры для файлов);
+    loop — для файлов/папок начинать сначала по достижении конца;
+    with_index — выдавать (номер кадра в источнике, кадр). Нечитаемые картинки
+    пропускаются, поэтому номер не совпадает со счётчиком выданных кадров.
+    """
+    source = parse_source(source)
+    period = 1.0 / fps if fps else 0.0
+    next_time = time.monotonic()
+
+    while True:
+        if isinstance(source, str) and os.path.isdir(source):
+            frames = enumerate((cv2.imread(path, cv2.IMREAD_COLOR) for path in list_images(source)[start:]), start)
+        else:
+            frames = _iter_capture(source, start)
+
+        for index, frame in frames:
+            if frame is None:
+                continue
+            if period:
+                delay = next_time - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_time = max(next_time + period, time.monotonic() - period)
+            yield (index, frame) if with_index else frame
+
+        if not loop or isinstance(source, int):
+            return
+        start = 0
+
+
+def _iter_capture(source, start=0):
+    """(номер кадра, кадр) с камеры, из видеофайла или записи."""
+    live = isinstance(source, int)
+    # Темп задаёт fps в iter_frames, как и для видеофайлов
+    cap = open_capture(source, realtime=False)
+    if not cap.isOpened():
+        raise IOError(f"Не удалось открыть источник {source!r}")
+    try:
+        if start:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        index = start
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                # Камера иногда отдаёт пустой кадр — пропускаем, файл — закончился
+                if live:
+                    continue
+                return
+            yield index, frame
+            index += 1
+    finally:
+        cap.release()
@@ -0,0 +1,181 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from PySide6.QtCore import QObject, Signal, Slot, Qt
+from PySide6.QtGui import QColor, QFont, QImage, QPainter
+from PySide6.QtWidgets import QWidget
+
+from FrameMailbox import LatestFrameMailbox
+from SharedRing import as_array, release
+
+
+class FramePresenter(QObject):
+    """
+    Готовит кадры к показу вне GUI-потока.
+
+    Кадр масштабируется под размер FrameView прямо в один из постоянных
+    буферов и оборачивается в QImage без копирования (Format_BGR888 для
+    сырых BGR-кадров, Format_RGB888 для depth-карт). GUI-потоку остаётся
+    только подменить картинку и перерисоваться.
+
+    Буферов три: один сейчас на экране, один ждёт показа, в третий пишем.
+    Пока GUI не показал предыдущий кадр, новый не готовится: он ждёт
+    в одноместном ящике и вытесняется более свежим, а не копится в очереди событий.
+    """
+    # (QImage, буфер numpy под ним) — буфер передаём, чтобы он жил, пока QImage на экране
+    imageReady = Signal(object)
+    _wake = Signal()
+
+    NUM_BUFFERS = 3
+
+    def __init__(self, image_format=QImage.Format_BGR888, metrics=None, source=None, parent=None):
+        super().__init__(parent)
+        self.image_format = image_format
+
+        self.mailbox = LatestFrameMailbox()
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        # Замеры (PipelineMetrics): display — подготовка кадра, end_to_end — от захвата
+        # до подмены картинки в GUI; source — камера, к которой их относить
+        self.metrics = metrics
+        self.source = source
+        self._captured_at = None
+        self._pending_captured_at = None
+
+        self._target_size = None
+        self._buffers = []
+        self._next = 0
+
+        self._wake.connect(self._present)
+
+    def setTargetSize(self, width: int, height: int):
+        """Размер области показа (вызывается из GUI при resize)."""
+        self._target_size = (max(1, width), max(1, height))
+
+    def submit(self, frame, captured_at=None):
+        """
+        Кладёт кадр на показ. Потокобезопасно, можно звать из потока захвата.
+        FrameHandle передаётся вместе с одной ссылкой: её отпустят после масштабирования.
+        captured_at — time.perf_counter() захвата кадра, для замера end_to_end.
+        """
+        with self._lock:
+            self._captured_at = captured_at
+            self.mailbox.put(frame)
+        self._wake.emit()
+
+    def imageShown(self):
+        """GUI подменил картинку — буфер ожидающего кадра теперь на экране."""
+        with self._lock:
+            self._pending = max(0, self._pending - 1)
+            captured_at, self._pending_captured_at = self._pending_captured_at, None
+        if self.metrics is not None and captured_at is not None:
+            self.metrics.record("end_to_end", time.perf_counter() - captured_at, self.source)
+        # Пока ждали GUI, мог прийти новый кадр
+        if self.mailbox.has_frame():
+            self._wake.emit()
+
+    def _fit(self, w, h):
+        """Размер кадра, вписанного в область показа с сохранением пропорций."""
+        if self._target_size is None:
+            return w, h
+        tw, th = self._target_size
+        scale = min(tw / w, th / h)
+        return max(1, int(w * scale)), max(1, int(h * scale))
+
+    def _get_buffer(self, w, h):
+        if not self._buffers or self._buffers[0].shape[:2] != (h, w):
+            # Старые буферы не трогаем: на них могут ссылаться показанные QImage
+            self._buffers = [np.empty((h, w, 3), dtype=np.uint8) for _ in range(self.NUM_BUFFERS)]
+            self._next = 0
+        buf = self._buffers[self._next]
+        self._next = (self._next + 1) % self.NUM_BUFFERS
+        return buf
+
+    @Slot()
+    def _present(self):
+        with self._lock:
+            if self._pending > 0:
+                # Покажем после imageShown()
+                return
+            frame = self.mailbox.poll()
+            if frame is None:
+                return
+            self._pending += 1
+            self._pending_captured_at = self._captured_at
+
+        start = time.perf_counter()
+        image = as_array(frame)
+        h, w = image.shape[:2]
+        out_w, out_h = self._fit(w, h)
+        buf = self._get_buffer(out_w, out_h)
+        if (out_w, out_h) == (w, h):
+            np.copyto(buf, image)
+        else:
+            interpolation = cv2.INTER_AREA if out_w < w else cv2.INTER_LINEAR
+            cv2.resize(image, (out_w, out_h), dst=buf, interpolation=interpolation)
+        # Кадр скопирован в свой буфер, слот кольца захвата больше не нужен
+        release(frame)
+
+        qimg = QImage(buf.data, out_w, out_h, buf.strides[0], self.image_format)
+        if self.metrics is not None:
+            self.metrics.record("display", time.perf_counter() - start, self.source)
+        self.imageReady.emit((qimg, buf))
+
+
+class FrameView(QWidget):
+    """
+    Замена QLabel для видео: рисует готовый QImage в paintEvent,
+    без QPixmap.fromImage и масштабирования в GUI-потоке.
+    """
+
+    def __init__(self, text="", presenter=None, parent=None):
+        super().__init__(parent)
+        self.text = text
+        self.presenter = presenter
+        self._image = None
+        self._buffer = None
+        # Текст поверх картинки (например, замеры конвейера); None — без оверлея
+        self._overlay = None
+
+        if presenter is not None:
+            presenter.imageReady.connect(self.setImage)
+
+    def setOverlay(self, text):
+        self._overlay = text or None
+        self.update()
+
+    @Slot(object)
+    def setImage(self, image_and_buffer):
+        self._image, self._buffer = image_and_buffer
+        if self.presenter is not None:
+            self.presenter.imageShown()
+        self.update()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.presenter is not None:
+            self.presenter.setTargetSize(self.width(), self.height())
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        if self._image is None:
+            painter.drawText(self.rect(), Qt.AlignCenter, self.text)
+            return
+
+        # Картинка уже вписана в размер виджета, рисуем по центру 1:1
+        x = (self.width() - self._image.width()) // 2
+        y = (self.height() - self._image.height()) // 2
+        painter.drawImage(x, y, self._image)
+
+        if self._overlay:
+            font = QFont("monospace", 8)
+            font.setStyleHint(QFont.TypeWriter)
+            painter.setFont(font)
+            rect = painter.boundingRect(self.rect().adjusted(6, 6, -6, -6), Qt.AlignLeft | Qt.AlignTop, self._overlay)
+            painter.fillRect(rect.adjusted(-4, -4, 4, 4), QColor(0, 0, 0, 160))
+            painter.setPen(QColor(255, 255, 255))
+            painter.drawText(rect, Qt.AlignLeft | Qt.AlignTop, self._overlay)
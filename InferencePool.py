@@ -0,0 +1,340 @@
+"""
+Пул процессов инференса для многокамерных стендов.
+
+Фиксированное число процессов, в каждом своя DepthAnything. Веса общие:
+каждый процесс отображает в память один и тот же закешированный файл весов
+(depth_anything.weights), и страницы лежат в page cache один раз на машину.
+Кадры и depth-карты ходят через кольца разделяемой памяти (SharedRing.ShmSlots),
+по каналу процессу уходит только номер слота и форма — без pickle массивов.
+
+    pool = InferencePool(num_workers=4, encoder="vits")
+    pool.submit(frame, key=camera_id)       # None — все слоты заняты, кадр отброшен
+    for result in pool.results(timeout=0.05):
+        result.key, result.depth, result.frame_size
+
+Упавший процесс перезапускается на тех же кольцах; его кадры в работе
+пропадают (счётчик lost), захват и остальные процессы не задеты. Процесс,
+который умирает ещё при загрузке модели (нет весов, не поднялась CUDA),
+перезапускается с паузой (удвоение до max_backoff); после
+max_startup_failures таких неудач подряд его больше не запускают, а когда
+так кончились все процессы, results() поднимает RuntimeError с причиной.
+"""
+import atexit
+import itertools
+import multiprocessing as mp
+import os
+import time
+from multiprocessing.connection import wait
+
+import numpy as np
+
+from SharedRing import ShmSlots
+
+
+class PoolResult:
+    __slots__ = ("request_id", "key", "depth", "frame_size", "worker", "latency")
+
+    def __init__(self, request_id, key, depth, frame_size, worker, latency):
+        self.request_id = request_id
+        self.key = key
+        self.depth = depth              # np.ndarray (H', W') float32, своя копия
+        self.frame_size = frame_size    # (h, w) исходного кадра
+        self.worker = worker
+        self.latency = latency          # от submit() до готового результата, с
+
+
+def _worker_main(worker_id, conn, frames_spec, depths_spec, estimator_args, threads):
+    """Процесс пула: ждёт (слот, форма кадра), пишет depth в тот же слот выходного кольца."""
+    import torch
+
+    if threads:
+        torch.set_num_threads(threads)
+
+    from DepthEstimator import DepthEstimator
+
+    frames = ShmSlots(**frames_spec, create=False)
+    depths = ShmSlots(**depths_spec, create=False)
+    try:
+        estimator = DepthEstimator(device="cpu", **estimator_args)
+    except Exception as e:
+        # Причину — родителю (полный traceback процесс напечатает сам)
+        conn.send(("failed", worker_id, f"{type(e).__name__}: {e}"))
+        frames.close()
+        depths.close()
+        raise
+    conn.send(("ready", worker_id))
+
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            slot, shape = message
+            frame = frames.view(slot, shape)
+            try:
+                depth = estimator.infer([frame])[0].float().cpu().numpy()
+            finally:
+                # View на разделяемую память не должна дожить до frames.close():
+                # иначе close() падает с BufferError и прячет настоящую ошибку
+                del frame
+            try:
+                depths.write(slot, depth)
+            except ValueError as e:
+                conn.send((slot, None, str(e)))
+                continue
+            conn.send((slot, depth.shape, None))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        frames.close()
+        depths.close()
+
+
+class _Worker:
+    def __init__(self, worker_id, slots):
+        self.id = worker_id
+        self.process = None
+        self.conn = None
+        self.free = list(slots)
+        self.in_flight = {}     # слот -> (request_id, key, frame_size, время submit)
+        self.ready = False
+        self.restarts = 0
+        # Смерти подряд до "ready"; пока retry_at не None, процесс ждёт перезапуска
+        self.startup_failures = 0
+        self.retry_at = None
+        self.gave_up = False
+        self.failure = None     # причина, присланная текущим процессом ("failed")
+        self.error = None       # последняя причина смерти процесса
+
+
+class InferencePool:
+    """
+    num_workers процессов по slots_per_worker слотов у каждого.
+    max_frame_shape — самый большой кадр (h, w, 3), под него выделяются входные
+    слоты; max_depth_pixels — самая большая depth-карта на разрешении сети.
+    Остальные параметры (encoder, resolution, precision, backend, cache_dir)
+    уходят в DepthEstimator каждого процесса.
+    """
+
+    def __init__(self, num_workers=2, slots_per_worker=2, max_frame_shape=(1080, 1920, 3),
+                 max_depth_pixels=2_000_000, threads_per_worker=None, **estimator_args):
+        self.num_workers = num_workers
+        self.estimator_args = estimator_args
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // num_workers)
+
+        total_slots = num_workers * slots_per_worker
+        self.frames = ShmSlots(total_slots, int(np.prod(max_frame_shape)))
+        self.depths = ShmSlots(total_slots, max_depth_pixels * 4)
+
+        self._closed = False
+        self._ctx = mp.get_context("spawn")
+        self._ids = itertools.count()
+        # Процесс, умирающий при загрузке модели, перезапускается с паузой
+        # (0.5 с, удвоение до max_backoff); после max_startup_failures — больше нет
+        self.max_startup_failures = 5
+        self.max_backoff = 30.0
+        self.workers = [
+            _Worker(i, range(i * slots_per_worker, (i + 1) * slots_per_worker))
+            for i in range(num_workers)
+        ]
+        for worker in self.workers:
+            self._start(worker)
+
+        self.submitted = 0
+        self.dropped = 0
+        self.lost = 0
+        self.failed = 0
+        # Раньше, чем multiprocessing добьёт daemon-процессы: иначе results() из
+        # другого потока примет это за падение и начнёт их перезапускать
+        atexit.register(self.close)
+
+    def _start(self, worker):
+        parent_conn, child_conn = self._ctx.Pipe()
+        worker.conn = parent_conn
+        worker.ready = False
+        worker.failure = None
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.id, child_conn, self.frames.spec(), self.depths.spec(),
+                  self.estimator_args, self.threads_per_worker),
+            daemon=True,
+        )
+        worker.process.start()
+        child_conn.close()
+
+    def _restart(self, worker):
+        """
+        Процесс умер: его кадры потеряны, слоты свободны. Умер в работе — запускаем
+        заново сразу; ещё при загрузке модели — после паузы или уже никогда.
+        """
+        self.lost += len(worker.in_flight)
+        worker.free.extend(worker.in_flight)
+        worker.in_flight.clear()
+        self._drain_failure(worker)
+        worker.conn.close()
+        worker.conn = None
+        worker.process.join(timeout=1)
+        worker.error = worker.failure or f"exit code {worker.process.exitcode}"
+
+        if worker.ready:
+            worker.ready = False
+            worker.startup_failures = 0
+            worker.restarts += 1
+            print(f"InferencePool: worker {worker.id} exited ({worker.error}), restarting")
+            self._start(worker)
+            return
+
+        worker.startup_failures += 1
+        if worker.startup_failures >= self.max_startup_failures:
+            worker.gave_up = True
+            print(f"InferencePool: worker {worker.id} failed to start {worker.startup_failures} times "
+                  f"({worker.error}), giving up")
+            return
+        delay = min(self.max_backoff, 0.5 * 2 ** (worker.startup_failures - 1))
+        worker.retry_at = time.monotonic() + delay
+        print(f"InferencePool: worker {worker.id} failed to start ({worker.error}), retrying in {delay:.1f} s")
+
+    @staticmethod
+    def _drain_failure(worker):
+        """
+        Непрочитанное от умершего процесса: причина из ("failed", id, текст),
+        если он успел её прислать, и "ready", если модель он всё-таки загрузил.
+        """
+        try:
+            while worker.conn.poll():
+                message = worker.conn.recv()
+                if message[0] == "failed":
+                    worker.failure = message[2]
+                elif message[0] == "ready":
+                    worker.ready = True
+        except (EOFError, OSError):
+            pass
+
+    def submit(self, frame, key=None):
+        """
+        Кладёт кадр в свободный слот наименее загруженного процесса.
+        Возвращает id запроса или None, если все слоты заняты (кадр отброшен).
+        """
+        candidates = [w for w in self.workers if w.ready and w.free]
+        if not candidates:
+            self.dropped += 1
+            return None
+        worker = min(candidates, key=lambda w: len(w.in_flight))
+
+        slot = worker.free.pop()
+        try:
+            self.frames.write(slot, np.ascontiguousarray(frame))
+        except ValueError:
+            worker.free.append(slot)
+            raise
+        request_id = next(self._ids)
+        worker.in_flight[slot] = (request_id, key, frame.shape[:2], time.perf_counter())
+        try:
+            worker.conn.send((slot, frame.shape))
+        except (BrokenPipeError, OSError):
+            self._restart(worker)
+            return None
+        self.submitted += 1
+        return request_id
+
+    def can_submit(self):
+        return any(w.ready and w.free for w in self.workers)
+
+    def busy(self):
+        return sum(len(w.in_flight) for w in self.workers)
+
+    def results(self, timeout=0.0):
+        """Готовые результаты (ждёт не дольше timeout); заодно перезапускает упавшие процессы."""
+        if self._closed:
+            return []
+        now = time.monotonic()
+        for worker in self.workers:
+            if worker.gave_up:
+                continue
+            if worker.retry_at is not None:
+                if now >= worker.retry_at:
+                    worker.retry_at = None
+                    worker.restarts += 1
+                    self._start(worker)
+            elif not worker.process.is_alive():
+                self._restart(worker)
+        if all(w.gave_up for w in self.workers):
+            raise RuntimeError(f"InferencePool: no worker could load the model: {self.workers[0].error}")
+
+        by_conn = {w.conn: w for w in self.workers if w.conn is not None}
+        results = []
+        for conn in wait(list(by_conn), timeout):
+            worker = by_conn[conn]
+            try:
+                while conn.poll():
+                    message = conn.recv()
+                    if message[0] == "ready":
+                        worker.ready = True
+                        worker.startup_failures = 0
+                        continue
+                    if message[0] == "failed":
+                        # Процесс сейчас завершится, _restart() возьмёт причину отсюда
+                        worker.failure = message[2]
+                        continue
+                    result = self._collect(worker, *message)
+                    if result is not None:
+                        results.append(result)
+            except (EOFError, OSError):
+                self._restart(worker)
+        return results
+
+    def _collect(self, worker, slot, shape, error):
+        request_id, key, frame_size, submitted_at = worker.in_flight.pop(slot)
+        worker.free.append(slot)
+        if error is not None:
+            self.failed += 1
+            print(f"InferencePool: worker {worker.id}: {error}")
+            return None
+        depth = self.depths.view(slot, shape, np.float32).copy()
+        return PoolResult(request_id, key, depth, frame_size, worker.id, time.perf_counter() - submitted_at)
+
+    def wait_ready(self, timeout=None):
+        """Ждёт, пока все процессы загрузят модель."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not all(w.ready for w in self.workers):
+            left = None if deadline is None else deadline - time.monotonic()
+            if left is not None and left <= 0:
+                return False
+            self.results(timeout=0.1 if left is None else min(0.1, left))
+        return True
+
+    def stats(self):
+        return {
+            "workers": self.num_workers,
+            "ready": sum(w.ready for w in self.workers),
+            "busy": self.busy(),
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "lost": self.lost,
+            "failed": self.failed,
+            "restarts": [w.restarts for w in self.workers],
+            "gave_up": sum(w.gave_up for w in self.workers),
+            "errors": [w.error for w in self.workers],
+        }
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        for worker in self.workers:
+            if worker.conn is None:
+                continue
+            try:
+                worker.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self.workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            if worker.conn is not None:
+                worker.conn.close()
+        for ring in (self.frames, self.depths):
+            ring.close()
+            ring.unlink()
@@ -0,0 +1,93 @@
+"""
+Разрешение инференса: пресеты, разбор настройки и адаптивный режим.
+Отдельно от DepthEstimator и без torch, чтобы GUI мог показать список
+пресетов, не загружая ML-стек.
+"""
+
+
+# Короткая сторона входа сети (кратна размеру патча 14).
+# ViT считает внимание по всем патчам, так что стоимость растёт ~ квадратично.
+RESOLUTION_PRESETS = {
+    "full": 518,    # как в оригинальном скрипте, 37 патчей по короткой стороне
+    "high": 434,
+    "medium": 364,
+    "low": 280,
+    "tiny": 196,
+}
+
+
+def parse_resolution(spec):
+    """
+    Настройка разрешения инференса из строки/числа:
+      "full" / "high" / ... — пресет,
+      518 или "518"         — короткая сторона в пикселях (округляется до кратного 14),
+      "patches:1000"        — не больше 1000 патчей на кадр,
+      "adaptive"            — подстраивать под целевой FPS.
+    Возвращает ("short_side", int) / ("patches", int) / ("adaptive", None).
+    """
+    if isinstance(spec, int):
+        return "short_side", max(14, round(spec / 14) * 14)
+    spec = str(spec).strip().lower()
+    if spec == "adaptive":
+        return "adaptive", None
+    if spec in RESOLUTION_PRESETS:
+        return "short_side", RESOLUTION_PRESETS[spec]
+    if spec.startswith("patches:"):
+        return "patches", int(spec.split(":", 1)[1])
+    if spec.isdigit():
+        return parse_resolution(int(spec))
+    raise ValueError(f"Неизвестное разрешение {spec!r}: ожидается {', '.join(RESOLUTION_PRESETS)}, "
+                     f"число, patches:N или adaptive")
+
+
+class AdaptiveResolution:
+    """
+    Подбирает короткую сторону входа под целевой FPS по измеренной задержке.
+
+    Держит скользящее среднее времени одного прохода. Если оно выше бюджета
+    (1 / target_fps), разрешение снижается на ступень; если и с ожидаемым
+    ростом стоимости на ступень выше (~ квадрат отношения сторон) укладываемся
+    в бюджет с запасом — повышается. После смены выжидаем cooldown проходов,
+    чтобы среднее успело набраться на новом разрешении.
+    """
+
+    def __init__(self, target_fps, ladder=None, start=None, smoothing=0.2, cooldown=10, headroom=0.8):
+        self.budget = 1.0 / target_fps
+        self.ladder = sorted(ladder or RESOLUTION_PRESETS.values())
+        self.index = self.ladder.index(start) if start in self.ladder else len(self.ladder) - 1
+        self.smoothing = smoothing
+        self.cooldown = cooldown
+        self.headroom = headroom
+
+        self.latency = None
+        self._since_change = 0
+
+    @property
+    def short_side(self):
+        return self.ladder[self.index]
+
+    def update(self, latency):
+        """Учитывает задержку очередного прохода. Возвращает текущую короткую сторону."""
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.smoothing * (latency - self.latency)
+
+        self._since_change += 1
+        if self._since_change < self.cooldown:
+            return self.short_side
+
+        if self.latency > self.budget and self.index > 0:
+            self._step(-1)
+        elif self.index < len(self.ladder) - 1:
+            ratio = self.ladder[self.index + 1] / self.ladder[self.index]
+            if self.latency * ratio ** 2 < self.budget * self.headroom:
+                self._step(+1)
+        return self.short_side
+
+    def _step(self, direction):
+        old = self.short_side
+        self.index += direction
+        # Прикидываем задержку на новом разрешении, чтобы не ждать с нуля
+        self.latency *= (self.short_side / old) ** 2
+        self._since_change = 0
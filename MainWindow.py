@@ -1,14 +1,22 @@
-from PySide6.QtCore import Qt
-from PySide6.QtWidgets import QLabel, QMainWindow, QComboBox
+import os
+import time
+
+from PySide6.QtCore import Qt, QThread
+from PySide6.QtWidgets import QCheckBox, QLabel, QMainWindow, QComboBox
 from PySide6.QtWidgets import QHBoxLayout, QVBoxLayout, QGridLayout, QWidget
 
 from PyCameraList.camera_device import list_video_devices
 
-from Camera import CameraWidget
+from Camera import CAPTURE_BACKENDS, CameraWidget
+from CpuScheduler import CpuPlan
+from InferenceResolution import RESOLUTION_PRESETS
+from MultiCapture import SyncCaptureWorker
+from PipelineMetrics import JsonlExporter
+from Reimage import ImageProcessor
 
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, metrics_jsonl=None, stereo_calibration=None):
         super().__init__()
         # self.firstCam
         # self.secondCam
@@ -19,23 +27,93 @@ class MainWindow(QMainWindow):
 
         menu_panel = QVBoxLayout()
 
+        # В каждом пункте храним индекс устройства (userData)
         self.first_camera_list = QComboBox()
-        for i in MainWindow.camera_list(self):
-            self.first_camera_list.addItems(i)
+        for index, name in MainWindow.camera_list(self):
+            self.first_camera_list.addItem(name, index)
 
         self.second_camera_list = QComboBox()
-        for i in MainWindow.camera_list(self):
-            self.second_camera_list.addItems(i)
+        for index, name in MainWindow.camera_list(self):
+            self.second_camera_list.addItem(name, index)
+        if self.second_camera_list.count() > 1:
+            self.second_camera_list.setCurrentIndex(1)
+
+        # Бэкенд захвата у каждой камеры свой: OpenCV или Qt Multimedia
+        self.first_backend_list = QComboBox()
+        self.second_backend_list = QComboBox()
+        for backend, name in CAPTURE_BACKENDS.items():
+            self.first_backend_list.addItem(name, backend)
+            self.second_backend_list.addItem(name, backend)
+
+        # Разрешение инференса: пресеты (короткая сторона входа сети)
+        # и адаптивный режим, который сам держит целевой FPS
+        self.resolution_list = QComboBox()
+        for name, short_side in RESOLUTION_PRESETS.items():
+            self.resolution_list.addItem(f"{name} ({short_side}px)", name)
+        self.resolution_list.addItem("adaptive (10 FPS)", "adaptive")
+
+        # Не считать глубину заново на почти неподвижных кадрах (пробки, светофоры)
+        self.temporal_reuse = QCheckBox("Reuse depth on static frames")
+
+        # Запись кадров и depth в recordings/*.depthrec (воспроизводится как камера)
+        self.recording = QCheckBox("Record frames and depth")
+
+        # Обе камеры одним потоком: grab() на всех, потом retrieve(), наборы одного момента
+        self.sync_capture = QCheckBox("Synchronize cameras")
+
+        # Глубина пары камер: сеть на каждой, стерео (SGBM) или стерео + сеть изредка.
+        # Стерео-режимы — только с калибровкой пары (main.py --stereo-calibration)
+        self.stereo_calibration = stereo_calibration
+        self.pair_depth_list = QComboBox()
+        self.pair_depth_list.addItem("Monocular depth (DepthAnything)", None)
+        self.pair_depth_list.addItem("Stereo depth (SGBM)", "stereo")
+        self.pair_depth_list.addItem("Hybrid: stereo + DepthAnything", "hybrid")
+        self.pair_depth_list.setEnabled(stereo_calibration is not None)
+
+        # Задержки стадий (p50/p95/p99) и FPS поверх depth-карт
+        self.metrics_overlay = QCheckBox("Show pipeline metrics")
 
         menu_panel.addWidget(self.first_camera_list)
+        menu_panel.addWidget(self.first_backend_list)
         menu_panel.addWidget(self.second_camera_list)
+        menu_panel.addWidget(self.second_backend_list)
+        menu_panel.addWidget(self.resolution_list)
+        menu_panel.addWidget(self.temporal_reuse)
+        menu_panel.addWidget(self.sync_capture)
+        menu_panel.addWidget(self.pair_depth_list)
+        menu_panel.addWidget(self.recording)
+        menu_panel.addWidget(self.metrics_overlay)
 
         main_layout.addLayout(menu_panel)
 
         grid_layout = QGridLayout()
 
-        # Вывод с первой камеры
-        self.camera_1 = CameraWidget()
+        # Ядра делим между захватом, препроцессингом и инференсом,
+        # чтобы пулы torch и OpenCV не дрались за одни и те же ядра
+        self.cpu_plan = CpuPlan(num_cameras=2)
+
+        # Один обработчик (и одна копия модели) на все камеры:
+        # кадры с камер собираются в батч и идут одним forward
+        self.processor = ImageProcessor(cpu_plan=self.cpu_plan)
+        self.processorThread = QThread()
+        self.processor.moveToThread(self.processorThread)
+        self.processorThread.started.connect(self.processor.run)
+        # Модель грузится в фоне, пока уже идёт сырое превью; время старта — в статус-баре
+        self.processor.startupTimes.connect(self.onStartupTimes)
+
+        # Замеры конвейера строкой JSON раз в 5 с (main.py --metrics-jsonl)
+        self.metrics_exporter = None
+        if metrics_jsonl:
+            self.metrics_exporter = JsonlExporter(self.processor.metrics, metrics_jsonl)
+            self.metrics_exporter.start()
+        # Раскладка ядер — в статусе, пока грузится модель
+        self.statusBar().showMessage(
+            f"Загрузка модели... Ядра: захват {self.cpu_plan.capture}, "
+            f"препроцессинг {self.cpu_plan.preprocess}, инференс {self.cpu_plan.inference}"
+        )
+
+        # Вывод с первой камеры (сырой кадр + обработанное изображение)
+        self.camera_1 = CameraWidget(self.processor, camera_index=0, capture_cores=self.cpu_plan.capture[0])
         # self.label_camera_1.setAlignment(Qt.AlignmentFlag.AlignCenter)
         grid_layout.addWidget(self.camera_1, 0, 0)
 
@@ -45,18 +123,121 @@ class MainWindow(QMainWindow):
 
 
 
-        # Вывод со второй камеры
-        self.label_camera_2 = QLabel("вывод с второй камеры")
-        self.label_camera_2.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        grid_layout.addWidget(self.label_camera_2, 1, 0)
-
-        # Обработанное изображение со второй камеры
-        self.label_processed_2 = QLabel("обработанное изображение с второй камеры")
-        self.label_processed_2.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        grid_layout.addWidget(self.label_processed_2, 1, 1)
+        # Вывод со второй камеры (сырой кадр + обработанное изображение)
+        self.camera_2 = CameraWidget(self.processor, camera_index=1, capture_cores=self.cpu_plan.capture[1])
+        grid_layout.addWidget(self.camera_2, 1, 0)
 
         main_layout.addLayout(grid_layout)
 
+        # Смена камеры в комбобоксе -> перезапуск захвата в соответствующем виджете
+        self.first_camera_list.currentIndexChanged.connect(
+            lambda _: self.onCameraSelected(self.camera_1, self.first_camera_list)
+        )
+        self.second_camera_list.currentIndexChanged.connect(
+            lambda _: self.onCameraSelected(self.camera_2, self.second_camera_list)
+        )
+        self.first_backend_list.currentIndexChanged.connect(
+            lambda _: self.camera_1.setBackend(self.first_backend_list.currentData())
+        )
+        self.second_backend_list.currentIndexChanged.connect(
+            lambda _: self.camera_2.setBackend(self.second_backend_list.currentData())
+        )
+        self.resolution_list.currentIndexChanged.connect(
+            lambda _: self.processor.setResolution(self.resolution_list.currentData(), target_fps=10.0)
+        )
+        self.temporal_reuse.toggled.connect(
+            lambda checked: self.processor.setTemporalReuse(0.02 if checked else None, warp=True)
+        )
+        self.sync_capture.toggled.connect(self.onSyncToggled)
+        self.pair_depth_list.currentIndexChanged.connect(
+            lambda _: self.processor.setStereo(
+                self.pair_depth_list.currentData(), self.stereo_calibration,
+                pair=(self.camera_1.source_id, self.camera_2.source_id),
+            )
+        )
+        self.syncWorker = None
+        self.syncThread = None
+        self.recording.toggled.connect(self.onRecordingToggled)
+        self.metrics_overlay.toggled.connect(self.camera_1.setMetricsOverlay)
+        self.metrics_overlay.toggled.connect(self.camera_2.setMetricsOverlay)
+
+    def onCameraSelected(self, camera_widget, combo):
+        camera_index = combo.currentData()
+        if camera_index is not None:
+            camera_widget.setCamera(camera_index)
+            if self.syncWorker is not None:
+                # Синхронный захват открывает камеры сам: перезапускаем с новым набором
+                self.stopSyncCapture()
+                self.startSyncCapture()
+
+    def onSyncToggled(self, checked):
+        # Синхронный захват идёт только через OpenCV (grab/retrieve): выбор бэкенда на это время недоступен
+        for combo in (self.first_backend_list, self.second_backend_list):
+            combo.setEnabled(not checked)
+            combo.setToolTip("Synchronized capture always uses OpenCV" if checked else "")
+        for camera in (self.camera_1, self.camera_2):
+            camera.setExternalCapture(checked)
+        if checked:
+            self.startSyncCapture()
+        else:
+            self.stopSyncCapture()
+            self.statusBar().showMessage("Камеры снова захватываются независимо")
+
+    def startSyncCapture(self):
+        """Один SyncCaptureWorker вместо двух CaptureWorker: кадры в те же ящики и виды."""
+        cameras = (self.camera_1, self.camera_2)
+        self.syncWorker = SyncCaptureWorker(
+            [camera.captureWorker.camera_index for camera in cameras],
+            mailboxes=[camera.mailbox for camera in cameras],
+            cores=sorted({core for camera in cameras for core in camera.capture_cores or ()}) or None,
+            metrics=self.processor.metrics,
+            sources=[camera.source_id for camera in cameras],
+        )
+        self.syncThread = QThread()
+        self.syncWorker.moveToThread(self.syncThread)
+        self.syncThread.started.connect(self.syncWorker.startCapture)
+        # Сырые кадры — сразу в виды своих камер (как rawFrameCaptured у CaptureWorker)
+        self.syncWorker.rawFrameCaptured.connect(
+            lambda i, frame: cameras[i].updateRawFrame(frame), Qt.DirectConnection
+        )
+        self.syncWorker.syncStats.connect(self.onSyncStats)
+        self.syncWorker.captureEnded.connect(self.statusBar().showMessage)
+        self.syncThread.start()
+
+    def stopSyncCapture(self):
+        if self.syncWorker is None:
+            return
+        self.syncWorker.stopCapture()
+        self.syncThread.quit()
+        while not self.syncThread.wait(50):
+            # startCapture() мог начаться уже после stopCapture()
+            self.syncWorker.stopCapture()
+        self.syncWorker = None
+        self.syncThread = None
+
+    def onSyncStats(self, stats):
+        skew = stats["skew"]
+        text = f"Синхронно: наборов {stats['sets']}, выброшено {stats['dropped_sets']}"
+        if skew["count"]:
+            text += f", разброс p50 {skew['p50_ms']:.1f} / p95 {skew['p95_ms']:.1f} / max {skew['max_ms']:.1f} ms"
+        self.statusBar().showMessage(text)
+
+    def onRecordingToggled(self, checked):
+        path = None
+        if checked:
+            os.makedirs("recordings", exist_ok=True)
+            path = os.path.join("recordings", time.strftime("drive-%Y%m%d-%H%M%S.depthrec"))
+            self.statusBar().showMessage(f"Запись в {path}")
+        else:
+            self.statusBar().showMessage("Запись остановлена")
+        self.processor.setRecording(path)
+
+    def onStartupTimes(self, times):
+        if "first_frame" in times:
+            self.statusBar().showMessage(f"Первая depth-карта через {times['first_frame']:.2f} с после запуска")
+        else:
+            self.statusBar().showMessage(f"Модель загружена за {times['model_ready']:.2f} с")
+
     def camera_list(self):
         cameras = []
         for i in list_video_devices():
@@ -70,12 +251,22 @@ class MainWindow(QMainWindow):
         (Можно также стартовать в конструкторе, но так иногда надёжнее.)
         """
         super().showEvent(event)
+        self.processorThread.start()
         self.camera_1.startCamera()
+        self.camera_2.startCamera()
 
     def closeEvent(self, event):
         """
         Когда окно закрывается, останавливаем камеру и завершаем поток.
         """
+        self.stopSyncCapture()
         self.camera_1.stopCamera()
+        self.camera_2.stopCamera()
+
+        self.processor.stop()
+        self.processorThread.quit()
+        self.processorThread.wait()
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.stop()
         super().closeEvent(event)
 
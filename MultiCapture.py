@@ -0,0 +1,225 @@
+"""
+Синхронный захват с нескольких камер: наборы кадров одного момента.
+
+Свободно бегущие CaptureWorker'ы читают каждый свою камеру в своём темпе,
+и в батч обработчика попадают кадры, снятые в разное время. Здесь один
+поток сначала делает grab() на всех камерах (это быстро: кадр только
+фиксируется в драйвере), и лишь потом retrieve() (декодирование/копия) —
+так разброс по времени между камерами остаётся в пределах grab'ов.
+
+Каждый кадр помечается моментом своего grab() (time.perf_counter(),
+монотонное). Разброс набора (skew) — от самого раннего grab до самого
+позднего. Если он больше tolerance, камеры с устаревшим кадром делают
+grab() ещё раз (до max_regrab раз); не сошлось — набор выбрасывается
+целиком, до retrieve(). Разброс копится в гистограмме (stats(), стадия
+"skew" в PipelineMetrics).
+
+Захват только через OpenCV (cv2.VideoCapture / ReplayCapture): у Qt
+Multimedia нет раздельных grab() и retrieve().
+"""
+import time
+
+import cv2
+from PySide6.QtCore import QObject, Signal
+
+from Camera import read_into_ring
+from CpuScheduler import pin_current_thread
+from FrameSource import open_capture
+from PipelineMetrics import LatencyHistogram
+from SharedRing import release
+
+
+class FrameSet:
+    """
+    Кадры (FrameHandle) со всех камер за один момент, в порядке камер.
+    Держит по ссылке на каждый кадр; release() отпускает все.
+    """
+    __slots__ = ("frames", "timestamps", "skew", "index")
+
+    def __init__(self, frames, timestamps, index):
+        self.frames = frames
+        self.timestamps = timestamps        # perf_counter() grab'а каждого кадра
+        self.skew = max(timestamps) - min(timestamps)
+        self.index = index
+
+    def retain(self):
+        for frame in self.frames:
+            frame.retain()
+        return self
+
+    def release(self):
+        for frame in self.frames:
+            release(frame)
+
+
+class SyncCaptureWorker(QObject):
+    """
+    Один поток захвата на все камеры camera_indices. Интерфейс как у
+    CaptureWorker (startCapture/stopCapture в своём QThread), но наборами:
+    кадры кладутся в mailboxes[i] все разом, под общим condition ящиков, так что
+    обработчик (ImageProcessor) забирает их одним батчем; rawFrameCaptured
+    отдаёт (номер камеры, FrameHandle), frameSetCaptured — FrameSet целиком.
+    Получатель, которому кадр нужен после возврата из слота, берёт retain().
+    """
+    rawFrameCaptured = Signal(int, object)
+    frameSetCaptured = Signal(object)
+    # Захват кончился сам (конец файла/записи, камера пропала): причина для показа
+    captureEnded = Signal(str)
+    # stats() раз в stats_interval секунд
+    syncStats = Signal(dict)
+
+    def __init__(self, camera_indices, mailboxes=None, tolerance=0.016, max_regrab=2, cores=None,
+                 ring_size=8, metrics=None, sources=None, stats_interval=1.0, parent=None):
+        super().__init__(parent)
+        self._is_running = False
+        self.camera_indices = list(camera_indices)
+        self.mailboxes = mailboxes
+        # Допустимый разброс моментов grab() внутри набора, с. Камеры без аппаратной
+        # синхронизации сдвинуты по фазе на долю кадра: меньше полукадра не ставить
+        self.tolerance = tolerance
+        self.max_regrab = max_regrab
+        self.cores = cores
+        self.ring_size = ring_size
+        # Замеры (PipelineMetrics): capture по камерам sources[i] и skew на набор
+        self.metrics = metrics
+        self.sources = list(sources) if sources is not None else list(range(len(self.camera_indices)))
+        self.stats_interval = stats_interval
+        # Если grab() не удался, живые камеры опрашиваются с паузой (удвоение до
+        # max_backoff, с); после max_failures неудач подряд захват останавливается
+        self.max_failures = 30
+        self.max_backoff = 0.5
+
+        self.caps = []
+        self.rings = []
+        self.skew = LatencyHistogram()
+        self.sets = 0
+        self.dropped_sets = 0
+        self.regrabs = 0
+        self.failed = 0
+
+    def startCapture(self):
+        pin_current_thread(self.cores)
+        self.caps = [open_capture(index) for index in self.camera_indices]
+        for index, cap in zip(self.camera_indices, self.caps):
+            if not cap.isOpened():
+                print(f"Не удалось открыть камеру {index!r}!")
+                self._releaseAll()
+                return
+        for index, cap in zip(self.camera_indices, self.caps):
+            if isinstance(index, int):
+                # Без очереди в драйвере grab() отдаёт свежий кадр, а не снятый кадр-другой назад
+                cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.rings = [None] * len(self.caps)
+        self._is_running = True
+
+        # Файлы и записи кончаются: у них первый же неудачный grab() — конец
+        live = all(isinstance(index, int) for index in self.camera_indices)
+        failures = 0
+        next_stats = time.perf_counter() + self.stats_interval
+        while self._is_running:
+            failed = self.failed
+            frame_set = self._captureSet()
+            if frame_set is not None:
+                failures = 0
+                self._publish(frame_set)
+            elif self.failed > failed:
+                # grab() вернулся сразу без кадра: без паузы цикл занял бы ядро целиком
+                failures += 1
+                if not live:
+                    self._endCapture("Синхронный захват: запись кончилась")
+                elif failures >= self.max_failures:
+                    self._endCapture("Синхронный захват: камера не отдаёт кадры")
+                else:
+                    time.sleep(min(self.max_backoff, 0.01 * 2 ** failures))
+            if time.perf_counter() >= next_stats:
+                next_stats += self.stats_interval
+                self.syncStats.emit(self.stats())
+
+        self._releaseAll()
+
+    def _endCapture(self, reason):
+        print(reason)
+        self._is_running = False
+        self.captureEnded.emit(reason)
+
+    def _grabAll(self, indices, stamps):
+        """grab() на камерах indices; False — какая-то камера кадра не дала."""
+        for i in indices:
+            if not self.caps[i].grab():
+                return False
+            stamps[i] = time.perf_counter()
+        return True
+
+    def _captureSet(self):
+        """Следующий согласованный набор (FrameSet) или None (выброшен/нет кадров)."""
+        stamps = [0.0] * len(self.caps)
+        if not self._grabAll(range(len(self.caps)), stamps):
+            self.failed += 1
+            return None
+
+        # Камера, чей кадр старше самого свежего больше чем на tolerance, берёт следующий
+        for _ in range(self.max_regrab):
+            newest = max(stamps)
+            stale = [i for i, stamp in enumerate(stamps) if newest - stamp > self.tolerance]
+            if not stale:
+                break
+            self.regrabs += len(stale)
+            if not self._grabAll(stale, stamps):
+                self.failed += 1
+                return None
+
+        skew = max(stamps) - min(stamps)
+        self.skew.record(skew)
+        if self.metrics is not None:
+            self.metrics.record("skew", skew)
+        if skew > self.tolerance:
+            self.dropped_sets += 1
+            return None
+
+        # Только теперь — retrieve(): декодирование и копия в слоты колец
+        frames = []
+        for i, cap in enumerate(self.caps):
+            start = time.perf_counter()
+            handle, self.rings[i], _ = read_into_ring(cap, self.rings[i], self.ring_size, retrieve=True)
+            if handle is None:
+                # Слотов нет (потребители не успевают) или retrieve не удался: набор неполный
+                for frame in frames:
+                    frame.release()
+                self.dropped_sets += 1
+                return None
+            handle.timestamp = stamps[i]
+            if self.metrics is not None:
+                self.metrics.record("capture", time.perf_counter() - start, self.sources[i])
+            frames.append(handle)
+
+        self.sets += 1
+        return FrameSet(frames, stamps, self.sets)
+
+    def _publish(self, frame_set):
+        if self.mailboxes is not None:
+            # Все кадры набора появляются в ящиках одновременно (condition общий у ImageProcessor)
+            with self.mailboxes[0].condition:
+                for mailbox, frame in zip(self.mailboxes, frame_set.frames):
+                    mailbox.put(frame.retain())
+        for i, frame in enumerate(frame_set.frames):
+            self.rawFrameCaptured.emit(i, frame)
+        self.frameSetCaptured.emit(frame_set)
+        frame_set.release()
+
+    def stats(self):
+        """{"sets", "dropped_sets", "regrabs", "failed", "skew": {count, mean/p50/p95/p99/max_ms}}."""
+        return {
+            "sets": self.sets,
+            "dropped_sets": self.dropped_sets,
+            "regrabs": self.regrabs,
+            "failed": self.failed,
+            "skew": self.skew.stats(),
+        }
+
+    def _releaseAll(self):
+        for cap in self.caps:
+            cap.release()
+        self.caps = []
+
+    def stopCapture(self):
+        self._is_running = False
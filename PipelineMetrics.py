@@ -0,0 +1,226 @@
+"""
+Замеры конвейера: гистограммы задержек по стадиям и по камерам.
+
+Стадии (STAGES):
+    capture      cap.read() — у живой камеры это в основном ожидание кадра
+    skew         разброс моментов grab() в наборе кадров синхронного захвата (MultiCapture)
+    preprocess   кадры -> батчи сети (DepthEstimator.prepare), на батч
+    stereo       ректификация и SGBM/BM пары камер (StereoDepth), на пару
+    encoder      DINOv2 (forward минус head) и head — голова DPT (forward-хук;
+    head         под trace/onnx модель исполняется целиком, есть только forward)
+    forward      весь forward батча
+    pool         от отправки кадра в пул процессов (InferencePool) до готовой depth:
+                 очередь, препроцессинг и forward в процессе
+    postprocess  раскраска depth-карты, на кадр
+    display      подготовка кадра к показу (масштаб, QImage)
+    end_to_end   от захвата кадра до показа его depth-карты
+
+Запись в гистограмму — O(1) без выделения памяти: логарифмическая шкала
+от 50 мкс до ~100 с с шагом 10%, перцентили — с той же точностью. Замеры
+дешевле микросекунды, их можно не выключать. Окно (MetricsWindow) даёт
+перцентили и FPS за время с прошлого своего снимка, не сбрасывая общие
+счётчики: у оверлея и у экспорта свои окна.
+
+    metrics.record("preprocess", seconds, source=0)
+    with metrics.timer("postprocess", source=0): ...
+    metrics.window().snapshot()     # {"0": {"end_to_end": {"p50_ms": ..., "fps": ...}}}
+    metrics.to_prometheus()         # текст для GET /metrics
+"""
+import json
+import math
+import threading
+import time
+
+STAGES = ("capture", "skew", "preprocess", "stereo", "encoder", "head", "forward", "pool", "postprocess", "display",
+          "end_to_end")
+QUANTILES = (0.5, 0.95, 0.99)
+
+_MIN_SECONDS = 5e-5
+_RATIO = 1.1
+_LOG_RATIO = math.log(_RATIO)
+_NUM_BUCKETS = int(math.ceil(math.log(100.0 / _MIN_SECONDS) / _LOG_RATIO)) + 2
+
+
+def _bucket(seconds):
+    if seconds <= _MIN_SECONDS:
+        return 0
+    return min(int(math.log(seconds / _MIN_SECONDS) / _LOG_RATIO) + 1, _NUM_BUCKETS - 1)
+
+
+def _bucket_value(i):
+    """Середина бакета (геометрическая), с."""
+    if i == 0:
+        return _MIN_SECONDS
+    return _MIN_SECONDS * _RATIO ** (i - 0.5)
+
+
+def _stats(counts, total, elapsed=None):
+    """Сводка по счётчикам бакетов: count, mean/p50/p95/p99/max в мс[, fps]."""
+    count = sum(counts)
+    stats = {"count": count}
+    if count:
+        stats["mean_ms"] = round(total / count * 1000.0, 3)
+        targets = [q * count for q in QUANTILES]
+        seen, t, last = 0, 0, 0
+        for i, c in enumerate(counts):
+            seen += c
+            while t < len(targets) and seen >= targets[t]:
+                stats[f"p{round(QUANTILES[t] * 100)}_ms"] = round(_bucket_value(i) * 1000.0, 3)
+                t += 1
+            if c:
+                last = i
+        stats["max_ms"] = round(_bucket_value(last) * 1000.0, 3)
+    if elapsed:
+        stats["fps"] = round(count / elapsed, 2)
+    return stats
+
+
+def _group(items):
+    """{(stage, source): stats} -> {"source": {stage: stats}} в порядке STAGES."""
+    order = {stage: i for i, stage in enumerate(STAGES)}
+    grouped = {}
+    for (stage, source), stats in sorted(items.items(), key=lambda kv: order.get(kv[0][0], len(order))):
+        grouped.setdefault("all" if source is None else str(source), {})[stage] = stats
+    return grouped
+
+
+class LatencyHistogram:
+    __slots__ = ("counts", "total")
+
+    def __init__(self):
+        self.counts = [0] * _NUM_BUCKETS
+        self.total = 0.0
+
+    def record(self, seconds):
+        self.counts[_bucket(seconds)] += 1
+        self.total += seconds
+
+    def stats(self):
+        return _stats(self.counts, self.total)
+
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "source", "start")
+
+    def __init__(self, metrics, stage, source):
+        self.metrics = metrics
+        self.stage = stage
+        self.source = source
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.stage, time.perf_counter() - self.start, self.source)
+
+
+class PipelineMetrics:
+    """
+    Гистограммы по (стадия, источник); источник None — замер на весь батч
+    (в снимках — под ключом "all"). Потокобезопасно: писать можно из
+    потоков захвата, обработки и показа одновременно.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def record(self, stage, seconds, source=None):
+        if not self.enabled:
+            return
+        key = (stage, source)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def timer(self, stage, source=None):
+        return _Timer(self, stage, source)
+
+    def _copy(self):
+        with self._lock:
+            return {key: (list(h.counts), h.total) for key, h in self._histograms.items()}
+
+    def snapshot(self):
+        """Сводка за всё время работы."""
+        return _group({key: _stats(counts, total) for key, (counts, total) in self._copy().items()})
+
+    def window(self):
+        return MetricsWindow(self)
+
+    def to_prometheus(self, prefix="depth"):
+        """Текстовый формат Prometheus: summary по каждой стадии и источнику."""
+        name = f"{prefix}_stage_latency_seconds"
+        lines = [f"# HELP {name} Latency of a pipeline stage.", f"# TYPE {name} summary"]
+        for (stage, source), (counts, total) in sorted(self._copy().items(), key=lambda kv: str(kv[0])):
+            labels = f'stage="{stage}",source="{"all" if source is None else source}"'
+            stats = _stats(counts, total)
+            for q in QUANTILES:
+                value = stats.get(f"p{round(q * 100)}_ms")
+                if value is not None:
+                    lines.append(f'{name}{{{labels},quantile="{q}"}} {value / 1000.0:.6f}')
+            lines.append(f"{name}_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {stats['count']}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsWindow:
+    """Скользящее окно над PipelineMetrics: каждый snapshot() — за время с предыдущего."""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self._base = metrics._copy()
+        self._time = time.perf_counter()
+
+    def snapshot(self):
+        current = self.metrics._copy()
+        now = time.perf_counter()
+        elapsed = now - self._time
+        items = {}
+        for key, (counts, total) in current.items():
+            base_counts, base_total = self._base.get(key, (None, 0.0))
+            if base_counts is not None:
+                counts = [c - b for c, b in zip(counts, base_counts)]
+            items[key] = _stats(counts, total - base_total, elapsed)
+        self._base, self._time = current, now
+        return _group(items)
+
+
+def format_overlay(stages):
+    """Строки для оверлея камеры из snapshot()[source] (и, по желанию, ["all"])."""
+    lines = []
+    for stage in STAGES:
+        stats = stages.get(stage)
+        if not stats or not stats["count"]:
+            continue
+        line = f"{stage:<11} p50 {stats['p50_ms']:7.1f}  p95 {stats['p95_ms']:7.1f}  p99 {stats['p99_ms']:7.1f} ms"
+        if stage in ("end_to_end", "postprocess") and "fps" in stats:
+            line += f"  {stats['fps']:.1f} FPS"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+class JsonlExporter(threading.Thread):
+    """Раз в interval секунд дописывает в path строку JSON со снимком окна."""
+
+    def __init__(self, metrics, path, interval=5.0):
+        super().__init__(daemon=True)
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        window = self.metrics.window()
+        with open(self.path, "a", encoding="utf-8") as f:
+            while not self._stop_event.wait(self.interval):
+                f.write(json.dumps({"time": time.time(), "interval_s": self.interval,
+                                    "stages": window.snapshot()}) + "\n")
+                f.flush()
+
+    def stop(self):
+        self._stop_event.set()
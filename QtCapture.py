@@ -0,0 +1,232 @@
+"""
+Захват через Qt Multimedia (QCamera -> QMediaCaptureSession -> QVideoSink)
+вместо блокирующего цикла cv2.VideoCapture.
+
+Кадр приходит сигналом videoFrameChanged (DirectConnection: обработка прямо
+в потоке, где Qt отдаёт кадры, без очереди). Плоскости QVideoFrame
+отображаются (map) в NumPy-виды без копии, и единственный проход по
+пикселям — перевод в BGR — пишет сразу в слот FrameRing, как
+cap.read(image=slot) у OpenCV-бэкенда. Дальше всё как у CaptureWorker:
+ящик обработчика, rawFrameCaptured с FrameHandle, стадия capture в замерах
+(у Qt это map + перевод в BGR: ожидания кадра здесь нет).
+
+Форматы без промежуточных копий: BGRA/BGRX/RGBA/RGBX/ARGB/XRGB/ABGR/XBGR,
+NV12/NV21, YUYV/UYVY, Y8. YUV420P/YV12 собираются в один буфер I420
+(OpenCV не принимает плоскости раздельно), Jpeg декодируется, остальное —
+через QVideoFrame.toImage().
+"""
+import time
+
+import cv2
+import numpy as np
+from PySide6.QtCore import QMetaObject, QThread, Qt, Slot
+
+from Camera import CaptureWorker
+from CpuScheduler import pin_current_thread
+from SharedRing import FrameRing
+
+_CVT = {
+    "BGRA8888": cv2.COLOR_BGRA2BGR, "BGRA8888_Premultiplied": cv2.COLOR_BGRA2BGR, "BGRX8888": cv2.COLOR_BGRA2BGR,
+    "RGBA8888": cv2.COLOR_RGBA2BGR, "RGBX8888": cv2.COLOR_RGBA2BGR,
+}
+# Байты A,R,G,B / A,B,G,R: BGR — это срез каналов, копируем его в слот
+_CHANNELS = {
+    "ARGB8888": slice(3, 0, -1), "ARGB8888_Premultiplied": slice(3, 0, -1), "XRGB8888": slice(3, 0, -1),
+    "ABGR8888": slice(1, 4), "XBGR8888": slice(1, 4),
+}
+_TWO_PLANE = {"NV12": cv2.COLOR_YUV2BGR_NV12, "NV21": cv2.COLOR_YUV2BGR_NV21}
+_PACKED_YUV = {"YUYV": cv2.COLOR_YUV2BGR_YUYV, "UYVY": cv2.COLOR_YUV2BGR_UYVY}
+_THREE_PLANE = {"YUV420P": cv2.COLOR_YUV2BGR_I420, "YV12": cv2.COLOR_YUV2BGR_YV12}
+
+ZERO_COPY_FORMATS = tuple(_CVT) + tuple(_CHANNELS) + tuple(_TWO_PLANE) + tuple(_PACKED_YUV) + ("Y8",)
+
+
+def format_name(frame):
+    """Формат пикселей кадра без префикса: "NV12", "BGRA8888", ..."""
+    name = frame.pixelFormat().name
+    return name[len("Format_"):] if name.startswith("Format_") else name
+
+
+def map_plane(frame, plane, rows, row_bytes):
+    """
+    Плоскость отображённого (map) кадра как массив (rows, row_bytes) без копии:
+    шаг строки — bytesPerLine(plane), хвост выравнивания в вид не попадает.
+    Вид действителен только до frame.unmap().
+    """
+    stride = frame.bytesPerLine(plane)
+    buf = np.frombuffer(frame.bits(plane), np.uint8)
+    if buf.size < (rows - 1) * stride + row_bytes:
+        raise ValueError(f"плоскость {plane}: {buf.size} байт меньше {rows} строк по {stride}")
+    return np.lib.stride_tricks.as_strided(buf, (rows, row_bytes), (stride, 1), writeable=False)
+
+
+class VideoFrameConverter:
+    """QVideoFrame -> BGR uint8 (h, w, 3) в готовый массив out."""
+
+    def __init__(self):
+        self._i420 = None
+
+    def convert(self, frame, out):
+        """
+        Переводит отображённый кадр в out. False — формат не поддержан,
+        тогда кадр надо брать через toImage() (см. QtCaptureWorker).
+        """
+        fmt = format_name(frame)
+        h, w = out.shape[:2]
+        if fmt in _CVT:
+            cv2.cvtColor(map_plane(frame, 0, h, w * 4).reshape(h, w, 4), _CVT[fmt], dst=out)
+        elif fmt in _CHANNELS:
+            np.copyto(out, map_plane(frame, 0, h, w * 4).reshape(h, w, 4)[:, :, _CHANNELS[fmt]])
+        elif fmt in _TWO_PLANE:
+            y = map_plane(frame, 0, h, w)
+            uv = map_plane(frame, 1, h // 2, w).reshape(h // 2, w // 2, 2)
+            cv2.cvtColorTwoPlane(y, uv, _TWO_PLANE[fmt], dst=out)
+        elif fmt in _PACKED_YUV:
+            cv2.cvtColor(map_plane(frame, 0, h, w * 2).reshape(h, w, 2), _PACKED_YUV[fmt], dst=out)
+        elif fmt == "Y8":
+            cv2.cvtColor(map_plane(frame, 0, h, w), cv2.COLOR_GRAY2BGR, dst=out)
+        elif fmt in _THREE_PLANE:
+            cv2.cvtColor(self._packI420(frame, h, w), _THREE_PLANE[fmt], dst=out)
+        elif fmt == "Jpeg":
+            decoded = cv2.imdecode(np.frombuffer(frame.bits(0), np.uint8, frame.mappedBytes(0)), cv2.IMREAD_COLOR)
+            if decoded is None or decoded.shape != out.shape:
+                return False
+            out[...] = decoded
+        else:
+            return False
+        return True
+
+    def _packI420(self, frame, h, w):
+        """Три плоскости -> один буфер (h * 3 / 2, w), как его ждёт OpenCV."""
+        if self._i420 is None or self._i420.shape != (h * 3 // 2, w):
+            self._i420 = np.empty((h * 3 // 2, w), np.uint8)
+        flat = self._i420.reshape(-1)
+        cw, ch = w // 2, h // 2
+        flat[:h * w].reshape(h, w)[...] = map_plane(frame, 0, h, w)
+        flat[h * w:h * w + ch * cw].reshape(ch, cw)[...] = map_plane(frame, 1, ch, cw)
+        flat[h * w + ch * cw:h * w + 2 * ch * cw].reshape(ch, cw)[...] = map_plane(frame, 2, ch, cw)
+        return self._i420
+
+
+def _preferred_format(device):
+    """
+    Формат камеры, который переводится в BGR без декодирования: с наибольшим
+    FPS, затем разрешением. None — оставить формат по умолчанию.
+    """
+    formats = [f for f in device.videoFormats() if format_name(f) in ZERO_COPY_FORMATS + tuple(_THREE_PLANE)]
+    if not formats:
+        return None
+    return max(formats, key=lambda f: (f.maxFrameRate(), f.resolution().width() * f.resolution().height()))
+
+
+class QtCaptureWorker(CaptureWorker):
+    """
+    Тот же интерфейс, что у CaptureWorker (startCapture/stopCapture,
+    rawFrameCaptured, ящик, кольцо, замеры), но кадры присылает Qt.
+    camera_index — номер в QMediaDevices.videoInputs(); видеофайлы и записи
+    .depthrec этот бэкенд не открывает.
+    """
+
+    def __init__(self, camera_index=0, mailbox=None, cores=None, ring_size=8, metrics=None, source=None,
+                 parent=None):
+        super().__init__(camera_index, mailbox, cores, ring_size, metrics, source, parent)
+        self.camera = None
+        self.session = None
+        self.sink = None
+        self.converter = VideoFrameConverter()
+        # Формат, в котором камера реально отдаёт кадры (для бенчмарка и отладки)
+        self.pixel_format = None
+
+    def startCapture(self):
+        # QtMultimedia — только здесь: OpenCV-бэкенду он не нужен
+        from PySide6.QtMultimedia import QCamera, QMediaCaptureSession, QMediaDevices, QVideoSink
+
+        pin_current_thread(self.cores)
+        devices = QMediaDevices.videoInputs()
+        if not isinstance(self.camera_index, int) or not 0 <= self.camera_index < len(devices):
+            print(f"Qt Multimedia: нет камеры {self.camera_index!r} (доступно {len(devices)})")
+            return
+        device = devices[self.camera_index]
+
+        self.ring = None
+        self.camera = QCamera(device)
+        camera_format = _preferred_format(device)
+        if camera_format is not None:
+            self.camera.setCameraFormat(camera_format)
+        self.sink = QVideoSink()
+        self.session = QMediaCaptureSession()
+        self.session.setCamera(self.camera)
+        self.session.setVideoSink(self.sink)
+        self.sink.videoFrameChanged.connect(self._onFrame, Qt.DirectConnection)
+
+        self._is_running = True
+        self.camera.start()
+
+    def _onFrame(self, frame):
+        if not self._is_running or not frame.isValid():
+            return
+        start = time.perf_counter()
+        handle = self._frameIntoRing(frame)
+        if handle is None:
+            return
+        handle.timestamp = time.perf_counter()
+        if self.metrics is not None:
+            self.metrics.record("capture", handle.timestamp - start, self.source)
+        self._publish(handle)
+
+    def _frameIntoRing(self, frame):
+        shape = (frame.height(), frame.width(), 3)
+        if self.ring is None or self.ring.shape != shape:
+            self.ring = FrameRing(self.ring_size, shape, np.uint8)
+        handle = self.ring.acquire()
+        if handle is None:
+            # Все слоты у потребителей: кадр пропускаем
+            return None
+
+        self.pixel_format = format_name(frame)
+        if frame.map(frame.MapMode.ReadOnly):
+            try:
+                converted = self.converter.convert(frame, handle.array)
+            finally:
+                frame.unmap()
+        else:
+            converted = False
+
+        if not converted:
+            converted = self._fromImage(frame, handle.array)
+        if not converted:
+            handle.release()
+            return None
+        return handle
+
+    @staticmethod
+    def _fromImage(frame, out):
+        """Медленный путь для прочих форматов: QImage в BGR888 и построчная копия."""
+        from PySide6.QtGui import QImage
+
+        image = frame.toImage().convertToFormat(QImage.Format_BGR888)
+        if image.isNull() or (image.height(), image.width()) != out.shape[:2]:
+            return False
+        h, w = out.shape[:2]
+        rows = np.frombuffer(image.constBits(), np.uint8, image.sizeInBytes()).reshape(h, image.bytesPerLine())
+        out[...] = rows[:, :w * 3].reshape(h, w, 3)
+        return True
+
+    def stopCapture(self):
+        """Останавливает камеру в её потоке (QCamera нельзя трогать из чужого)."""
+        self._is_running = False
+        if self.camera is None:
+            return
+        if QThread.currentThread() == self.thread() or not self.thread().isRunning():
+            self._closeCamera()
+        else:
+            QMetaObject.invokeMethod(self, "_closeCamera", Qt.BlockingQueuedConnection)
+
+    @Slot()
+    def _closeCamera(self):
+        if self.camera is None:
+            return
+        self.sink.videoFrameChanged.disconnect(self._onFrame)
+        self.camera.stop()
+        self.session.setCamera(None)
+        self.camera = self.session = self.sink = None
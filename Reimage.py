@@ -1,100 +1,377 @@
-import cv2  # type: ignore
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
-import torch
-import torch.nn.functional as F
 from PySide6.QtCore import QObject, Signal, Slot
-from torchvision.transforms import Compose
 
-from depth_anything.dpt import DepthAnything
-from depth_anything.util.transform import Resize, NormalizeImage, PrepareForNet
+from CpuScheduler import pin_current_thread
+from FrameMailbox import LatestFrameMailbox
+from PipelineMetrics import PipelineMetrics
+from SharedRing import FrameHandle, as_array, release
+
+
+class _StereoStep:
+    """
+    Стерео-пара шага run(): посчитанная диспаратность и, в гибриде, кадр для сети.
+    Держит свой StereoDepth: пока шаг ждёт forward, setStereo() может заменить
+    или убрать стерео обработчика, а досчитывать шаг надо тем, чем он начат.
+    """
+    __slots__ = ("stereo", "source_ids", "size", "captured_at", "result", "reference")
+
+    def __init__(self, stereo, source_ids, size, captured_at, result, reference):
+        self.stereo = stereo            # StereoDepth, которым посчитан result
+        self.source_ids = source_ids    # (левая, правая)
+        self.size = size                # (h, w) исходных кадров
+        self.captured_at = captured_at  # захват более раннего кадра пары — для end_to_end
+        self.result = result            # StereoDepth.StereoFrame
+        self.reference = reference      # гибрид: True — левый кадр пары идёт в батч сети последним
+
+
+class _PreparedBatch:
+    """Кадры одного шага run(): что подготовлено и что нужно после forward."""
+    __slots__ = ("source_ids", "sizes", "prepared", "timestamp", "captured_at", "kept", "stereo")
+
+    def __init__(self, source_ids, sizes, prepared, timestamp, captured_at, kept, stereo=None):
+        self.source_ids = source_ids
+        self.sizes = sizes              # (h, w) исходных кадров
+        self.prepared = prepared        # DepthEstimator.PreparedFrames (None — только стерео)
+        self.timestamp = timestamp      # time.time() — для записи
+        self.captured_at = captured_at  # time.perf_counter() захвата кадров — для end_to_end
+        self.kept = kept                # кадры, удержанные для записи (или None)
+        self.stereo = stereo            # _StereoStep или None
+
+    def release(self):
+        for frame in self.kept or ():
+            release(frame)
+        self.kept = None
 
 
 class ImageProcessor(QObject):
-    processedFrame = Signal(np.ndarray)
+    """
+    Общий обработчик для всех камер: одна модель DepthAnything в памяти.
+    Каждая камера регистрируется через addSource() и получает свой ящик;
+    цикл run() собирает самые свежие кадры со всех камер, прогоняет их
+    одним батчем и раздаёт результаты по source_id.
+    """
+    # (source_id, раскрашенная depth-карта RGB, time.perf_counter() захвата кадра)
+    processedFrame = Signal(int, np.ndarray, float)
+    # (source_id, {"captured", "dropped", "processed"[, "reused", "recomputed", "motion"]})
+    frameStats = Signal(int, dict)
+    # {"weights", "build", "to_device", "model_ready", "first_frame"} — секунды
+    startupTimes = Signal(dict)
 
-    def __init__(self, encoder="vitl", parent=None):
+    def __init__(self, encoder="vitl", precision="fp32", backend="eager", cpu_plan=None, parent=None):
         super().__init__(parent)
 
-        # Определяем устройство (CPU / CUDA)
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        print("Using device:", self.device)
-
-        # Загружаем модель (можно менять "vitl" на "vitb"/"vits" в зависимости от версии)
-        model_name = f"LiheYoung/depth_anything_{encoder}14"
-        print("Loading DepthAnything:", model_name)
-        self.depth_model = DepthAnything.from_pretrained(model_name).to(self.device).eval()
-
-        # Собираем трансформ (см. оригинальный скрипт)
-        self.transform = Compose([
-            Resize(
-                width=518,
-                height=518,
-                resize_target=False,
-                keep_aspect_ratio=True,
-                ensure_multiple_of=14,
-                resize_method='lower_bound',
-                image_interpolation_method=cv2.INTER_CUBIC,
-            ),
-            NormalizeImage(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-            PrepareForNet(),
-        ])
-
-        # Параметры отображения depth-карты
-        self.colormap = cv2.COLORMAP_INFERNO  # Или COLORMAP_JET, COLORMAP_TURBO и т. д.
-
-    @Slot(np.ndarray)
-    def processFrame(self, frame_bgr: np.ndarray):
-        """
-        Слот, получает BGR-кадр и возвращает раскрашенную depth-карту (RGB).
-        1) BGR -> RGB и делим на 255
-        2) Применяем трансформ (Resize, Normalize, PrepareForNet)
-        3) Прогоняем через DepthAnything
-        4) Возвращаем глубину к исходному размеру, нормируем в [0..255]
-        5) Накладываем colormap (требует (H, W) одноканальное)
-        6) BGR -> RGB и отправляем processedFrame сигналом
-        """
-        # 1) BGR -> RGB, [0..1]
-        h, w = frame_bgr.shape[:2]
-        frame_rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB) / 255.0
-
-        # 2) Трансформ (увеличение/уменьшение, нормализация)
-        sample = {'image': frame_rgb}
-        sample = self.transform(sample)
-        inp = torch.from_numpy(sample['image']).unsqueeze(0).to(self.device)  # (1, C, H', W')
-
-        # 3) Depth inference
-        with torch.no_grad():
-            depth_map = self.depth_model(inp)  # обычно (B=1, H', W')
-
-        # 4) Интерполяция под исходное (h, w)
-        # Нужен формат (N, C, H, W), где C=1 для bilinear:
-        depth_map_4d = depth_map.unsqueeze(1)          # (1, 1, H', W')
-        depth_resized_4d = F.interpolate(
-            depth_map_4d,
-            size=(h, w),
-            mode="bilinear",
-            align_corners=False
-        )  # -> (1, 1, h, w)
-
-        # Убираем измерение каналов => (1, h, w)
-        depth_resized = depth_resized_4d.squeeze(1)
-
-        # depth_resized.shape = (1, h, w). Для colormap нужен (h, w):
-        depth_resized = depth_resized.squeeze(0)  # Теперь (h, w)
-
-        # Нормализуем [0..1], умножаем на 255 => uint8
-        # (Обратите внимание: можно ещё проверить, что depth_resized.max() не ноль)
-        max_val = depth_resized.max()
-        if max_val > 0:
-            depth_resized = depth_resized / max_val
-        depth_resized = depth_resized * 255.0
-
-        depth_uint8 = depth_resized.cpu().numpy().astype(np.uint8)  # (h, w)
-
-        # 5) Наложение colormap
-        depth_colored_bgr = cv2.applyColorMap(depth_uint8, self.colormap)
-
-        # 6) BGR -> RGB для отображения в QLabel
-        depth_colored_rgb = cv2.cvtColor(depth_colored_bgr, cv2.COLOR_BGR2RGB)
-
-        self.processedFrame.emit(depth_colored_rgb)
+        # Ядра под инференс и препроцессинг (CpuScheduler.CpuPlan); None — как решат torch/OpenCV
+        self.cpu_plan = cpu_plan
+
+        # Модель строится лениво в run(), уже в потоке обработки: окно и сырое
+        # превью с камер появляются сразу, а не после загрузки весов
+        self.estimator = None
+        self._estimator_args = dict(encoder=encoder, precision=precision, backend=backend)
+        self._created_at = time.perf_counter()
+        self.startup_times = {}
+
+        # Все ящики делят один condition, чтобы ждать кадр с любой камеры
+        self._cond = threading.Condition()
+        self.mailboxes = []
+        self.processed_counts = []
+        self._is_running = False
+        # Сброс кешей и смена разрешения выполняются в потоке обработки, а не в GUI
+        self._reset_requested = False
+        self._resolution_request = None
+        self._temporal_request = None
+        # Запись кадров и depth (DepthRecording): (путь или None,) — запрос из GUI
+        self.recorder = None
+        self._recording_request = None
+        # Замеры стадий: общие для обработчика, модели, захвата и показа всех камер
+        self.metrics = PipelineMetrics()
+        # Стерео для пары камер (StereoDepth) вместо DepthAnything на каждом кадре
+        self.stereo = None
+        self.stereo_pair = None
+        self._stereo_frames = {}
+        self._stereo_request = None
+
+    def addSource(self):
+        """Регистрирует камеру. Возвращает (source_id, ящик для CaptureWorker)."""
+        mailbox = LatestFrameMailbox(self._cond)
+        self.mailboxes.append(mailbox)
+        self.processed_counts.append(0)
+        return len(self.mailboxes) - 1, mailbox
+
+    def resetSource(self, source_id):
+        """
+        Камеру source_id переключили: выбрасываем её непрочитанный кадр
+        и просим сбросить закешированные под старое разрешение размеры/буферы.
+        """
+        self.mailboxes[source_id].clear()
+        self._reset_requested = True
+
+    def setResolution(self, resolution, target_fps=None):
+        """
+        Меняет разрешение инференса (пресет, короткая сторона, "patches:N"
+        или "adaptive", см. DepthEstimator.parse_resolution). Применится
+        перед следующим батчем.
+        """
+        self._resolution_request = (resolution, target_fps)
+
+    def setTemporalReuse(self, threshold=0.02, keyframe_interval=30, warp=False):
+        """
+        Переиспользование depth на почти неподвижных кадрах
+        (см. DepthEstimator.set_temporal_reuse); threshold=None выключает.
+        """
+        self._temporal_request = (threshold, keyframe_interval, warp)
+
+    def setRecording(self, path=None):
+        """
+        Начинает писать сырые кадры, depth (float16) и время в path (.depthrec)
+        или, при path=None, заканчивает запись. Применится перед следующим батчем.
+        """
+        self._recording_request = (path,)
+
+    def setStereo(self, mode=None, calibration=None, pair=(0, 1), downscale=2, hybrid_interval=10,
+                  matcher="sgbm"):
+        """
+        Глубина пары камер pair = (левая, правая) по стерео (StereoDepth):
+        mode "stereo" — только SGBM/BM, "hybrid" — стерео каждый кадр плюс
+        DepthAnything раз в hybrid_interval кадров для дыр и масштаба,
+        None — обе камеры снова через сеть. calibration — путь к калибровке
+        пары (StereoCalibration.load). Карта глубины пары показывается у обеих
+        камер; в запись (setRecording) кадры пары не попадают.
+        Лучше вместе с синхронным захватом (MultiCapture), иначе пара
+        собирается из последних кадров камер, снятых в разное время.
+        """
+        self._stereo_request = (mode, calibration, tuple(pair), downscale, hybrid_interval, matcher)
+
+    def _wait_frames(self, timeout):
+        """Ждёт, пока хотя бы в одном ящике появится кадр, и забирает все свежие."""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: not self._is_running or any(m.has_frame() for m in self.mailboxes),
+                timeout,
+            )
+            batch = []
+            for source_id, mailbox in enumerate(self.mailboxes):
+                frame = mailbox.poll()
+                if frame is not None:
+                    batch.append((source_id, frame))
+            return batch
+
+    def _applyRequests(self):
+        """Запросы из GUI-потока; применяются, когда препроцессинг не идёт."""
+        if self._reset_requested:
+            self._reset_requested = False
+            self.estimator.reset_cache()
+
+        if self._resolution_request is not None:
+            resolution, target_fps = self._resolution_request
+            self._resolution_request = None
+            self.estimator.set_resolution(resolution, target_fps)
+
+        if self._temporal_request is not None:
+            self.estimator.set_temporal_reuse(*self._temporal_request)
+            self._temporal_request = None
+
+        if self._stereo_request is not None:
+            mode, calibration, pair, downscale, hybrid_interval, matcher = self._stereo_request
+            self._stereo_request = None
+            self._releaseStereoFrames()
+            self.stereo = self.stereo_pair = None
+            if mode is not None:
+                from StereoDepth import StereoCalibration, StereoDepth
+
+                self.stereo = StereoDepth(StereoCalibration.load(calibration), matcher=matcher, downscale=downscale,
+                                          hybrid_interval=hybrid_interval if mode == "hybrid" else 0)
+                self.stereo_pair = pair
+
+        if self._recording_request is not None:
+            (path,) = self._recording_request
+            self._recording_request = None
+            self._closeRecording()
+            if path is not None:
+                from DepthRecording import DepthRecorder
+
+                self.recorder = DepthRecorder(path)
+
+    def _closeRecording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            print(f"Записано {len(self.recorder)} кадров в {self.recorder.path}")
+            self.recorder = None
+
+    def _prepareNext(self):
+        """
+        Ждёт свежие кадры и готовит из них батчи (без forward). None — кадров не было.
+        Во время записи кадры (слоты кольца захвата) держим до записи вместе с depth.
+        Кадры стерео-пары сюда не идут: по ним сразу считается стерео (_prepareStereo).
+        """
+        batch = self._wait_frames(timeout=0.1)
+        if not batch:
+            return None
+        timestamp, now = time.time(), time.perf_counter()
+        stereo = None
+        if self.stereo is not None:
+            batch, stereo = self._prepareStereo(batch, now)
+        source_ids = [source_id for source_id, _ in batch]
+        frames = [as_array(frame) for _, frame in batch]
+        captured_at = [frame.timestamp if isinstance(frame, FrameHandle) else now for _, frame in batch]
+        kept = [frame for _, frame in batch] if self.recorder is not None else None
+
+        # Гибрид: ректифицированный левый кадр пары идёт в тот же батч сети, последним
+        net_frames, net_keys = frames, source_ids
+        if stereo is not None and stereo.reference:
+            net_frames, net_keys = frames + [stereo.result.rectified], source_ids + [stereo.source_ids[0]]
+        if not net_frames and stereo is None:
+            return None
+        try:
+            prepared = self.estimator.prepare(net_frames, net_keys) if net_frames else None
+        finally:
+            # Кадры уже в батче: слоты кольца захвата можно отдавать под новые кадры
+            if kept is None:
+                for _, frame in batch:
+                    release(frame)
+        return _PreparedBatch(source_ids, [frame.shape[:2] for frame in frames], prepared,
+                              timestamp, captured_at, kept, stereo)
+
+    def _prepareStereo(self, batch, now):
+        """
+        Забирает из батча кадры пары (последний с каждой камеры ждёт второй)
+        и, когда есть оба, считает по ним стерео. Возвращает (остаток батча, _StereoStep или None).
+        """
+        rest = []
+        for source_id, frame in batch:
+            if source_id in self.stereo_pair:
+                release(self._stereo_frames.pop(source_id, None))
+                self._stereo_frames[source_id] = frame
+            else:
+                rest.append((source_id, frame))
+        if len(self._stereo_frames) < 2:
+            return rest, None
+
+        left, right = (self._stereo_frames.pop(source_id) for source_id in self.stereo_pair)
+        try:
+            with self.metrics.timer("stereo"):
+                result = self.stereo.compute(as_array(left), as_array(right))
+            captured_at = min(frame.timestamp if isinstance(frame, FrameHandle) else now for frame in (left, right))
+            return rest, _StereoStep(self.stereo, self.stereo_pair, as_array(left).shape[:2], captured_at, result,
+                                     self.stereo.needs_reference())
+        finally:
+            release(left)
+            release(right)
+
+    def _releaseStereoFrames(self):
+        for frame in self._stereo_frames.values():
+            release(frame)
+        self._stereo_frames.clear()
+
+    def _pinPreprocessThread(self):
+        if self.cpu_plan is not None:
+            pin_current_thread(self.cpu_plan.preprocess)
+
+    @Slot()
+    def run(self):
+        """
+        Цикл обработки: за одну итерацию берём по последнему кадру с каждой
+        камеры, у которой он есть, и делаем один forward на всех.
+        Пока идёт инференс, захват перезаписывает ящики, так что устаревшие
+        кадры отбрасываются.
+        Конвейер: пока идёт forward кадров N, отдельный поток уже ждёт
+        и препроцессит кадры N+1, так что ядра инференса не простаивают.
+        """
+        self._is_running = True
+
+        # Поток инференса — на свои ядра; пул torch создаётся из него и наследует закрепление
+        if self.cpu_plan is not None:
+            pin_current_thread(self.cpu_plan.inference)
+            self.cpu_plan.configure_torch()
+            self.cpu_plan.configure_opencv()
+
+        if self.estimator is None:
+            # torch и depth_anything импортируются только здесь, в потоке обработки:
+            # окно и список камер не ждут загрузки ML-стека
+            from DepthEstimator import DepthEstimator
+
+            self.estimator = DepthEstimator(**self._estimator_args)
+            self.estimator.set_metrics(self.metrics)
+            self.startup_times = dict(self.estimator.load_timings)
+            self.startup_times["model_ready"] = time.perf_counter() - self._created_at
+            self.startupTimes.emit(dict(self.startup_times))
+
+        with ThreadPoolExecutor(1, initializer=self._pinPreprocessThread) as prefetch:
+            pending = None
+            while self._is_running:
+                item = pending.result() if pending is not None else self._prepareNext()
+                pending = None
+                self._applyRequests()
+                if item is None:
+                    continue
+
+                # Следующие кадры готовятся, пока считаются эти
+                pending = prefetch.submit(self._prepareNext)
+
+                depths = self.estimator.run_prepared(item.prepared) if item.prepared is not None else []
+                for source_id, size, captured_at, depth in zip(item.source_ids, item.sizes,
+                                                               item.captured_at, depths):
+                    with self.metrics.timer("postprocess", source_id):
+                        colored = self.estimator.colorize(depth, size, source_id)
+                    self._emitFrame(source_id, colored, captured_at)
+
+                if item.stereo is not None:
+                    self._emitStereo(item.stereo, depths[len(item.source_ids):])
+
+                # Запись — уже после показа, чтобы не добавлять задержки
+                if item.kept is not None:
+                    self._record(item, depths)
+
+            # Кадры, подготовленные к уже не нужному шагу, отпускаем; запись закрываем
+            item = pending.result() if pending is not None else None
+            if item is not None:
+                item.release()
+        self._releaseStereoFrames()
+        self._closeRecording()
+
+    def _emitFrame(self, source_id, colored, captured_at):
+        """Готовая карта камеры source_id — на показ, плюс счётчики кадров."""
+        self.processed_counts[source_id] += 1
+        self.processedFrame.emit(source_id, colored, captured_at)
+        if "first_frame" not in self.startup_times:
+            self._reportFirstFrame()
+
+        stats = self.mailboxes[source_id].stats()
+        stats["processed"] = self.processed_counts[source_id]
+        if self.estimator.temporal is not None:
+            stats.update(self.estimator.temporal.stats(source_id))
+        self.frameStats.emit(source_id, stats)
+
+    def _emitStereo(self, step, reference_depths):
+        """Depth пары (в гибриде — с дырами, заполненными сетью) показываем у обеих камер."""
+        stereo = step.stereo
+        if reference_depths:
+            stereo.set_reference(reference_depths[0].float().cpu().numpy())
+        depth_uint8 = stereo.quantize(stereo.fuse(step.result))
+        for source_id in step.source_ids:
+            with self.metrics.timer("postprocess", source_id):
+                colored = self.estimator.colorizer.colorize(depth_uint8, step.size, source_id)
+            self._emitFrame(source_id, colored, step.captured_at)
+
+    def _record(self, item, depths):
+        try:
+            if self.recorder is not None:
+                for source_id, frame, depth in zip(item.source_ids, item.kept, depths):
+                    self.recorder.write(as_array(frame), depth.float().cpu().numpy(), item.timestamp, source_id)
+        finally:
+            item.release()
+
+    def _reportFirstFrame(self):
+        """Время от создания обработчика до первой готовой depth-карты."""
+        self.startup_times["first_frame"] = time.perf_counter() - self._created_at
+        print("Startup: " + ", ".join(f"{name} {seconds:.2f} s" for name, seconds in self.startup_times.items()))
+        self.startupTimes.emit(dict(self.startup_times))
+
+    def stop(self):
+        """Останавливает цикл run() (можно звать из другого потока)."""
+        with self._cond:
+            self._is_running = False
+            self._cond.notify_all()
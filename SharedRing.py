@@ -0,0 +1,242 @@
+"""
+Кольца слотов под кадры без выделения памяти на каждый кадр.
+
+ShmSlots — слоты в разделяемой памяти: кадры и depth-карты между процессами
+без сериализации, по каналу передаётся только номер слота и форма массива.
+FrameRing — кольцо кадров со счётчиками ссылок (FrameHandle) между потоком
+захвата и потребителями, в потоках одного процесса или между процессами.
+"""
+import itertools
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class ShmSlots:
+    """
+    Кольцо из count слотов по slot_bytes в одном блоке разделяемой памяти.
+    Процесс-создатель (create=True) владеет блоком и удаляет его в unlink();
+    другие процессы подключаются по name. В слот кладётся массив любой формы,
+    лишь бы помещался: view() отдаёт np.ndarray прямо поверх памяти слота.
+    """
+
+    def __init__(self, count, slot_bytes, name=None, create=True):
+        self.count = count
+        self.slot_bytes = slot_bytes
+        self.owner = create
+        if create:
+            self.shm = shared_memory.SharedMemory(create=True, size=max(1, count * slot_bytes))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+
+    def spec(self):
+        """Всё, что нужно другому процессу для подключения: ShmSlots(**spec, create=False)."""
+        return {"count": self.count, "slot_bytes": self.slot_bytes, "name": self.name}
+
+    def view(self, slot, shape, dtype=np.uint8):
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        if nbytes > self.slot_bytes:
+            raise ValueError(f"массив {tuple(shape)} {dtype} ({nbytes} байт) не влезает в слот {self.slot_bytes} байт")
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def write(self, slot, array):
+        """Копирует array в слот, возвращает view на записанное."""
+        view = self.view(slot, array.shape, array.dtype)
+        view[...] = array
+        return view
+
+    def close(self):
+        self.shm.close()
+
+    def unlink(self):
+        if self.owner:
+            self.shm.unlink()
+
+
+class FrameHandle:
+    """
+    Ссылка на занятый слот FrameRing. Слот свободен, когда счётчик ссылок
+    упал до нуля: каждый, кто хранит кадр дольше вызова (ящик, очередь показа),
+    берёт retain() и по окончании зовёт release().
+    """
+    __slots__ = ("ring", "slot", "frame_id", "array", "timestamp")
+
+    def __init__(self, ring, slot, frame_id, array):
+        self.ring = ring
+        self.slot = slot
+        self.frame_id = frame_id
+        self.array = array
+        # time.perf_counter() захвата кадра (захват уточняет его после read)
+        self.timestamp = time.perf_counter()
+
+    @property
+    def shape(self):
+        return self.array.shape
+
+    def retain(self):
+        self.ring._retain(self.slot, self.frame_id)
+        return self
+
+    def release(self):
+        self.ring._release(self.slot, self.frame_id)
+
+    def token(self):
+        """Для передачи в другой процесс: FrameRing.open(token) на той стороне."""
+        return self.slot, self.frame_id
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def as_array(frame):
+    """np.ndarray кадра — и для FrameHandle, и для обычного массива."""
+    return frame.array if isinstance(frame, FrameHandle) else frame
+
+
+def release(frame):
+    """Отпускает кадр, если это FrameHandle (обычный массив ничего не держит)."""
+    if isinstance(frame, FrameHandle):
+        frame.release()
+
+
+class FrameRing:
+    """
+    Заранее выделенное кольцо из count кадров одной формы. Захват пишет прямо
+    в слот (cap.read(image=handle.array)), потребители получают FrameHandle
+    со счётчиком ссылок вместо нового массива на каждый кадр.
+
+    policy — что делать, когда свободных слотов нет (все держат потребители):
+      "drop" — acquire() сразу возвращает None, кадр пропускается (dropped += 1);
+      "wait" — acquire() ждёт, пока слот освободится (не дольше timeout).
+
+    shared=True кладёт кадры и счётчики в разделяемую память: тогда spec()
+    передаётся в другой процесс (аргументом Process), там FrameRing.attach(spec),
+    а кадры ходят по token() — отправитель делает retain() за получателя.
+    """
+
+    def __init__(self, count, shape, dtype=np.uint8, policy="drop", shared=False):
+        if policy not in ("drop", "wait"):
+            raise ValueError(f"неизвестная политика {policy!r}, нужна 'drop' или 'wait'")
+        self.count = count
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.policy = policy
+        self.shared = shared
+        self.dropped = 0
+        self._frame_ids = itertools.count(1)
+        self._next = 0
+
+        if shared:
+            ctx = mp.get_context("spawn")
+            self._cond = ctx.Condition()
+            self._data = ShmSlots(count, int(np.prod(self.shape)) * self.dtype.itemsize)
+            self._header = ShmSlots(1, count * 16)
+        else:
+            self._cond = threading.Condition()
+            self._data = None
+            self._header = None
+        self._init_views()
+
+    def _init_views(self):
+        if self._data is not None:
+            self.arrays = [self._data.view(i, self.shape, self.dtype) for i in range(self.count)]
+            self._refcounts = self._header.view(0, (self.count,), np.int64)
+            self._ids = np.ndarray((self.count,), np.int64, self._header.shm.buf,
+                                   offset=self.count * 8)
+        else:
+            self.arrays = np.empty((self.count,) + self.shape, self.dtype)
+            self._refcounts = np.zeros(self.count, np.int64)
+            self._ids = np.zeros(self.count, np.int64)
+
+    def spec(self):
+        if not self.shared:
+            raise ValueError("spec() есть только у кольца с shared=True")
+        return {"count": self.count, "shape": self.shape, "dtype": self.dtype.str,
+                "policy": self.policy, "cond": self._cond,
+                "data": self._data.spec(), "header": self._header.spec()}
+
+    @classmethod
+    def attach(cls, spec):
+        """Подключается к кольцу другого процесса (только чтение кадров по token)."""
+        ring = cls.__new__(cls)
+        ring.count, ring.shape = spec["count"], tuple(spec["shape"])
+        ring.dtype, ring.policy, ring.shared = np.dtype(spec["dtype"]), spec["policy"], True
+        ring.dropped = 0
+        ring._cond = spec["cond"]
+        ring._data = ShmSlots(**spec["data"], create=False)
+        ring._header = ShmSlots(**spec["header"], create=False)
+        ring._init_views()
+        return ring
+
+    def _free_slot(self):
+        # Вызывается под self._cond; по кругу, чтобы только что отпущенный слот не брать сразу
+        for i in range(self.count):
+            slot = (self._next + i) % self.count
+            if self._refcounts[slot] == 0:
+                self._next = (slot + 1) % self.count
+                return slot
+        return None
+
+    def acquire(self, timeout=None):
+        """Слот под запись нового кадра (одна ссылка — у пишущего) или None по политике."""
+        with self._cond:
+            slot = self._free_slot()
+            if slot is None and self.policy == "wait":
+                self._cond.wait_for(lambda: (self._refcounts == 0).any(), timeout)
+                slot = self._free_slot()
+            if slot is None:
+                self.dropped += 1
+                return None
+            frame_id = next(self._frame_ids)
+            self._refcounts[slot] = 1
+            self._ids[slot] = frame_id
+        return FrameHandle(self, slot, frame_id, self.arrays[slot])
+
+    def open(self, token):
+        """FrameHandle по token() из другого процесса; ссылку за нас уже взял отправитель."""
+        slot, frame_id = token
+        if self._ids[slot] != frame_id or self._refcounts[slot] <= 0:
+            raise RuntimeError(f"слот {slot} уже занят другим кадром (ждали кадр {frame_id})")
+        return FrameHandle(self, slot, frame_id, self.arrays[slot])
+
+    def _check(self, slot, frame_id, action):
+        # Вызывается под self._cond: handle, чей слот уже отдан под другой кадр, — ошибка владельца
+        if self._refcounts[slot] <= 0 or self._ids[slot] != frame_id:
+            raise RuntimeError(f"{action}() кадра {frame_id}: слот {slot} уже освобождён")
+
+    def _retain(self, slot, frame_id):
+        with self._cond:
+            self._check(slot, frame_id, "retain")
+            self._refcounts[slot] += 1
+
+    def _release(self, slot, frame_id):
+        with self._cond:
+            self._check(slot, frame_id, "release")
+            self._refcounts[slot] -= 1
+            if self._refcounts[slot] == 0:
+                self._cond.notify_all()
+
+    def in_use(self):
+        with self._cond:
+            return int((self._refcounts > 0).sum())
+
+    def stats(self):
+        return {"slots": self.count, "in_use": self.in_use(), "dropped": self.dropped}
+
+    def close(self):
+        """Отключается от разделяемой памяти (создатель заодно удаляет её)."""
+        if self._data is None:
+            return
+        self.arrays = self._refcounts = self._ids = None
+        for block in (self._data, self._header):
+            block.close()
+            block.unlink()
+        self._data = self._header = None
@@ -0,0 +1,213 @@
+"""
+Стерео-глубина для пары камер: классический block matching (OpenCV SGBM/BM)
+на ректифицированных кадрах, метрическая и в разы дешевле forward ViT.
+
+    calibration = StereoCalibration.load("rig.npz")
+    stereo = StereoDepth(calibration, downscale=2)
+    result = stereo.compute(left_bgr, right_bgr)   # StereoFrame: depth (м), disparity, valid
+    u8 = stereo.quantize(stereo.fuse(result))      # для DepthColorizer.colorize
+
+Карты ректификации (initUndistortRectifyMap) считаются один раз на
+калибровку и размер кадра и кешируются. При downscale > 1 ректификация
+сразу даёт уменьшенные кадры (тот же remap), и поиск диспаратности идёт
+на них: диапазон и блоки в downscale раз меньше.
+
+Гибрид (hybrid_interval=N): стерео каждый кадр, DepthAnything — раз в N кадров
+(needs_reference()) на ректифицированном левом кадре StereoFrame.rectified. Относительная обратная
+глубина сети приводится к метрической по стерео (масштаб и сдвиг по валидным
+пикселям, заново на каждом кадре) и заполняет дыры стерео — однотонные
+области, засветки, края кадра.
+"""
+import os
+
+import cv2
+import numpy as np
+
+
+class StereoCalibration:
+    """
+    Внутренние параметры и положение камер пары (как из cv2.stereoCalibrate):
+    K1, D1, K2, D2, R, T; image_size = (w, h), для которого они сняты.
+    Единицы T — единицы глубины на выходе (обычно метры).
+    """
+
+    def __init__(self, K1, D1, K2, D2, R, T, image_size):
+        self.K1 = np.asarray(K1, np.float64)
+        self.D1 = np.asarray(D1, np.float64).reshape(-1)
+        self.K2 = np.asarray(K2, np.float64)
+        self.D2 = np.asarray(D2, np.float64).reshape(-1)
+        self.R = np.asarray(R, np.float64)
+        self.T = np.asarray(T, np.float64).reshape(3, 1)
+        self.image_size = tuple(int(v) for v in image_size)
+
+    @classmethod
+    def load(cls, path):
+        """.npz (ключи K1 D1 K2 D2 R T image_size) или .yml/.yaml/.xml (cv2.FileStorage)."""
+        names = ("K1", "D1", "K2", "D2", "R", "T", "image_size")
+        if os.path.splitext(path)[1].lower() == ".npz":
+            with np.load(path) as data:
+                return cls(*(data[name] for name in names))
+        storage = cv2.FileStorage(path, cv2.FILE_STORAGE_READ)
+        if not storage.isOpened():
+            raise FileNotFoundError(path)
+        try:
+            return cls(*(storage.getNode(name).mat() for name in names[:-1]),
+                       storage.getNode("image_size").mat().reshape(-1))
+        finally:
+            storage.release()
+
+    def save(self, path):
+        np.savez(path, K1=self.K1, D1=self.D1, K2=self.K2, D2=self.D2, R=self.R, T=self.T,
+                 image_size=np.array(self.image_size))
+
+    def scaled(self, size):
+        """K1, K2 под кадр другого размера (та же камера в другом режиме)."""
+        sx, sy = size[0] / self.image_size[0], size[1] / self.image_size[1]
+        scale = np.array([[sx], [sy], [1.0]])
+        return self.K1 * scale, self.K2 * scale
+
+
+class StereoFrame:
+    """Результат compute(): всё в координатах ректифицированного левого кадра (уменьшенного)."""
+    __slots__ = ("rectified", "disparity", "valid", "depth")
+
+    def __init__(self, rectified, disparity, valid, depth):
+        self.rectified = rectified      # левый кадр BGR — его и отдаём DepthAnything в гибриде
+        self.disparity = disparity      # float32, пиксели
+        self.valid = valid              # bool: диспаратность найдена
+        self.depth = depth              # float32, единицы T; 0 там, где не valid
+
+
+class StereoDepth:
+    """
+    matcher: "sgbm" (точнее, медленнее) или "bm" (быстрее, больше дыр).
+    num_disparities и block_size заданы для полного разрешения; при
+    downscale они уменьшаются сами.
+    """
+
+    def __init__(self, calibration, matcher="sgbm", num_disparities=128, block_size=5, downscale=1,
+                 hybrid_interval=0):
+        self.calibration = calibration
+        self.matcher_name = matcher
+        self.num_disparities = num_disparities
+        self.block_size = block_size
+        self.downscale = downscale
+        self.hybrid_interval = hybrid_interval
+
+        # (w, h) кадра -> (карты левой и правой камер, f, baseline); пересчёт — только при новом размере
+        self._rectification = {}
+        self._matcher = self._createMatcher()
+        self._buffers = {}
+        self.frames = 0
+        # Гибрид: последняя depth сети (обратная, относительная) и масштаб/сдвиг к стерео
+        self.reference = None
+        self.fit = None
+
+    def _createMatcher(self):
+        num = max(16, (self.num_disparities // self.downscale + 15) // 16 * 16)
+        block = max(3, (self.block_size // self.downscale) | 1)
+        if self.matcher_name == "bm":
+            return cv2.StereoBM_create(numDisparities=num, blockSize=max(5, block))
+        if self.matcher_name != "sgbm":
+            raise ValueError(f"Неизвестный matcher {self.matcher_name!r}: sgbm или bm")
+        return cv2.StereoSGBM_create(
+            minDisparity=0, numDisparities=num, blockSize=block,
+            P1=8 * block * block, P2=32 * block * block,
+            uniquenessRatio=10, speckleWindowSize=100, speckleRange=2,
+            mode=cv2.STEREO_SGBM_MODE_SGBM_3WAY,
+        )
+
+    def _maps(self, size):
+        entry = self._rectification.get(size)
+        if entry is None:
+            c = self.calibration
+            K1, K2 = c.scaled(size)
+            out_size = (size[0] // self.downscale, size[1] // self.downscale)
+            # newImageSize: прямоугольные проекции P1/P2 сразу под уменьшенный кадр
+            R1, R2, P1, P2, _, _, _ = cv2.stereoRectify(K1, c.D1, K2, c.D2, size, c.R, c.T,
+                                                        alpha=0, newImageSize=out_size)
+            left = cv2.initUndistortRectifyMap(K1, c.D1, R1, P1, out_size, cv2.CV_16SC2)
+            right = cv2.initUndistortRectifyMap(K2, c.D2, R2, P2, out_size, cv2.CV_16SC2)
+            focal = P1[0, 0]
+            baseline = abs(P2[0, 3] / P2[0, 0])
+            entry = self._rectification[size] = (left, right, focal, baseline, out_size)
+        return entry
+
+    def _buffer(self, name, shape, dtype):
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = self._buffers[name] = np.empty(shape, dtype)
+        return buf
+
+    def compute(self, left, right):
+        """Пара BGR-кадров одного размера -> StereoFrame."""
+        h, w = left.shape[:2]
+        (lx, ly), (rx, ry), focal, baseline, (ow, oh) = self._maps((w, h))
+
+        rect_left = self._buffer("left", (oh, ow, 3), np.uint8)
+        cv2.remap(left, lx, ly, cv2.INTER_LINEAR, dst=rect_left)
+        rect_right = self._buffer("right", (oh, ow, 3), np.uint8)
+        cv2.remap(right, rx, ry, cv2.INTER_LINEAR, dst=rect_right)
+        gray_left = cv2.cvtColor(rect_left, cv2.COLOR_BGR2GRAY, dst=self._buffer("gray_left", (oh, ow), np.uint8))
+        gray_right = cv2.cvtColor(rect_right, cv2.COLOR_BGR2GRAY, dst=self._buffer("gray_right", (oh, ow), np.uint8))
+
+        raw = self._matcher.compute(gray_left, gray_right)
+        disparity = raw.astype(np.float32)
+        disparity *= 1.0 / 16.0
+        valid = disparity > 0
+        depth = np.zeros_like(disparity)
+        np.divide(focal * baseline, disparity, out=depth, where=valid)
+        self.frames += 1
+        return StereoFrame(rect_left, disparity, valid, depth)
+
+    def needs_reference(self):
+        """Гибрид: пора прогнать DepthAnything на текущем кадре (каждый hybrid_interval-й)."""
+        if not self.hybrid_interval:
+            return False
+        return self.reference is None or self.frames % self.hybrid_interval == 0
+
+    def set_reference(self, relative):
+        """Depth сети (обратная относительная, любого размера) для кадра, на котором needs_reference()."""
+        self.reference = np.asarray(relative, np.float32)
+
+    def fuse(self, result):
+        """
+        Метрическая depth: стерео, а в его дырах — depth сети, приведённая к
+        масштабу стерео (1/Z = s * rel + t по валидным пикселям). Без гибрида
+        или без reference — как есть.
+        """
+        if self.reference is None or not self.hybrid_interval:
+            return result.depth
+        oh, ow = result.depth.shape
+        relative = self.reference
+        if relative.shape != (oh, ow):
+            relative = cv2.resize(relative, (ow, oh), interpolation=cv2.INTER_LINEAR)
+
+        # Подвыборка валидных пикселей: наклон и сдвиг по ним, МНК
+        ys, xs = np.nonzero(result.valid[::4, ::4])
+        if len(ys) < 100:
+            return result.depth
+        rel = relative[ys * 4, xs * 4]
+        inv = 1.0 / result.depth[ys * 4, xs * 4]
+        A = np.stack([rel, np.ones_like(rel)], axis=1)
+        (s, t), *_ = np.linalg.lstsq(A, inv, rcond=None)
+        self.fit = (float(s), float(t))
+
+        filled = relative * s + t
+        np.maximum(filled, 1e-6, out=filled)
+        np.divide(1.0, filled, out=filled)
+        return np.where(result.valid, result.depth, filled)
+
+    @staticmethod
+    def quantize(depth):
+        """
+        Метрическая depth -> uint8 обратной глубины, как у сети (ближе — ярче),
+        для DepthColorizer.colorize. Нормировка по 99-му перцентилю: одиночные
+        ложные совпадения на большой диспаратности не гасят остальную картинку.
+        """
+        inverse = np.zeros_like(depth)
+        np.divide(1.0, depth, out=inverse, where=depth > 0)
+        top = np.percentile(inverse[depth > 0], 99) if (depth > 0).any() else 0.0
+        if top <= 0:
+            return np.zeros(depth.shape, np.uint8)
+        return np.clip(inverse * (255.0 / top), 0, 255).astype(np.uint8)
@@ -0,0 +1,109 @@
+import cv2
+import numpy as np
+
+
+class _Keyframe:
+    __slots__ = ("thumb", "depth", "age")
+
+    def __init__(self, thumb, depth):
+        self.thumb = thumb
+        self.depth = depth
+        self.age = 0
+
+
+class TemporalReuse:
+    """
+    Повторное использование depth-карты на почти неподвижных кадрах
+    (стоим на светофоре — кадры почти одинаковые, а forward полный).
+
+    Для каждого источника (key) хранится последний посчитанный кадр (keyframe):
+    его уменьшенная серая копия и depth-карта. Новый кадр уменьшается так же
+    и сравнивается с keyframe — средняя абсолютная разница яркости в [0..1].
+    Ниже threshold — берём depth keyframe'а вместо forward.
+    С warp=True сначала оцениваем общий сдвиг (phaseCorrelate) и сравниваем
+    уже со сдвинутым keyframe; depth-карта сдвигается так же, так что
+    медленная панорама тоже переиспользуется.
+
+    Сравниваем всегда с keyframe, а не с предыдущим кадром, поэтому мелкие
+    изменения не накапливаются; keyframe_interval ограничивает, сколько
+    кадров подряд можно переиспользовать.
+    """
+
+    def __init__(self, threshold=0.02, keyframe_interval=30, warp=False, thumb_width=64):
+        self.threshold = threshold
+        self.keyframe_interval = keyframe_interval
+        self.warp = warp
+        self.thumb_width = thumb_width
+        self._keyframes = {}
+        self._stats = {}
+
+    def thumbnail(self, frame):
+        """BGR-кадр -> маленькая серая float32-копия в [0..1] для сравнения."""
+        h, w = frame.shape[:2]
+        size = (self.thumb_width, max(1, round(h * self.thumb_width / w)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.float32) * (1.0 / 255.0)
+
+    def lookup(self, key, thumb, depth_size):
+        """
+        Depth-карта для повторного использования или None, если кадр надо считать.
+        depth_size — (H', W') входа сети при текущем разрешении: после смены
+        разрешения старая карта не подходит.
+        """
+        stats = self._stats_for(key)
+        keyframe = self._keyframes.get(key)
+        if (keyframe is None or keyframe.age >= self.keyframe_interval
+                or keyframe.thumb.shape != thumb.shape
+                or tuple(keyframe.depth.shape[-2:]) != tuple(depth_size)):
+            return None
+
+        shift = (0.0, 0.0)
+        if self.warp:
+            shift, _ = cv2.phaseCorrelate(keyframe.thumb, thumb)
+            reference = self._shift(keyframe.thumb, shift)
+        else:
+            reference = keyframe.thumb
+        stats["motion"] = float(cv2.norm(reference, thumb, cv2.NORM_L1)) / thumb.size
+        if stats["motion"] > self.threshold:
+            return None
+
+        keyframe.age += 1
+        stats["reused"] += 1
+        if shift == (0.0, 0.0):
+            return keyframe.depth
+
+        # Сдвиг в пикселях миниатюры -> в пикселях depth-карты
+        scale_y = depth_size[0] / thumb.shape[0]
+        scale_x = depth_size[1] / thumb.shape[1]
+        depth = keyframe.depth.cpu().numpy()
+        return keyframe.depth.new_tensor(self._shift(depth, (shift[0] * scale_x, shift[1] * scale_y)))
+
+    def update(self, key, thumb, depth):
+        """Кадр посчитан заново: он становится новым keyframe для key."""
+        self._keyframes[key] = _Keyframe(thumb, depth)
+        self._stats_for(key)["recomputed"] += 1
+
+    def stats(self, key):
+        """{"reused", "recomputed", "motion"} для источника key."""
+        return dict(self._stats_for(key))
+
+    def reset(self, key=None):
+        """Забывает keyframe одного источника (или всех); счётчики сохраняются."""
+        if key is None:
+            self._keyframes.clear()
+        else:
+            self._keyframes.pop(key, None)
+
+    def _stats_for(self, key):
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = {"reused": 0, "recomputed": 0, "motion": 0.0}
+        return stats
+
+    @staticmethod
+    def _shift(image, shift):
+        h, w = image.shape[:2]
+        matrix = np.float32([[1, 0, shift[0]], [0, 1, shift[1]]])
+        return cv2.warpAffine(image, matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
@@ -0,0 +1,82 @@
+"""
+Бэкенды захвата (Camera.CAPTURE_BACKENDS) на одной камере: OpenCV против Qt Multimedia.
+
+Каждый бэкенд по очереди крутится --seconds секунд в своём потоке, как в
+CameraWidget (кольцо кадров, FrameHandle); печатается FPS, интервал между
+кадрами (p50/p95 — видно рывки), стадия capture из PipelineMetrics и загрузка
+CPU процессом. Стадия capture у бэкендов значит разное: у OpenCV это весь
+cap.read() вместе с ожиданием кадра, у Qt — только map и перевод в BGR,
+поэтому главное сравнение — по CPU при том же FPS.
+
+    python benchmarks/bench_capture.py --camera 0 --seconds 10
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from PySide6.QtCore import QThread, QTimer, Qt
+from PySide6.QtGui import QGuiApplication
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Camera import CAPTURE_BACKENDS, create_capture_worker  # noqa: E402
+from PipelineMetrics import PipelineMetrics  # noqa: E402
+
+
+def run_backend(app, backend, camera, seconds):
+    metrics = PipelineMetrics()
+    worker = create_capture_worker(backend, camera, metrics=metrics, source=0)
+    thread = QThread()
+    worker.moveToThread(thread)
+    thread.started.connect(worker.startCapture)
+
+    stamps, shapes = [], set()
+
+    def on_frame(handle):
+        stamps.append(handle.timestamp)
+        shapes.add(handle.array.shape)
+
+    worker.rawFrameCaptured.connect(on_frame, Qt.DirectConnection)
+
+    started, cpu = time.perf_counter(), time.process_time()
+    thread.start()
+    QTimer.singleShot(int(seconds * 1000), app.quit)
+    app.exec()
+    worker.stopCapture()
+    thread.quit()
+    thread.wait()
+    wall, cpu = time.perf_counter() - started, time.process_time() - cpu
+
+    # Первый кадр — после открытия камеры; FPS и интервалы считаем от него
+    if len(stamps) < 2:
+        print(f"{backend}: кадров {len(stamps)} — камера не открылась?")
+        return
+    intervals = np.diff(stamps) * 1000.0
+    capture = metrics.snapshot().get("0", {}).get("capture", {})
+    fps = (len(stamps) - 1) / (stamps[-1] - stamps[0])
+    print(f"{backend}: {len(stamps)} кадров {sorted(shapes)}, {fps:.1f} FPS, "
+          f"первый кадр через {stamps[0] - started:.2f} с")
+    print(f"  интервал p50 {np.percentile(intervals, 50):.1f} ms, p95 {np.percentile(intervals, 95):.1f} ms")
+    print(f"  capture p50 {capture.get('p50_ms', 0):.2f} ms, p95 {capture.get('p95_ms', 0):.2f} ms")
+    print(f"  CPU процесса {cpu / wall * 100:.0f}% одного ядра"
+          + (f", формат Qt {worker.pixel_format}" if getattr(worker, "pixel_format", None) else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--camera", default="0", help="индекс камеры (для opencv — ещё видеофайл или .depthrec)")
+    parser.add_argument("--backends", default=",".join(CAPTURE_BACKENDS),
+                        help="через запятую: " + ", ".join(CAPTURE_BACKENDS))
+    parser.add_argument("--seconds", default=10.0, type=float)
+    args = parser.parse_args()
+
+    camera = int(args.camera) if args.camera.isdigit() else args.camera
+    app = QGuiApplication(sys.argv)
+    for backend in args.backends.split(","):
+        run_backend(app, backend, camera, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
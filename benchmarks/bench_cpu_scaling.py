@@ -0,0 +1,111 @@
+"""
+Масштабирование конвейера по числу ядер: 1, 2, 4, ... до всех доступных.
+
+Для каждого числа ядер запускается отдельный процесс, закреплённый за первыми
+n ядрами (пулы torch настраиваются один раз на процесс). В нём кадры идут
+через DepthEstimator двумя способами:
+  sequential — infer() кадр за кадром, потоки torch/OpenCV по умолчанию;
+  pipelined  — CpuPlan + препроцессинг кадра N+1 параллельно с forward кадра N.
+
+    python benchmarks/bench_cpu_scaling.py --encoder vits --frames 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CpuScheduler import CpuPlan, available_cores, pin_current_thread  # noqa: E402
+
+
+def make_frames(count):
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    return [cv2.GaussianBlur(rng.integers(0, 256, (480, 640, 3), dtype=np.uint8), (0, 0), 4)
+            for _ in range(count)]
+
+
+def run_child(args):
+    """Замер в текущем процессе на ядрах available_cores()."""
+    cores = available_cores()
+    frames = make_frames(args.frames)
+    keys = [0]
+
+    if args.mode == "pipelined":
+        plan = CpuPlan(num_cameras=1, cores=cores)
+        pin_current_thread(plan.inference)
+        plan.configure_torch()
+        plan.configure_opencv()
+
+    from DepthEstimator import DepthEstimator
+
+    estimator = DepthEstimator(args.encoder, device="cpu", resolution=args.resolution, cache_dir=args.cache_dir)
+    estimator.infer(frames[:1], keys)  # прогрев
+
+    start = time.perf_counter()
+    if args.mode == "sequential":
+        for frame in frames:
+            estimator.infer([frame], keys)
+    else:
+        with ThreadPoolExecutor(1, initializer=lambda: pin_current_thread(plan.preprocess)) as prefetch:
+            pending = prefetch.submit(estimator.prepare, [frames[0]], keys)
+            for frame in frames[1:] + [None]:
+                prepared = pending.result()
+                if frame is not None:
+                    pending = prefetch.submit(estimator.prepare, [frame], keys)
+                estimator.run_prepared(prepared)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"fps": len(frames) / elapsed}))
+
+
+def measure(core_subset, mode, args):
+    code = (
+        "import os, sys; "
+        f"os.sched_setaffinity(0, {sorted(core_subset)!r}); "
+        f"sys.argv = {[sys.argv[0], '--child', '--mode', mode] + args.passthrough!r}; "
+        f"sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r}); "
+        "import bench_cpu_scaling; bench_cpu_scaling.main()"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return json.loads(result.stdout.strip().splitlines()[-1])["fps"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--encoder", default="vits", choices=["vits", "vitb", "vitl"])
+    parser.add_argument("--resolution", default="low")
+    parser.add_argument("--frames", default=20, type=int)
+    parser.add_argument("--cache-dir", default=None)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", default="sequential", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    args.passthrough = ["--encoder", args.encoder, "--resolution", args.resolution, "--frames", str(args.frames)]
+    if args.cache_dir:
+        args.passthrough += ["--cache-dir", args.cache_dir]
+
+    cores = available_cores()
+    counts = sorted({min(2 ** i, len(cores)) for i in range(len(cores).bit_length() + 1)})
+    print(f"{'cores':>5} {'sequential':>11} {'pipelined':>10} {'x':>5}   plan")
+    for n in counts:
+        subset = cores[:n]
+        sequential = measure(subset, "sequential", args)
+        pipelined = measure(subset, "pipelined", args)
+        print(f"{n:5d} {sequential:11.2f} {pipelined:10.2f} {pipelined / sequential:5.2f}   "
+              f"{CpuPlan(1, subset)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Графы фильтров (FilterGraph): скомпилированный план против тех же шагов
+"как написаны" (новый массив на каждом шаге, без слияний).
+
+Для каждого графа печатается план после компиляции, время кадра в обоих
+режимах, расхождение результатов и время по шагам плана. Кадры — из видео
+или .depthrec (--source) либо синтетические --size.
+
+    python benchmarks/bench_filters.py --size 1920x1080
+    python benchmarks/bench_filters.py --source recordings/drive.depthrec#0
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from FilterGraph import Blur, ColorMap, ConvertColor, Crop, FilterGraph, Resize  # noqa: E402
+from FrameSource import open_capture  # noqa: E402
+
+GRAPHS = {
+    # Обработка из camerasCheck
+    "blur": [Resize(scale=0.5), Blur(10), Resize(size="input"), ConvertColor(cv2.COLOR_BGR2RGB)],
+    "gray-colormap": [Resize(scale=0.5), Blur(2), ConvertColor(cv2.COLOR_BGR2GRAY),
+                      ColorMap(cv2.COLORMAP_INFERNO), ConvertColor(cv2.COLOR_BGR2RGB)],
+    "crop-preview": [Crop(0, 60), ConvertColor(cv2.COLOR_BGR2RGB), Resize(size=(640, 360), interpolation=cv2.INTER_AREA)],
+}
+
+
+def load_frames(source, size, count):
+    if source is None:
+        w, h = (int(v) for v in size.split("x"))
+        rng = np.random.default_rng(0)
+        # Шум, сглаженный до чего-то похожего на картинку
+        return [cv2.GaussianBlur(rng.integers(0, 256, (h, w, 3), dtype=np.uint8), (0, 0), 3)
+                for _ in range(min(count, 8))]
+    cap = open_capture(source, realtime=False)
+    frames = []
+    while len(frames) < count:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise SystemExit(f"{source}: не удалось прочитать ни одного кадра")
+    return frames
+
+
+def per_frame(fn, frames, repeat):
+    fn(frames[0])  # прогрев (и компиляция)
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(frames[i % len(frames)])
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", default=None, help="видео, индекс камеры или запись .depthrec[#N]")
+    parser.add_argument("--size", default="1280x720", help="размер синтетических кадров, WxH")
+    parser.add_argument("--graphs", default=",".join(GRAPHS), help="через запятую: " + ", ".join(GRAPHS))
+    parser.add_argument("--repeat", default=100, type=int)
+    args = parser.parse_args()
+
+    source = int(args.source) if args.source is not None and args.source.isdigit() else args.source
+    frames = load_frames(source, args.size, args.repeat)
+    h, w = frames[0].shape[:2]
+    print(f"кадры {w}x{h}, {len(frames)} шт., OpenCV потоков: {cv2.getNumThreads()}")
+
+    for name in args.graphs.split(","):
+        graph = FilterGraph(GRAPHS[name])
+        compiled = per_frame(graph, frames, args.repeat)
+        naive = per_frame(graph.naive, frames, args.repeat)
+        diff = np.abs(graph(frames[0]).astype(np.int16) - graph.naive(frames[0])).max()
+
+        print(f"\n{name}: compiled {compiled * 1000:.2f} ms, naive {naive * 1000:.2f} ms "
+              f"(x{naive / compiled:.2f}), max |diff| {diff}")
+        print("  " + graph.describe().replace("\n", "\n  "))
+
+        timings = {}
+        for i in range(args.repeat):
+            graph(frames[i % len(frames)], timings)
+        for step, seconds in timings.items():
+            print(f"  {step:<28} {seconds / args.repeat * 1000:7.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
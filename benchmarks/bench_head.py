@@ -0,0 +1,117 @@
+"""
+DPTHead против FusedDPTHead: совпадение выходов и время по слоям.
+
+Голова берётся из модели со случайными весами (веса на время не влияют),
+на вход — случайные признаки энкодера для сетки патчей входа --size.
+Время каждого слоя меряется forward-хуками, по медиане из --repeat проходов;
+затем суммарно по типам операций (torch.profiler).
+
+    python benchmarks/bench_head.py --encoder vitl --size 518x686
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+from collections import defaultdict
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from depth_anything.dpt import DPT_DINOv2  # noqa: E402
+from depth_anything.fused_head import FusedDPTHead  # noqa: E402
+from depth_anything.weights import MODEL_CONFIGS  # noqa: E402
+
+# Слои, по которым раскладываем время (вложенные модули не считаем дважды)
+ORIGINAL_LAYERS = [
+    "projects.0", "projects.1", "projects.2", "projects.3",
+    "resize_layers.0", "resize_layers.1", "resize_layers.3",
+    "scratch.layer1_rn", "scratch.layer2_rn", "scratch.layer3_rn", "scratch.layer4_rn",
+    "scratch.refinenet4", "scratch.refinenet3", "scratch.refinenet2", "scratch.refinenet1",
+    "scratch.output_conv1", "scratch.output_conv2",
+]
+FUSED_LAYERS = [
+    "branches.0", "branches.1", "branches.2", "branches.3",
+    "refinenets.3", "refinenets.2", "refinenets.1", "refinenets.0",
+    "output_conv1", "output_conv2a", "output_conv2b",
+]
+
+
+def layer_times(head, names, features, patch_h, patch_w, repeat):
+    """{слой: медиана мс} по forward-хукам + общее время прохода."""
+    modules = dict(head.named_modules())
+    samples = defaultdict(list)
+    started = {}
+    handles = []
+    for name in names:
+        module = modules[name]
+        handles.append(module.register_forward_pre_hook(
+            lambda m, args, name=name: started.__setitem__(name, time.perf_counter())))
+        handles.append(module.register_forward_hook(
+            lambda m, args, out, name=name: samples[name].append(time.perf_counter() - started[name])))
+
+    totals = []
+    with torch.no_grad():
+        head(features, patch_h, patch_w)  # прогрев
+        samples.clear()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            head(features, patch_h, patch_w)
+            totals.append(time.perf_counter() - start)
+    for handle in handles:
+        handle.remove()
+
+    def median_ms(values):
+        values = sorted(values)
+        return values[len(values) // 2] * 1000.0 * len(values) / repeat  # слой может звать модуль не раз
+
+    return {name: median_ms(samples[name]) for name in names}, median_ms(totals)
+
+
+def op_times(head, features, patch_h, patch_w, top):
+    with torch.no_grad(), torch.profiler.profile() as prof:
+        head(features, patch_h, patch_w)
+    return [(e.key, e.self_cpu_time_total / 1000.0) for e in
+            sorted(prof.key_averages(), key=lambda e: -e.self_cpu_time_total)[:top]]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--encoder", default="vits", choices=["vits", "vitb", "vitl"])
+    parser.add_argument("--size", default="518x686", help="вход сети HxW (кратно 14)")
+    parser.add_argument("--batch", default=1, type=int)
+    parser.add_argument("--repeat", default=5, type=int)
+    parser.add_argument("--top", default=8, type=int)
+    args = parser.parse_args()
+
+    h, w = (int(v) for v in args.size.split("x"))
+    patch_h, patch_w = h // 14, w // 14
+
+    torch.manual_seed(0)
+    model = DPT_DINOv2(**MODEL_CONFIGS[args.encoder]).eval()
+    head = model.depth_head
+    fused = FusedDPTHead.from_head(copy.deepcopy(head))
+    dim = model.pretrained.embed_dim
+    features = [
+        (torch.randn(args.batch, patch_h * patch_w, dim), torch.randn(args.batch, dim))
+        for _ in range(4)
+    ]
+
+    with torch.no_grad():
+        diff = (head(features, patch_h, patch_w) - fused(features, patch_h, patch_w)).abs().max().item()
+    print(f"{args.encoder}, вход {h}x{w}, патчей {patch_h}x{patch_w}, max|d| = {diff:.2e}")
+    print("слои свёрнутой головы:", [[type(op).__name__ for op in branch] for branch in fused.branches])
+
+    for title, module, names in (("DPTHead", head, ORIGINAL_LAYERS), ("FusedDPTHead", fused, FUSED_LAYERS)):
+        times, total = layer_times(module, names, features, patch_h, patch_w, args.repeat)
+        print(f"\n{title}: {total:.1f} ms")
+        for name in names:
+            print(f"    {name:<24} {times[name]:8.2f} ms")
+        print("    по операциям:")
+        for key, ms in op_times(module, features, patch_h, patch_w, args.top):
+            print(f"    {key:<32} {ms:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
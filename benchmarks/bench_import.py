@@ -0,0 +1,79 @@
+"""
+Время импорта GUI-модулей (python -X importtime) как проверка на регрессию.
+
+Каждый модуль импортируется в отдельном процессе. Печатается суммарное
+время импорта и самые тяжёлые зависимости. Код возврата 1, если:
+  - модуль потянул за собой ML-стек (torch, torchvision, depth_anything, PIL) —
+    он должен загружаться лениво, в потоке обработки;
+  - время превысило --max-ms.
+
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py MainWindow --max-ms 800
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = ["MainWindow", "Camera", "Reimage", "FrameView"]
+HEAVY_MODULES = ("torch", "torchvision", "depth_anything", "PIL")
+
+
+def import_times(module):
+    """{имя модуля: (self мкс, cumulative мкс)} для `import module` в чистом процессе."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.splitlines()[-1]}")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--max-ms", default=None, type=float, help="бюджет на импорт одного модуля")
+    parser.add_argument("--top", default=8, type=int)
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        try:
+            times = import_times(module)
+        except RuntimeError as e:
+            print(e)
+            failed = True
+            continue
+
+        total_ms = times[module][1] / 1000.0
+        heavy = sorted({name.split(".")[0] for name in times} & set(HEAVY_MODULES))
+        print(f"{module}: {total_ms:.0f} ms")
+        # Только модули верхнего уровня, иначе пакет и его подмодули дублируются
+        top_level = [(name, cumulative) for name, (_, cumulative) in times.items()
+                     if "." not in name.strip() and name != module]
+        for name, cumulative in sorted(top_level, key=lambda item: -item[1])[:args.top]:
+            print(f"    {name:<24} {cumulative / 1000.0:8.1f} ms")
+
+        if heavy:
+            print(f"    REGRESSION: imports {', '.join(heavy)}")
+            failed = True
+        if args.max_ms is not None and total_ms > args.max_ms:
+            print(f"    REGRESSION: {total_ms:.0f} ms > {args.max_ms:.0f} ms")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
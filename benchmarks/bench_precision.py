@@ -0,0 +1,68 @@
+"""
+Точность и скорость режимов fp32 / bf16 / int8 на примерах кадров.
+
+Для каждого режима печатается ошибка нормированной глубины относительно fp32
+(средняя и максимальная), медианная задержка, размер весов и рост пикового RSS.
+
+    python benchmarks/bench_precision.py --encoder vits --frames drive.mp4 --count 8
+"""
+import argparse
+import itertools
+import os
+import sys
+
+import cv2
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from DepthEstimator import DepthEstimator  # noqa: E402
+from FrameSource import iter_frames  # noqa: E402
+from depth_anything.precision import PRECISION_MODES, compare_precision  # noqa: E402
+
+
+def sample_frames(source, count):
+    if source is not None:
+        return list(itertools.islice(iter_frames(source), count))
+    # Без записи — гладкие случайные кадры 720p
+    rng = np.random.default_rng(0)
+    return [
+        cv2.GaussianBlur(rng.integers(0, 256, (720, 1280, 3), dtype=np.uint8), (0, 0), 8)
+        for _ in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--encoder", default="vits", choices=["vits", "vitb", "vitl"])
+    parser.add_argument("--frames", default=None, help="видеофайл или папка с картинками")
+    parser.add_argument("--count", default=4, type=int)
+    parser.add_argument("--resolution", default="full")
+    parser.add_argument("--modes", default=",".join(PRECISION_MODES))
+    parser.add_argument("--repeat", default=3, type=int)
+    args = parser.parse_args()
+
+    estimator = DepthEstimator(args.encoder, device="cpu", resolution=args.resolution)
+    model = estimator.depth_model.model
+
+    inputs = [
+        torch.from_numpy(estimator.preprocess(frame).copy()).unsqueeze(0)
+        for frame in sample_frames(args.frames, args.count)
+    ]
+    print(f"{len(inputs)} кадров, вход сети {tuple(inputs[0].shape[2:])}, "
+          f"потоков torch: {torch.get_num_threads()}")
+
+    report = compare_precision(model, inputs, modes=args.modes.split(","), repeat=args.repeat)
+
+    print(f"{'mode':>5} {'mean|d|':>9} {'max|d|':>9} {'ms':>9} {'x':>5} {'weights MB':>11} {'RSS +MB':>8}")
+    base = report[0]["latency_ms"]
+    for row in report:
+        rss = "-" if row["peak_rss_growth_mb"] is None else f"{row['peak_rss_growth_mb']:.0f}"
+        print(f"{row['mode']:>5} {row['mean_abs_error']:9.4f} {row['max_abs_error']:9.4f} "
+              f"{row['latency_ms']:9.1f} {base / row['latency_ms']:5.2f} "
+              f"{row['model_mb']:11.1f} {rss:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Микробенчмарк препроцессинга: эталонная цепочка
+(cvtColor / 255.0 -> Resize -> NormalizeImage -> PrepareForNet)
+против FusedPreprocess (uint8 и float32) на типичных разрешениях камер.
+
+    python benchmarks/bench_preprocess.py --repeat 50
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from depth_anything.util.transform import Resize, NormalizeImage, PrepareForNet, FusedPreprocess  # noqa: E402
+
+MEAN = [0.485, 0.456, 0.406]
+STD = [0.229, 0.224, 0.225]
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+
+
+def make_resize():
+    return Resize(
+        width=518,
+        height=518,
+        resize_target=False,
+        keep_aspect_ratio=True,
+        ensure_multiple_of=14,
+        resize_method='lower_bound',
+        image_interpolation_method=cv2.INTER_CUBIC,
+    )
+
+
+def reference(resize, normalize, prepare, frame_bgr):
+    sample = {'image': cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB) / 255.0}
+    return prepare(normalize(resize(sample)))['image']
+
+
+def timeit(fn, repeat):
+    fn()  # прогрев (и выделение буферов)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", default=30, type=int)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    resize, normalize, prepare = make_resize(), NormalizeImage(MEAN, STD), PrepareForNet()
+    fused = {
+        dtype: FusedPreprocess(make_resize(), MEAN, STD, resize_dtype=dtype)
+        for dtype in ("uint8", "float32")
+    }
+
+    print(f"{'resolution':>12} {'reference ms':>13} {'uint8 ms':>9} {'x':>5} "
+          f"{'float32 ms':>11} {'x':>5} {'max|d| u8':>10} {'max|d| f32':>11}")
+    for width, height in RESOLUTIONS:
+        # Гладкая картинка ближе к реальному кадру, чем белый шум
+        frame = cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+
+        expected = reference(resize, normalize, prepare, frame)
+        t_ref = timeit(lambda: reference(resize, normalize, prepare, frame), args.repeat)
+
+        row = [f"{width}x{height}", f"{t_ref:13.2f}"]
+        errors = []
+        for dtype in ("uint8", "float32"):
+            t = timeit(lambda: fused[dtype](frame), args.repeat)
+            row += [f"{t:{9 if dtype == 'uint8' else 11}.2f}", f"{t_ref / t:5.1f}"]
+            errors.append(np.abs(fused[dtype](frame) - expected).max())
+        row += [f"{errors[0]:10.4f}", f"{errors[1]:11.6f}"]
+        print(f"{row[0]:>12} " + " ".join(row[1:]))
+
+
+if __name__ == '__main__':
+    main()
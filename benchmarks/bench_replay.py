@@ -0,0 +1,75 @@
+"""
+Прогон DepthEstimator по записи .depthrec вместо камеры.
+
+Сначала — скорость самой записи: последовательное чтение и случайный доступ
+к кадрам. Затем кадры источника --source идут через infer() по одному;
+печатается FPS и, если в записи есть depth того же размера, насколько новая
+depth отличается от записанной (медиана |d| / медиана записанной depth).
+
+    python benchmarks/bench_replay.py recordings/drive.depthrec --encoder vits
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from DepthRecording import DepthRecording  # noqa: E402
+
+
+def read_speed(recording, indices, repeat):
+    start = time.perf_counter()
+    for i in indices[:repeat]:
+        recording.frame(int(i))
+    return len(indices[:repeat]) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("recording")
+    parser.add_argument("--source", default=0, type=int)
+    parser.add_argument("--encoder", default="vits", choices=["vits", "vitb", "vitl"])
+    parser.add_argument("--resolution", default="full")
+    parser.add_argument("--precision", default="fp32", choices=["fp32", "bf16", "int8"])
+    parser.add_argument("--backend", default="eager", choices=["eager", "trace", "compile", "onnx"])
+    parser.add_argument("--frames", default=50, type=int, help="сколько кадров прогнать через модель")
+    args = parser.parse_args()
+
+    recording = DepthRecording(args.recording)
+    indices = recording.frame_indices(args.source)
+    print(f"{args.recording}: {len(recording)} кадров, источники {recording.sources}, "
+          f"сжатие {recording.compression}, чанков {len(recording.chunks)}")
+
+    rng = np.random.default_rng(0)
+    print(f"чтение: подряд {read_speed(recording, indices, 200):.0f} кадров/с, "
+          f"вразнобой {read_speed(recording, rng.permutation(indices), 200):.0f} кадров/с")
+
+    from DepthEstimator import DepthEstimator
+
+    estimator = DepthEstimator(args.encoder, resolution=args.resolution,
+                               precision=args.precision, backend=args.backend)
+    times, errors = [], []
+    for i in indices[:args.frames]:
+        frame = recording.frame(int(i))
+        start = time.perf_counter()
+        depth = estimator.infer([frame])[0].float().cpu().numpy()
+        times.append(time.perf_counter() - start)
+
+        recorded = recording.depth(int(i))
+        if recorded is not None and recorded.shape == depth.shape:
+            recorded = recorded.astype(np.float32)
+            errors.append(np.median(np.abs(depth - recorded)) / max(np.median(recorded), 1e-6))
+
+    times = sorted(times[1:] or times)  # первый кадр — прогрев
+    print(f"infer: медиана {times[len(times) // 2] * 1000:.1f} ms, {len(times) / sum(times):.2f} FPS")
+    if errors:
+        print(f"отличие от записанной depth: {np.median(errors):.4f} (медиана по {len(errors)} кадрам)")
+    else:
+        print("записанной depth того же размера нет, сравнивать не с чем")
+
+
+if __name__ == '__main__':
+    main()
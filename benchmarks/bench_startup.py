@@ -0,0 +1,61 @@
+"""
+Время холодного старта: от запуска процесса до первой depth-карты.
+
+Печатает время импортов, загрузки весов (по фазам), первого forward
+и итоговое time-to-first-frame. Каждый запуск — отдельный процесс, чтобы
+измерять именно холодный старт; для сравнения со старым путём
+(DepthAnything.from_pretrained со случайной инициализацией) — --from-pretrained.
+
+    python benchmarks/bench_startup.py --encoder vits
+    python benchmarks/bench_startup.py --encoder vits --from-pretrained
+"""
+import time
+
+START = time.perf_counter()
+
+import argparse  # noqa: E402
+import os  # noqa: E402
+import sys  # noqa: E402
+
+import numpy as np  # noqa: E402
+import torch  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from DepthEstimator import DepthEstimator  # noqa: E402
+from depth_anything.dpt import DepthAnything  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--encoder", default="vits", choices=["vits", "vitb", "vitl"])
+    parser.add_argument("--cache-dir", default=None)
+    parser.add_argument("--from-pretrained", action="store_true",
+                        help="старый путь: DepthAnything.from_pretrained")
+    args = parser.parse_args()
+
+    imported = time.perf_counter()
+    print(f"imports          {imported - START:7.2f} s")
+
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    if args.from_pretrained:
+        model = DepthAnything.from_pretrained(f"LiheYoung/depth_anything_{args.encoder}14").eval()
+        loaded = time.perf_counter()
+        with torch.no_grad():
+            model(torch.zeros(1, 3, 518, 686))
+    else:
+        estimator = DepthEstimator(args.encoder, device="cpu", cache_dir=args.cache_dir)
+        loaded = time.perf_counter()
+        for name, seconds in estimator.load_timings.items():
+            print(f"  {name:<14} {seconds:7.2f} s")
+        # Первый кадр обычным путём: препроцессинг, forward, раскраска
+        estimator.process([frame])
+    done = time.perf_counter()
+
+    print(f"model            {loaded - imported:7.2f} s")
+    print(f"first frame      {done - loaded:7.2f} s")
+    print(f"time to first    {done - START:7.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Пропускная способность глубины для пары камер: стерео (StereoDepth, SGBM/BM,
+с уменьшением и без), гибрид (стерео + DepthAnything раз в N пар) и
+монокулярный DepthAnything на обоих кадрах пары одним батчем.
+
+Без --left/--right пара синтетическая: текстура со сдвигом (фон и ближний
+прямоугольник) и однотонное пятно, где стерео не находит совпадений, — по ней
+видна и ошибка стерео, и доля пикселей, заполненных в гибриде.
+
+    python benchmarks/bench_stereo.py --size 1280x720 --encoder vits
+    python benchmarks/bench_stereo.py --left l.png --right r.png --calibration rig.npz
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from StereoDepth import StereoCalibration, StereoDepth  # noqa: E402
+
+
+def synthetic_pair(w, h, baseline=0.1):
+    """Пара, калибровка (одинаковые камеры, только сдвиг) и истинная диспаратность."""
+    focal = 0.8 * w
+    K = np.array([[focal, 0, w / 2], [0, focal, h / 2], [0, 0, 1]])
+    calibration = StereoCalibration(K, np.zeros(5), K, np.zeros(5), np.eye(3), [-baseline, 0, 0], (w, h))
+
+    rng = np.random.default_rng(0)
+    margin = w // 4
+    texture = cv2.GaussianBlur(rng.integers(0, 256, (h, w + 2 * margin, 3), dtype=np.uint8), (0, 0), 1.5)
+    disparity = np.full((h, w), w / 32, np.float32)
+    disparity[h // 3:2 * h // 3, w // 3:2 * w // 3] = w / 14
+
+    left = np.ascontiguousarray(texture[:, margin:margin + w])
+    xs, ys = np.meshgrid(np.arange(w, dtype=np.float32), np.arange(h, dtype=np.float32))
+    right = cv2.remap(texture, xs + margin + disparity, ys, cv2.INTER_LINEAR)
+    # Однотонное пятно в обоих кадрах
+    flat = (slice(2 * h // 3, h - 10), slice(w // 20, w // 4))
+    left[flat] = 128
+    right[flat[0], flat[1].start - int(w / 32):flat[1].stop - int(w / 32)] = 128
+    return left, right, calibration, disparity
+
+
+def per_pair(fn, repeat):
+    fn()  # прогрев (карты ректификации, буферы)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--left", default=None)
+    parser.add_argument("--right", default=None)
+    parser.add_argument("--calibration", default=None, help="калибровка пары (.npz/.yml) для --left/--right")
+    parser.add_argument("--size", default="1280x720", help="размер синтетической пары, WxH")
+    parser.add_argument("--downscales", default="1,2,4")
+    parser.add_argument("--hybrid-interval", default=10, type=int)
+    parser.add_argument("--encoder", default="vits", choices=["vits", "vitb", "vitl"])
+    parser.add_argument("--resolution", default="full")
+    parser.add_argument("--repeat", default=10, type=int)
+    parser.add_argument("--no-model", action="store_true", help="без DepthAnything: только стерео")
+    args = parser.parse_args()
+
+    truth = None
+    if args.left:
+        left, right = cv2.imread(args.left), cv2.imread(args.right)
+        calibration = StereoCalibration.load(args.calibration)
+    else:
+        w, h = (int(v) for v in args.size.split("x"))
+        left, right, calibration, truth = synthetic_pair(w, h)
+    h, w = left.shape[:2]
+    print(f"пара {w}x{h}, OpenCV потоков: {cv2.getNumThreads()}")
+
+    stereo_ms = {}
+    for matcher in ("sgbm", "bm"):
+        for downscale in (int(v) for v in args.downscales.split(",")):
+            stereo = StereoDepth(calibration, matcher=matcher, downscale=downscale)
+            seconds = per_pair(lambda: stereo.compute(left, right), args.repeat)
+            stereo_ms[(matcher, downscale)] = seconds
+            result = stereo.compute(left, right)
+            line = f"stereo {matcher} /{downscale}: {seconds * 1000:7.1f} ms, {1 / seconds:6.1f} пар/с, " \
+                   f"найдено {result.valid.mean() * 100:.0f}% пикселей"
+            if truth is not None:
+                expected = cv2.resize(truth, result.disparity.shape[::-1], interpolation=cv2.INTER_NEAREST) / downscale
+                error = np.abs(result.disparity - expected)[result.valid] / expected[result.valid]
+                line += f", ошибка диспаратности {np.median(error) * 100:.1f}%"
+            print(line)
+
+    if args.no_model:
+        return
+
+    from DepthEstimator import DepthEstimator
+
+    estimator = DepthEstimator(args.encoder, resolution=args.resolution)
+    mono = per_pair(lambda: estimator.infer([left, right]), max(2, args.repeat // 2))
+    print(f"mono {args.encoder} (оба кадра одним батчем): {mono * 1000:7.1f} ms, {1 / mono:6.1f} пар/с")
+
+    # Гибрид: сеть на ректифицированном левом кадре раз в N пар, между ними — только стерео и fuse()
+    downscale = 2 if (("sgbm", 2) in stereo_ms) else 1
+    stereo = StereoDepth(calibration, downscale=downscale, hybrid_interval=args.hybrid_interval)
+    pairs = args.hybrid_interval * 2
+    stereo.compute(left, right)
+    start = time.perf_counter()
+    for _ in range(pairs):
+        result = stereo.compute(left, right)
+        if stereo.needs_reference():
+            stereo.set_reference(estimator.infer([result.rectified])[0].float().cpu().numpy())
+        fused = stereo.fuse(result)
+    seconds = (time.perf_counter() - start) / pairs
+    print(f"hybrid sgbm /{downscale}, сеть раз в {args.hybrid_interval}: {seconds * 1000:7.1f} ms, "
+          f"{1 / seconds:6.1f} пар/с (x{mono / seconds:.1f} к mono), "
+          f"заполнено {(fused > 0).mean() * 100:.0f}% пикселей")
+
+
+if __name__ == '__main__':
+    main()
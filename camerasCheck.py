@@ -1,6 +1,5 @@
 import sys
 import cv2
-import numpy as np
 
 from PySide6.QtCore import QThread, Signal, Slot, QObject, Qt
 from PySide6.QtGui import QImage, QPixmap
@@ -8,26 +7,31 @@ from PySide6.QtWidgets import (
     QApplication, QLabel, QMainWindow, QWidget, QVBoxLayout
 )
 
+from FilterGraph import Blur, ConvertColor, FilterGraph, Resize
+from FrameMailbox import LatestFrameMailbox
+
+
+# Прежняя обработка из цикла захвата: уменьшить вдвое, размыть, вернуть размер, BGR -> RGB
+DEFAULT_FILTERS = [Resize(scale=0.5), Blur(10), Resize(size="input"), ConvertColor(cv2.COLOR_BGR2RGB)]
+
 
 class CameraWorker(QObject):
     """
     Worker, который непрерывно читает кадры из OpenCV-камеры (cv2.VideoCapture)
-    и отправляет сигнал с numpy-массивом.
+    и кладёт их в ящик; обработкой занимается FilterWorker в своём потоке,
+    так что захват не ждёт фильтров.
     """
-    frameCaptured = Signal(np.ndarray)
 
-    def __init__(self, parent=None):
+    def __init__(self, mailbox, camera_index=0, parent=None):
         super().__init__(parent)
         self._is_running = False
         self.cap = None
-
-        # Примерные настройки для уменьшения нагрузки
-        self._sigma = 10            # "сила" размытия
-        self._resize_factor = 2     # уменьшаем кадр в 2 раза перед обработкой
+        self.camera_index = camera_index
+        self.mailbox = mailbox
 
     def startCamera(self):
         """Запускается, когда поток (QThread) стартовал."""
-        self.cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)  # Для Windows: CV_CAP_DSHOW
+        self.cap = cv2.VideoCapture(self.camera_index, cv2.CAP_DSHOW)  # Для Windows: CV_CAP_DSHOW
         # Или просто: cv2.VideoCapture(0) — зависит от платформы
         if not self.cap.isOpened():
             print("Не удалось открыть камеру!")
@@ -38,20 +42,8 @@ class CameraWorker(QObject):
             ret, frame = self.cap.read()
             if not ret:
                 continue
-
-            # Пример: GaussianBlur + resize
-            h, w = frame.shape[:2]
-            small_frame = cv2.resize(
-                frame, (w // self._resize_factor, h // self._resize_factor)
-            )
-            blurred_small = cv2.GaussianBlur(small_frame, (0, 0), self._sigma)
-            blurred = cv2.resize(blurred_small, (w, h))
-
-            # BGR -> RGB
-            blurred_rgb = cv2.cvtColor(blurred, cv2.COLOR_BGR2RGB)
-
-            # Отправляем кадр в основной поток
-            self.frameCaptured.emit(blurred_rgb)
+            # Не успевает обработка — непрочитанный кадр просто заменяется
+            self.mailbox.put(frame)
 
         self.cap.release()
 
@@ -60,13 +52,46 @@ class CameraWorker(QObject):
         self._is_running = False
 
 
+class FilterWorker(QObject):
+    """
+    Прогоняет самый свежий кадр из ящика через граф фильтров (FilterGraph)
+    и отправляет готовую картинку. QImage собирается здесь же, с копией:
+    выходной буфер графа переиспользуется, а GUI-поток может отстать.
+    """
+    frameFiltered = Signal(QImage)
+
+    def __init__(self, mailbox, graph, parent=None):
+        super().__init__(parent)
+        self._is_running = False
+        self.mailbox = mailbox
+        self.graph = graph
+
+    def run(self):
+        self._is_running = True
+        while self._is_running:
+            frame = self.mailbox.take(timeout=0.1)
+            if frame is None:
+                continue
+            out = self.graph(frame)
+            h, w = out.shape[:2]
+            if out.ndim == 2:
+                qimg = QImage(out.data, w, h, out.strides[0], QImage.Format_Grayscale8)
+            else:
+                qimg = QImage(out.data, w, h, out.strides[0], QImage.Format_RGB888)
+            self.frameFiltered.emit(qimg.copy())
+
+    def stop(self):
+        self._is_running = False
+
+
 class CameraWidget(QWidget):
     """
     Виджет, внутри которого:
       - QLabel для показа текущего кадра,
-      - Worker (CameraWorker) и QThread для захвата и обработки.
+      - CameraWorker и FilterWorker, каждый в своём QThread: захват и обработка.
+    filters — шаги графа (FilterGraph) для этой камеры; выход — RGB или серый.
     """
-    def __init__(self, parent=None):
+    def __init__(self, camera_index=0, filters=None, parent=None):
         super().__init__(parent)
 
         # Простейшая верстка: лейбл в вертикальном лей-ауте
@@ -77,37 +102,47 @@ class CameraWidget(QWidget):
         layout.addWidget(self.label)
         self.setLayout(layout)
 
+        # Захват и обработка связаны одноместным ящиком: обработка берёт самый свежий кадр
+        self.mailbox = LatestFrameMailbox()
+        self.graph = FilterGraph(DEFAULT_FILTERS if filters is None else filters)
+
         # Создаём объекты для работы с камерой
-        self.worker = CameraWorker()
+        self.worker = CameraWorker(self.mailbox, camera_index)
         self.thread = QThread()
         self.worker.moveToThread(self.thread)
+        self.filterWorker = FilterWorker(self.mailbox, self.graph)
+        self.filterThread = QThread()
+        self.filterWorker.moveToThread(self.filterThread)
 
-        # Когда поток запускается, worker начинает читать камеру
+        # Когда потоки запускаются, worker начинает читать камеру, а filterWorker — ящик
         self.thread.started.connect(self.worker.startCamera)
+        self.filterThread.started.connect(self.filterWorker.run)
         # При остановке приложения — аккуратно всё закрываем
         # (или можем вызвать stopCamera() из MainWindow)
 
         # При получении нового кадра обновляем изображение
-        self.worker.frameCaptured.connect(self.updateImage)
+        self.filterWorker.frameFiltered.connect(self.updateImage)
 
     def startCamera(self):
-        """Старт потока (и, соответственно, startCamera() в worker)."""
+        """Старт потоков (и, соответственно, startCamera() в worker)."""
+        self.filterThread.start()
         self.thread.start()
 
     def stopCamera(self):
-        """Останавливаем камеру, завершаем поток."""
+        """Останавливаем камеру и обработку, завершаем потоки."""
         self.worker.stopCamera()
         self.thread.quit()
         self.thread.wait()
 
-    @Slot(np.ndarray)
-    def updateImage(self, frame: np.ndarray):
+        self.filterWorker.stop()
+        self.filterThread.quit()
+        self.filterThread.wait()
+
+    @Slot(QImage)
+    def updateImage(self, qimg: QImage):
         """
-        Слот, в который приходит обработанный кадр (numpy array).
+        Слот, в который приходит обработанный кадр (QImage уже собран в потоке обработки).
         Конвертируем в QPixmap и отображаем в QLabel.
         """
-        h, w, ch = frame.shape
-        bytesPerLine = ch * w
-        qimg = QImage(frame.data, w, h, bytesPerLine, QImage.Format_RGB888)
         pixmap = QPixmap.fromImage(qimg)
         self.label.setPixmap(pixmap)
\ No newline at end of file
@@ -0,0 +1,19 @@
+import pytest
+
+# test_camera.py — ручной набросок с Qt Multimedia и cv2PySide6, не тест
+collect_ignore = ["test_camera.py"]
+
+
+@pytest.fixture(scope="session")
+def vits_model():
+    """DPT_DINOv2 vits со случайными весами (без скачивания чекпойнта), eval."""
+    torch = pytest.importorskip("torch")
+    from depth_anything.dpt import DPT_DINOv2
+    from depth_anything.weights import MODEL_CONFIGS
+
+    torch.manual_seed(0)
+    model = DPT_DINOv2(**MODEL_CONFIGS["vits"]).eval()
+    with torch.no_grad():
+        # Нулевой pos_embed сделал бы интерполяцию позиций невидимой для сравнения
+        model.pretrained.pos_embed.normal_(std=0.02)
+    return model
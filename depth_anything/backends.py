@@ -0,0 +1,227 @@
+"""Pluggable inference backends for DepthAnything.
+
+    eager   - plain PyTorch, any input shape, any precision mode
+    trace   - TorchScript trace per input shape, frozen and saved to disk
+    compile - torch.compile per input shape (inductor keeps its own cache)
+    onnx    - ONNX graph per input size run by onnxruntime on CPU
+
+Exported artifacts are cached in `cache_dir` under
+"<tag>_<batch>x<height>x<width>.pt" / "<tag>_<height>x<width>.onnx", where the
+tag (see cache_tag) names everything that changes the graph: encoder,
+precision and head fusion. Delete the files after changing weights.
+
+Running a cached ONNX artifact only needs numpy and onnxruntime: torch is
+imported lazily, when a model has to be traced or exported.
+"""
+import os
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+BACKENDS = ("eager", "trace", "compile", "onnx")
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+    "depth_anything",
+)
+
+
+def cache_tag(encoder, precision="fp32", fuse_head=False):
+    """Artifact name prefix for a model configuration, e.g. 'vits_fp32_fused'.
+
+    Args:
+        encoder (str): 'vits', 'vitb' or 'vitl'
+        precision (str, optional): precision mode. Defaults to 'fp32'.
+        fuse_head (bool, optional): the DPT head is a FusedDPTHead. A graph
+            traced from one head must never be loaded for the other.
+
+    Returns:
+        str: tag for make_backend
+    """
+    return f"{encoder}_{precision}" + ("_fused" if fuse_head else "")
+
+
+class EagerBackend(object):
+    """Run the model as is."""
+
+    name = "eager"
+
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self, batch):
+        import torch
+
+        with torch.no_grad():
+            return self.model(batch)
+
+
+class _ShapeCachedBackend(ABC):
+    """Builds (or loads from disk) one executable per input shape.
+
+    Subclasses define the cache key of an input shape and how to build the
+    executable for a key.
+    """
+
+    def __init__(self, model, tag, cache_dir=None):
+        self.model = model
+        self.tag = tag
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self._executables = {}
+
+    @abstractmethod
+    def _key(self, shape):
+        """Cache key of a (N, 3, H, W) input shape."""
+
+    @abstractmethod
+    def _build(self, key, batch):
+        """Executable for `key`; `batch` is an example input of that shape."""
+
+    def executable(self, batch):
+        key = self._key(tuple(batch.shape))
+        executable = self._executables.get(key)
+        if executable is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            executable = self._build(key, batch)
+            self._executables[key] = executable
+        return executable
+
+
+class TracedBackend(_ShapeCachedBackend):
+    """TorchScript trace of the model for a fixed (N, 3, H, W) input.
+
+    The traced graph has no Python dispatch through DPTHead / FeatureFusionBlock
+    / ResidualConvUnit; it is frozen (weights folded in as constants) and saved
+    so the next start only has to torch.jit.load it.
+    """
+
+    name = "trace"
+
+    def _key(self, shape):
+        return shape
+
+    def path(self, shape):
+        n, _, h, w = shape
+        return os.path.join(self.cache_dir, f"{self.tag}_{n}x{h}x{w}.pt")
+
+    def _build(self, shape, batch):
+        import torch
+
+        path = self.path(shape)
+        if os.path.exists(path):
+            return torch.jit.load(path, map_location=batch.device)
+
+        with torch.no_grad():
+            traced = torch.jit.trace(self.model, batch, check_trace=False)
+            traced = torch.jit.freeze(traced.eval())
+        torch.jit.save(traced, path)
+        return traced
+
+    def __call__(self, batch):
+        import torch
+
+        with torch.no_grad():
+            return self.executable(batch)(batch)
+
+
+class CompiledBackend(_ShapeCachedBackend):
+    """torch.compile with static shapes; recompiles once per new input shape."""
+
+    name = "compile"
+
+    def __init__(self, model, tag, cache_dir=None):
+        super().__init__(model, tag, cache_dir)
+        import torch
+
+        self._compiled = torch.compile(model, dynamic=False)
+
+    def _key(self, shape):
+        return shape
+
+    def _build(self, shape, batch):
+        return self._compiled
+
+    def __call__(self, batch):
+        import torch
+
+        with torch.no_grad():
+            return self.executable(batch)(batch)
+
+
+class OnnxBackend(_ShapeCachedBackend):
+    """ONNX export per (H, W), batch axis dynamic, run with onnxruntime.
+
+    Takes and returns numpy arrays; torch tensors are accepted and converted.
+    `model` may be None when all needed artifacts are already cached.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model, tag, cache_dir=None, opset=17, threads=None):
+        super().__init__(model, tag, cache_dir)
+        self.opset = opset
+        self.threads = threads
+
+    def _key(self, shape):
+        return shape[2:]
+
+    def path(self, size):
+        h, w = size
+        return os.path.join(self.cache_dir, f"{self.tag}_{h}x{w}.onnx")
+
+    def _export(self, path, batch):
+        import torch
+
+        if self.model is None:
+            raise FileNotFoundError(f"{path} is not cached and no model was given to export it")
+
+        tmp = path + ".tmp"
+        with torch.no_grad():
+            torch.onnx.export(
+                self.model,
+                (torch.as_tensor(batch).float().cpu(),),
+                tmp,
+                input_names=["image"],
+                output_names=["depth"],
+                dynamic_axes={"image": {0: "batch"}, "depth": {0: "batch"}},
+                opset_version=self.opset,
+                dynamo=False,
+            )
+        os.replace(tmp, path)
+
+    def _build(self, size, batch):
+        import onnxruntime as ort
+
+        path = self.path(size)
+        if not os.path.exists(path):
+            self._export(path, batch)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+        return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def __call__(self, batch):
+        is_numpy = isinstance(batch, np.ndarray)
+        inputs = batch if is_numpy else batch.detach().cpu().numpy()
+        depth = self.executable(inputs).run(None, {"image": np.ascontiguousarray(inputs, dtype=np.float32)})[0]
+        if is_numpy:
+            return depth
+
+        import torch
+
+        return torch.from_numpy(depth)
+
+
+def make_backend(name, model, tag, cache_dir=None):
+    """Create an inference backend by name (see BACKENDS)."""
+    if name == "eager":
+        return EagerBackend(model)
+    if name == "trace":
+        return TracedBackend(model, tag, cache_dir)
+    if name == "compile":
+        return CompiledBackend(model, tag, cache_dir)
+    if name == "onnx":
+        return OnnxBackend(model, tag, cache_dir)
+    raise ValueError(f"backend {name} not implemented")
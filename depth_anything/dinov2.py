@@ -0,0 +1,167 @@
+"""Local DINOv2 ViT backbone, so building DPT_DINOv2 needs no torch.hub checkout.
+
+Only what Depth Anything uses is implemented: the plain ViT-S/B/L with patch
+size 14, LayerScale, MLP FFN and no register tokens. Module and parameter
+names follow facebookresearch/dinov2, so the Depth Anything checkpoints load
+into it unchanged (`pretrained.blocks.0.attn.qkv.weight`, ...), and the
+positional embedding is interpolated exactly as upstream.
+"""
+import math
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+DINOV2_CONFIGS = {
+    "vits": {"embed_dim": 384, "depth": 12, "num_heads": 6},
+    "vitb": {"embed_dim": 768, "depth": 12, "num_heads": 12},
+    "vitl": {"embed_dim": 1024, "depth": 24, "num_heads": 16},
+}
+
+
+class PatchEmbed(nn.Module):
+    def __init__(self, patch_size=14, in_chans=3, embed_dim=768):
+        super().__init__()
+        self.patch_size = (patch_size, patch_size)
+        self.proj = nn.Conv2d(in_chans, embed_dim, kernel_size=patch_size, stride=patch_size)
+        self.norm = nn.Identity()
+
+    def forward(self, x):
+        x = self.proj(x)  # B C H W
+        x = x.flatten(2).transpose(1, 2)  # B HW C
+        return self.norm(x)
+
+
+class Attention(nn.Module):
+    def __init__(self, dim, num_heads=8, qkv_bias=True):
+        super().__init__()
+        self.num_heads = num_heads
+        self.qkv = nn.Linear(dim, dim * 3, bias=qkv_bias)
+        self.proj = nn.Linear(dim, dim)
+
+    def forward(self, x):
+        B, N, C = x.shape
+        qkv = self.qkv(x).reshape(B, N, 3, self.num_heads, C // self.num_heads).permute(2, 0, 3, 1, 4)
+        x = F.scaled_dot_product_attention(qkv[0], qkv[1], qkv[2])
+        x = x.transpose(1, 2).reshape(B, N, C)
+        return self.proj(x)
+
+
+class Mlp(nn.Module):
+    def __init__(self, in_features, hidden_features):
+        super().__init__()
+        self.fc1 = nn.Linear(in_features, hidden_features)
+        self.act = nn.GELU()
+        self.fc2 = nn.Linear(hidden_features, in_features)
+
+    def forward(self, x):
+        return self.fc2(self.act(self.fc1(x)))
+
+
+class LayerScale(nn.Module):
+    def __init__(self, dim, init_values=1.0):
+        super().__init__()
+        self.gamma = nn.Parameter(init_values * torch.ones(dim))
+
+    def forward(self, x):
+        return x * self.gamma
+
+
+class Block(nn.Module):
+    def __init__(self, dim, num_heads, mlp_ratio=4.0):
+        super().__init__()
+        self.norm1 = nn.LayerNorm(dim, eps=1e-6)
+        self.attn = Attention(dim, num_heads)
+        self.ls1 = LayerScale(dim)
+        self.norm2 = nn.LayerNorm(dim, eps=1e-6)
+        self.mlp = Mlp(dim, int(dim * mlp_ratio))
+        self.ls2 = LayerScale(dim)
+
+    def forward(self, x):
+        x = x + self.ls1(self.attn(self.norm1(x)))
+        x = x + self.ls2(self.mlp(self.norm2(x)))
+        return x
+
+
+class DinoVisionTransformer(nn.Module):
+    def __init__(self, img_size=518, patch_size=14, embed_dim=768, depth=12, num_heads=12, mlp_ratio=4.0,
+                 interpolate_offset=0.1):
+        super().__init__()
+        self.embed_dim = embed_dim
+        self.patch_size = patch_size
+        self.interpolate_offset = interpolate_offset
+
+        self.patch_embed = PatchEmbed(patch_size, 3, embed_dim)
+        num_patches = (img_size // patch_size) ** 2
+
+        self.cls_token = nn.Parameter(torch.zeros(1, 1, embed_dim))
+        self.pos_embed = nn.Parameter(torch.zeros(1, num_patches + 1, embed_dim))
+        # Unused at inference, kept so the checkpoints load with strict=True
+        self.mask_token = nn.Parameter(torch.zeros(1, embed_dim))
+
+        self.blocks = nn.ModuleList([Block(embed_dim, num_heads, mlp_ratio) for _ in range(depth)])
+        self.norm = nn.LayerNorm(embed_dim, eps=1e-6)
+
+    def interpolate_pos_encoding(self, x, h, w):
+        previous_dtype = x.dtype
+        npatch = x.shape[1] - 1
+        N = self.pos_embed.shape[1] - 1
+        if npatch == N and w == h:
+            return self.pos_embed
+        pos_embed = self.pos_embed.float()
+        class_pos_embed = pos_embed[:, 0]
+        patch_pos_embed = pos_embed[:, 1:]
+        dim = x.shape[-1]
+        # Same small offset as upstream to avoid floating point error in the interpolation
+        h0 = h // self.patch_size + self.interpolate_offset
+        w0 = w // self.patch_size + self.interpolate_offset
+
+        sqrt_N = math.sqrt(N)
+        # Under torch.jit.trace / torch.onnx.export h and w are tensors: the scale
+        # has to be Python floats, as in upstream DINOv2
+        patch_pos_embed = F.interpolate(
+            patch_pos_embed.reshape(1, int(sqrt_N), int(sqrt_N), dim).permute(0, 3, 1, 2),
+            scale_factor=(float(h0) / sqrt_N, float(w0) / sqrt_N),
+            mode="bicubic",
+        )
+        patch_pos_embed = patch_pos_embed.permute(0, 2, 3, 1).reshape(1, -1, dim)
+        return torch.cat((class_pos_embed.unsqueeze(0), patch_pos_embed), dim=1).to(previous_dtype)
+
+    def prepare_tokens(self, x):
+        h, w = x.shape[-2:]
+        x = self.patch_embed(x)
+        x = torch.cat((self.cls_token.expand(x.shape[0], -1, -1), x), dim=1)
+        return x + self.interpolate_pos_encoding(x, h, w)
+
+    def get_intermediate_layers(self, x, n=1, return_class_token=False):
+        """Normalized outputs of the last `n` blocks (or of the block indices in `n`).
+
+        Returns:
+            tuple: per block the patch tokens (B, HW, C), or (patch tokens,
+                class token) pairs if return_class_token
+        """
+        x = self.prepare_tokens(x)
+        take = range(len(self.blocks) - n, len(self.blocks)) if isinstance(n, int) else n
+
+        outputs = []
+        for i, block in enumerate(self.blocks):
+            x = block(x)
+            if i in take:
+                outputs.append(self.norm(x))
+
+        class_tokens = [out[:, 0] for out in outputs]
+        outputs = [out[:, 1:] for out in outputs]
+        if return_class_token:
+            return tuple(zip(outputs, class_tokens))
+        return tuple(outputs)
+
+    def forward(self, x):
+        x = self.prepare_tokens(x)
+        for block in self.blocks:
+            x = block(x)
+        return self.norm(x)[:, 0]
+
+
+def dinov2(encoder):
+    """DINOv2 backbone for 'vits', 'vitb' or 'vitl' (randomly initialized)."""
+    return DinoVisionTransformer(img_size=518, patch_size=14, **DINOV2_CONFIGS[encoder])
@@ -5,6 +5,7 @@ import torch.nn.functional as F
 from huggingface_hub import PyTorchModelHubMixin, hf_hub_download
 
 from depth_anything.blocks import FeatureFusionBlock, _make_scratch
+from depth_anything.dinov2 import dinov2
 
 
 def _make_fusion_block(features, use_bn, size = None):
@@ -142,9 +143,9 @@ class DPT_DINOv2(nn.Module):
         
         assert encoder in ['vits', 'vitb', 'vitl']
         
-        # in case the Internet connection is not stable, please load the DINOv2 locally
+        # the local DINOv2 (depth_anything/dinov2.py) needs neither a torch.hub checkout nor the Internet
         if localhub:
-            self.pretrained = torch.hub.load('torchhub/facebookresearch_dinov2_main', 'dinov2_{:}14'.format(encoder), source='local', pretrained=False)
+            self.pretrained = dinov2(encoder)
         else:
             self.pretrained = torch.hub.load('facebookresearch/dinov2', 'dinov2_{:}14'.format(encoder))
         
@@ -152,19 +153,29 @@ class DPT_DINOv2(nn.Module):
         
         self.depth_head = DPTHead(1, dim, features, use_bn, out_channels=out_channels, use_clstoken=use_clstoken)
         
-    def forward(self, x):
-        h, w = x.shape[-2:]
-        
-        features = self.pretrained.get_intermediate_layers(x, 4, return_class_token=True)
-        
+    def encode(self, x):
+        """DINOv2 encoder only: (patch tokens, class token) of its last 4 blocks."""
+        return self.pretrained.get_intermediate_layers(x, 4, return_class_token=True)
+
+    def decode(self, features, h, w):
+        """DPT head only: encoder features of an (h, w) input -> depth (N, h, w)."""
         patch_h, patch_w = h // 14, w // 14
 
         depth = self.depth_head(features, patch_h, patch_w)
-        depth = F.interpolate(depth, size=(h, w), mode="bilinear", align_corners=True)
+        # the head already outputs (patch_h * 14, patch_w * 14), which is (h, w) for the usual inputs
+        if depth.shape[-2:] != (h, w):
+            depth = F.interpolate(depth, size=(h, w), mode="bilinear", align_corners=True)
         depth = F.relu(depth)
 
         return depth.squeeze(1)
 
+    def forward(self, x):
+        h, w = x.shape[-2:]
+        
+        features = self.encode(x)
+        
+        return self.decode(features, h, w)
+
 
 class DepthAnything(DPT_DINOv2, PyTorchModelHubMixin):
     def __init__(self, config):
@@ -0,0 +1,129 @@
+"""Bounded LRU cache of DINOv2 encoder features, keyed by frame id.
+
+The encoder is most of the cost of DPT_DINOv2. Keeping its features per
+frame lets the DPT head (or other heads: segmentation, detection) run on them
+without recomputing, and lets the encoder run at a lower rate than the heads.
+"""
+from collections import OrderedDict
+
+
+class EncoderFeatures(object):
+    """Encoder output for one frame.
+
+    Args:
+        layers (tuple): per block a (patch tokens (1, HW, C), class token (1, C)) pair
+        image_size (tuple): (h, w) of the network input the features came from
+    """
+
+    __slots__ = ("layers", "image_size")
+
+    def __init__(self, layers, image_size):
+        self.layers = layers
+        self.image_size = tuple(image_size)
+
+    @property
+    def nbytes(self):
+        return sum(t.numel() * t.element_size() for layer in self.layers for t in layer)
+
+
+def split_batch(layers, image_size):
+    """Batched encoder output -> one EncoderFeatures per frame.
+
+    Frames of a batch are copied out, so a cached frame does not keep the
+    whole batch alive and its nbytes is what it really holds.
+    """
+    n = layers[0][0].shape[0]
+    if n == 1:
+        return [EncoderFeatures(tuple(layers), image_size)]
+    return [
+        EncoderFeatures(tuple((tokens[i:i + 1].clone(), cls[i:i + 1].clone()) for tokens, cls in layers), image_size)
+        for i in range(n)
+    ]
+
+
+def merge_batch(features):
+    """EncoderFeatures of same-size frames -> batched encoder output for the head."""
+    sizes = {f.image_size for f in features}
+    if len(sizes) != 1:
+        raise ValueError(f"features of different input sizes can not be batched: {sorted(sizes)}")
+
+    import torch
+
+    return tuple(
+        (torch.cat([f.layers[i][0] for f in features]), torch.cat([f.layers[i][1] for f in features]))
+        for i in range(len(features[0].layers))
+    )
+
+
+class FeatureCache(object):
+    """LRU cache frame id -> EncoderFeatures, bounded by entries and/or bytes.
+
+    Args:
+        max_entries (int, optional): keep at most this many frames. Defaults to 8.
+        max_bytes (int, optional): keep at most this many bytes of features.
+            Defaults to no byte limit.
+    """
+
+    def __init__(self, max_entries=8, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        features = self._entries.get(key)
+        if features is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return features
+
+    def put(self, key, features):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.nbytes
+        self._entries[key] = features
+        self._bytes += features.nbytes
+        self._evict()
+
+    def _evict(self):
+        # The entry just added is never evicted, even if it alone exceeds max_bytes
+        while len(self._entries) > 1 and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries)
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            _, features = self._entries.popitem(last=False)
+            self._bytes -= features.nbytes
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def memory(self):
+        """Bytes held per cached frame id, least recently used first."""
+        return OrderedDict((key, features.nbytes) for key, features in self._entries.items())
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "bytes_per_entry": self._bytes / len(self._entries) if self._entries else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,246 @@
+"""Inference-only DPT head with the linear ops of DPTHead folded together.
+
+FusedDPTHead.from_head(head) takes a trained DPTHead and gives the same
+depth (up to float rounding) with less work:
+
+    - a ConvTranspose2d with stride == kernel (the 4x / 2x reassemble
+      upsamplers) becomes a 1x1 conv + pixel_shuffle, which is cheaper on CPU;
+    - a 1x1 projection is folded into the conv that follows it, but only
+      where that saves FLOPs: folding multiplies the cost of the next conv by
+      in/out channels of the projection. With zero padding the projection
+      bias only reaches the conv inside the image, so the folded bias is a
+      map, computed once per input shape;
+    - FeatureFusionBlock.out_conv (1x1) runs before the bilinear upsample
+      instead of after it, on 4x fewer pixels: both are linear and bilinear
+      weights sum to 1, so they commute;
+    - ReLUs after convs run in place, residual adds are plain in-place adds
+      (no FloatFunctional), nn.Identity is dropped, and interpolation sizes
+      are computed once per patch grid.
+"""
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+
+def _pixel_shuffle_conv(deconv):
+    """ConvTranspose2d(kernel == stride, no padding) -> equivalent 1x1 Conv2d before pixel_shuffle."""
+    k = deconv.kernel_size[0]
+    assert deconv.kernel_size == (k, k) and deconv.stride == (k, k) and deconv.padding == (0, 0)
+    assert deconv.groups == 1
+    in_channels, out_channels = deconv.in_channels, deconv.out_channels
+
+    conv = nn.Conv2d(in_channels, out_channels * k * k, kernel_size=1)
+    with torch.no_grad():
+        # (in, out, ky, kx) -> (out * k * k, in, 1, 1), the channel order pixel_shuffle expects
+        conv.weight.copy_(deconv.weight.permute(1, 2, 3, 0).reshape(-1, in_channels, 1, 1))
+        if deconv.bias is not None:
+            conv.bias.copy_(deconv.bias.repeat_interleave(k * k))
+        else:
+            conv.bias.zero_()
+    return conv, k
+
+
+def _conv_cost(conv):
+    """Multiply-adds per input pixel."""
+    kh, kw = conv.kernel_size
+    sh, sw = conv.stride
+    return conv.in_channels * conv.out_channels * kh * kw / (sh * sw * conv.groups)
+
+
+def folding_saves_flops(project, conv):
+    """Whether project (1x1) + conv is cheaper as one conv with project folded in."""
+    kh, kw = conv.kernel_size
+    sh, sw = conv.stride
+    folded = project.in_channels * conv.out_channels * kh * kw / (sh * sw)
+    return folded < _conv_cost(project) + _conv_cost(conv)
+
+
+class FoldedConv(nn.Module):
+    """conv(project(x)) as a single conv; project is a 1x1 Conv2d."""
+
+    def __init__(self, project, conv):
+        super().__init__()
+        assert project.kernel_size == (1, 1) and project.stride == (1, 1) and project.groups == 1
+        assert conv.groups == 1 and conv.dilation == (1, 1) and conv.padding_mode == "zeros"
+
+        self.stride = conv.stride
+        self.padding = conv.padding
+        with torch.no_grad():
+            p = project.weight[:, :, 0, 0]  # (mid, in)
+            weight = torch.einsum("omyx,mi->oiyx", conv.weight, p)
+            p_bias = project.bias if project.bias is not None else torch.zeros(p.shape[0])
+            # Contribution of the projection bias per kernel tap: (out, 1, kh, kw)
+            bias_kernel = torch.einsum("omyx,m->oyx", conv.weight, p_bias).unsqueeze(1)
+            bias = conv.bias.clone() if conv.bias is not None else torch.zeros(conv.out_channels)
+
+        self.weight = nn.Parameter(weight)
+        self.bias_kernel = nn.Parameter(bias_kernel)
+        self.bias = nn.Parameter(bias)
+        self._bias_maps = {}
+
+    def bias_map(self, h, w, device, dtype):
+        key = (h, w, device, dtype)
+        bias = self._bias_maps.get(key)
+        if bias is None:
+            with torch.no_grad():
+                # Conv of the constant bias image == conv of ones with the per-tap bias kernel,
+                # zero padding included; depthwise over the output channels
+                ones = torch.ones(1, self.bias_kernel.shape[0], h, w, device=device, dtype=dtype)
+                bias = F.conv2d(ones, self.bias_kernel.to(device, dtype), self.bias.to(device, dtype),
+                                self.stride, self.padding, groups=self.bias_kernel.shape[0])
+            self._bias_maps[key] = bias
+        return bias
+
+    def forward(self, x):
+        out = F.conv2d(x, self.weight, None, self.stride, self.padding)
+        return out.add_(self.bias_map(x.shape[-2], x.shape[-1], x.device, out.dtype))
+
+
+class PixelShuffleConv(nn.Module):
+    def __init__(self, conv, upscale):
+        super().__init__()
+        self.conv = conv
+        self.upscale = upscale
+
+    def forward(self, x):
+        return F.pixel_shuffle(self.conv(x), self.upscale)
+
+
+def _fused_branch(project, resize, layer_rn):
+    """layer_rn(resize(project(x))) with Identity dropped and foldable 1x1s folded."""
+    ops = [project]
+    if isinstance(resize, nn.ConvTranspose2d):
+        conv, upscale = _pixel_shuffle_conv(resize)
+        # pixel_shuffle only reorders channels into space, so the 1x1 before it may still fold
+        if folding_saves_flops(project, conv):
+            ops = [PixelShuffleConv(FoldedConv(project, conv), upscale)]
+        else:
+            ops.append(PixelShuffleConv(conv, upscale))
+    elif isinstance(resize, nn.Conv2d):
+        ops.append(resize)
+    else:
+        assert isinstance(resize, nn.Identity)
+
+    last = ops[-1]
+    if last is project and folding_saves_flops(project, layer_rn):
+        ops[-1] = FoldedConv(project, layer_rn)
+    elif isinstance(last, nn.Conv2d) and last is not project and folding_saves_flops(project, last):
+        ops = [FoldedConv(project, last), layer_rn]
+    else:
+        ops.append(layer_rn)
+    return nn.Sequential(*ops)
+
+
+class FusedResidualConvUnit(nn.Module):
+    def __init__(self, unit):
+        super().__init__()
+        if unit.bn:
+            raise ValueError("ResidualConvUnit with batch norm is not supported")
+        self.conv1 = unit.conv1
+        self.conv2 = unit.conv2
+
+    def forward(self, x):
+        out = self.conv1(F.relu(x))
+        out = self.conv2(F.relu_(out))
+        return out.add_(x)
+
+
+class FusedFusionBlock(nn.Module):
+    def __init__(self, block):
+        super().__init__()
+        self.resConfUnit1 = FusedResidualConvUnit(block.resConfUnit1)
+        self.resConfUnit2 = FusedResidualConvUnit(block.resConfUnit2)
+        self.out_conv = block.out_conv
+        self.align_corners = block.align_corners
+
+    def forward(self, x, skip=None, size=None):
+        if skip is not None:
+            x = x + self.resConfUnit1(skip)
+        x = self.resConfUnit2(x)
+        # out_conv (1x1) commutes with the bilinear upsample, run it on the small map
+        x = self.out_conv(x)
+        if tuple(x.shape[-2:]) != tuple(size):
+            x = F.interpolate(x, size=size, mode="bilinear", align_corners=self.align_corners)
+        return x
+
+
+class FusedDPTHead(nn.Module):
+    """Drop-in replacement for a trained DPTHead (depth, nclass == 1) at inference."""
+
+    def __init__(self, head):
+        super().__init__()
+        if head.nclass != 1:
+            raise ValueError("only the depth head (nclass == 1) can be fused")
+
+        self.use_clstoken = head.use_clstoken
+        if self.use_clstoken:
+            self.readout_projects = head.readout_projects
+
+        scratch = head.scratch
+        layers_rn = [scratch.layer1_rn, scratch.layer2_rn, scratch.layer3_rn, scratch.layer4_rn]
+        self.branches = nn.ModuleList([
+            _fused_branch(project, resize, layer_rn)
+            for project, resize, layer_rn in zip(head.projects, head.resize_layers, layers_rn)
+        ])
+        self.refinenets = nn.ModuleList([
+            FusedFusionBlock(block)
+            for block in (scratch.refinenet1, scratch.refinenet2, scratch.refinenet3, scratch.refinenet4)
+        ])
+
+        self.output_conv1 = scratch.output_conv1
+        conv2 = scratch.output_conv2
+        self.output_conv2a, self.output_conv2b = conv2[0], conv2[2]
+        self._sizes = {}
+
+    @classmethod
+    def from_head(cls, head):
+        return cls(head).eval()
+
+    def sizes(self, patch_h, patch_w):
+        """Spatial sizes of layer_1..layer_4 and of the output for a patch grid."""
+        key = (patch_h, patch_w)
+        sizes = self._sizes.get(key)
+        if sizes is None:
+            layer_4 = ((patch_h - 1) // 2 + 1, (patch_w - 1) // 2 + 1)  # 3x3 conv, stride 2, pad 1
+            sizes = self._sizes[key] = {
+                "layer_1": (patch_h * 4, patch_w * 4),
+                "layer_2": (patch_h * 2, patch_w * 2),
+                "layer_3": (patch_h, patch_w),
+                "layer_4": layer_4,
+                "path_1": (patch_h * 8, patch_w * 8),
+                "out": (patch_h * 14, patch_w * 14),
+            }
+        return sizes
+
+    def forward(self, out_features, patch_h, patch_w):
+        sizes = self.sizes(patch_h, patch_w)
+
+        layers = []
+        for i, x in enumerate(out_features):
+            if self.use_clstoken:
+                x, cls_token = x[0], x[1]
+                readout = cls_token.unsqueeze(1).expand_as(x)
+                x = self.readout_projects[i](torch.cat((x, readout), -1))
+            else:
+                x = x[0]
+            x = x.permute(0, 2, 1).reshape((x.shape[0], x.shape[-1], patch_h, patch_w))
+            layers.append(self.branches[i](x))
+
+        layer_1, layer_2, layer_3, layer_4 = layers
+        refinenet1, refinenet2, refinenet3, refinenet4 = self.refinenets
+
+        path_4 = refinenet4(layer_4, size=sizes["layer_3"])
+        path_3 = refinenet3(path_4, layer_3, size=sizes["layer_2"])
+        path_2 = refinenet2(path_3, layer_2, size=sizes["layer_1"])
+        path_1 = refinenet1(path_2, layer_1, size=sizes["path_1"])
+
+        out = self.output_conv1(path_1)
+        out = F.interpolate(out, sizes["out"], mode="bilinear", align_corners=True)
+        out = F.relu_(self.output_conv2a(out))
+        return F.relu_(self.output_conv2b(out))
+
+
+def fuse_depth_head(model):
+    """Replace model.depth_head (DPT_DINOv2) with its FusedDPTHead, in place."""
+    model.depth_head = FusedDPTHead.from_head(model.depth_head)
+    return model
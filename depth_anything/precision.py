@@ -0,0 +1,183 @@
+import contextlib
+import copy
+import io
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import torch
+import torch.nn as nn
+
+PRECISION_MODES = ("fp32", "bf16", "int8")
+
+
+class Conv1x1AsLinear(nn.Module):
+    """1x1 convolution expressed as a Linear over the channel dimension.
+
+    Numerically the same as the wrapped conv, but dynamic quantization only
+    handles nn.Linear, so this lets the DPTHead projections go to int8 too.
+    """
+
+    def __init__(self, in_channels, out_channels, bias=True):
+        super().__init__()
+        self.linear = nn.Linear(in_channels, out_channels, bias=bias)
+
+    @classmethod
+    def from_conv(cls, conv):
+        assert conv.kernel_size == (1, 1) and conv.stride == (1, 1) and conv.groups == 1
+        module = cls(conv.in_channels, conv.out_channels, bias=conv.bias is not None)
+        with torch.no_grad():
+            module.linear.weight.copy_(conv.weight.flatten(1))
+            if conv.bias is not None:
+                module.linear.bias.copy_(conv.bias)
+        return module
+
+    def forward(self, x):
+        return self.linear(x.permute(0, 2, 3, 1)).permute(0, 3, 1, 2)
+
+
+def _is_pointwise(conv):
+    return (isinstance(conv, nn.Conv2d) and conv.kernel_size == (1, 1) and conv.stride == (1, 1)
+            and conv.padding == (0, 0) and conv.groups == 1)
+
+
+def _linearize_pointwise(module):
+    """Replace every 1x1 Conv2d below `module` with a Conv1x1AsLinear, in place."""
+    for name, child in module.named_children():
+        if _is_pointwise(child):
+            setattr(module, name, Conv1x1AsLinear.from_conv(child))
+        else:
+            _linearize_pointwise(child)
+
+
+def quantize_dynamic_int8(model):
+    """Dynamic int8 copy of a DPT_DINOv2.
+
+    Every nn.Linear of the DINOv2 encoder (qkv, proj, fc1, fc2) and the 1x1
+    convs of the head reassemble branches (rewritten as Linear, see
+    Conv1x1AsLinear) get int8 weights; activations are quantized on the fly.
+    For a DPTHead these are the projections; for a FusedDPTHead the
+    projections that were not folded and the 1x1 convs of the pixel-shuffle
+    upsamplers. The 3x3 convs (FoldedConv included) and the residual adds
+    stay in float.
+
+    Args:
+        model (DPT_DINOv2): float model, left untouched
+
+    Returns:
+        nn.Module: quantized copy (CPU only)
+    """
+    model = copy.deepcopy(model).cpu().eval()
+
+    head = model.depth_head
+    # DPTHead: projects; FusedDPTHead: branches (project / pixel-shuffle 1x1 / FoldedConv / layer_rn)
+    branches = getattr(head, "branches", None)
+    _linearize_pointwise(branches if branches is not None else head.projects)
+
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+class PrecisionModel(nn.Module):
+    """Runs a depth model in the selected precision and returns float32 depth.
+
+    Modes:
+        "fp32": the model as is.
+        "bf16": bfloat16 autocast (matmuls and convs in bf16, reductions in fp32).
+        "int8": dynamic int8 quantization of the Linear layers (CPU only).
+    """
+
+    def __init__(self, model, mode="fp32"):
+        super().__init__()
+        if mode not in PRECISION_MODES:
+            raise ValueError(f"precision {mode} not implemented")
+
+        self.mode = mode
+        self.model = quantize_dynamic_int8(model) if mode == "int8" else model
+
+    def autocast(self, device_type):
+        if self.mode == "bf16":
+            return torch.autocast(device_type=device_type, dtype=torch.bfloat16)
+        return contextlib.nullcontext()
+
+    def forward(self, x):
+        with self.autocast(x.device.type):
+            depth = self.model(x)
+        return depth.float()
+
+    def encode(self, x):
+        with self.autocast(x.device.type):
+            return self.model.encode(x)
+
+    def decode(self, features, h, w):
+        with self.autocast(features[0][0].device.type):
+            depth = self.model.decode(features, h, w)
+        return depth.float()
+
+
+def model_size_bytes(model):
+    """Serialized state_dict size, counts packed int8 weights correctly."""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.getbuffer().nbytes
+
+
+def _peak_rss_kb():
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _normalized(depth):
+    # Depth Anything predicts relative depth, compare after per-frame max normalization
+    return depth / depth.flatten(1).amax(dim=1).clamp_min(1e-6)[:, None, None]
+
+
+def compare_precision(model, inputs, modes=PRECISION_MODES, repeat=3):
+    """Accuracy vs fp32, latency and memory of each precision mode.
+
+    Args:
+        model (nn.Module): float DPT_DINOv2 on CPU
+        inputs (list): preprocessed (1, 3, H, W) float32 tensors (sample frames)
+        modes (tuple, optional): modes to check. Defaults to all.
+        repeat (int, optional): timed passes per input. Defaults to 3.
+
+    Returns:
+        list: one dict per mode with mean/max abs error of normalized depth
+            against fp32, median latency (ms), model size (MB) and the growth
+            of the process peak RSS while building and running the mode (MB)
+    """
+    with torch.no_grad():
+        reference = [_normalized(model(x).float()) for x in inputs]
+
+    report = []
+    for mode in modes:
+        rss_before = _peak_rss_kb()
+        wrapped = PrecisionModel(model, mode).eval()
+
+        outputs, timings = [], []
+        with torch.no_grad():
+            for x in inputs:
+                wrapped(x)  # warm-up
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    depth = wrapped(x)
+                    timings.append(time.perf_counter() - start)
+                outputs.append(_normalized(depth))
+        rss_after = _peak_rss_kb()
+
+        errors = torch.cat([(out - ref).abs().flatten() for out, ref in zip(outputs, reference)])
+        timings.sort()
+        report.append({
+            "mode": mode,
+            "mean_abs_error": errors.mean().item(),
+            "max_abs_error": errors.max().item(),
+            "latency_ms": timings[len(timings) // 2] * 1000.0,
+            "model_mb": model_size_bytes(wrapped.model) / 2 ** 20,
+            "peak_rss_growth_mb": None if rss_before is None else (rss_after - rss_before) / 1024.0,
+        })
+
+    return report
@@ -0,0 +1,120 @@
+from collections import OrderedDict
+
+import numpy as np
+import cv2
+import torch
+
+
+def make_rgb_colormap(colormap=cv2.COLORMAP_INFERNO):
+    """Build a 256-entry lookup table for an OpenCV colormap, in RGB order.
+
+    Args:
+        colormap (int): OpenCV colormap id
+
+    Returns:
+        np.ndarray: (256, 1, 3) uint8 table usable as cv2.applyColorMap(userColor=...)
+    """
+    lut_bgr = cv2.applyColorMap(np.arange(256, dtype=np.uint8).reshape(256, 1), colormap)
+    return np.ascontiguousarray(lut_bgr[:, :, ::-1])
+
+
+class DepthColorizer(object):
+    """Turn a network-resolution depth map into a full-resolution RGB image.
+
+    The depth is normalized and quantized to uint8 while it is still at
+    network resolution (on the model's device), so only a small uint8 map is
+    copied to the host. Upsampling is then done on uint8 and the colormap is
+    applied through an RGB lookup table, which removes the full-resolution
+    float passes and the final BGR->RGB conversion.
+
+    Outputs are written into a small ring of reusable buffers per (key, size):
+    a returned image stays valid until `num_buffers` more images with the same
+    key and size have been produced. Nothing tracks who still reads a buffer,
+    so a consumer on another thread (e.g. a display queue) must copy the image
+    before handing it over, or pass `out` to colorize into a buffer it owns;
+    CameraWidget copies into its own FrameRing, released by FramePresenter
+    once the image has been scaled for display.
+    """
+
+    def __init__(self, colormap=cv2.COLORMAP_INFERNO, num_buffers=3, max_sizes=8):
+        """Init.
+
+        Args:
+            colormap (int, optional): OpenCV colormap id. Defaults to cv2.COLORMAP_INFERNO.
+            num_buffers (int, optional): output buffers rotated per key and size. Defaults to 3.
+            max_sizes (int, optional): (key, size) entries kept (LRU). Defaults to 8.
+        """
+        self.__lut = make_rgb_colormap(colormap)
+        self.__num_buffers = num_buffers
+        self.__max_sizes = max_sizes
+
+        # (key, h, w) -> [gray buffer, [rgb buffers], next index]
+        self.__buffers = OrderedDict()
+
+    def reset(self):
+        self.__buffers.clear()
+
+    def _get_buffers(self, key, height, width):
+        cache_key = (key, height, width)
+        entry = self.__buffers.get(cache_key)
+        if entry is not None:
+            self.__buffers.move_to_end(cache_key)
+        else:
+            entry = [
+                np.empty((height, width), dtype=np.uint8),
+                [np.empty((height, width, 3), dtype=np.uint8) for _ in range(self.__num_buffers)],
+                0,
+            ]
+            self.__buffers[cache_key] = entry
+            if len(self.__buffers) > self.__max_sizes:
+                self.__buffers.popitem(last=False)
+
+        gray, outputs, index = entry
+        entry[2] = (index + 1) % len(outputs)
+        return gray, outputs[index]
+
+    @staticmethod
+    def quantize(depth):
+        """Normalize depth(s) to [0, 255] by their max and cast to uint8.
+
+        Args:
+            depth (torch.Tensor): (H, W) or (N, H, W) non-negative depth
+
+        Returns:
+            np.ndarray: uint8 array of the same shape, on the host
+        """
+        single = depth.dim() == 2
+        if single:
+            depth = depth[None]
+
+        max_val = depth.amax(dim=(1, 2), keepdim=True)
+        scale = torch.where(max_val > 0, 255.0 / max_val, torch.zeros_like(max_val))
+        depth_uint8 = (depth * scale).clamp_(0, 255).to(torch.uint8).cpu().numpy()
+
+        return depth_uint8[0] if single else depth_uint8
+
+    def colorize(self, depth_uint8, size, key=None, out=None):
+        """Upsample a quantized depth map and apply the colormap.
+
+        Args:
+            depth_uint8 (np.ndarray): (H', W') uint8 depth at network resolution
+            size (tuple): output (height, width)
+            key (hashable, optional): output buffer ring to use, e.g. a camera id
+            out (np.ndarray, optional): (height, width, 3) uint8 array to write
+                into instead of the buffer ring
+
+        Returns:
+            np.ndarray: (height, width, 3) uint8 RGB image (a reused buffer unless out is given)
+        """
+        height, width = size
+        gray, ring_out = self._get_buffers(key, height, width)
+        if out is None:
+            out = ring_out
+
+        cv2.resize(depth_uint8, (width, height), dst=gray, interpolation=cv2.INTER_LINEAR)
+        cv2.applyColorMap(gray, self.__lut, dst=out)
+
+        return out
+
+    def __call__(self, depth, size, key=None, out=None):
+        return self.colorize(self.quantize(depth), size, key, out)
@@ -1,12 +1,7 @@
-import random
-from PIL import Image, ImageOps, ImageFilter
-import torch
-from torchvision import transforms
-import torch.nn.functional as F
-
 import numpy as np
 import cv2
 import math
+from collections import OrderedDict
 
 
 def apply_min_size(sample, size, image_interpolation_method=cv2.INTER_AREA):
@@ -64,6 +59,7 @@ class Resize(object):
         ensure_multiple_of=1,
         resize_method="lower_bound",
         image_interpolation_method=cv2.INTER_AREA,
+        cache_size=16,
     ):
         """Init.
 
@@ -87,6 +83,9 @@ class Resize(object):
                 "upper_bound": Output will be at max as large as the given size. (Output size might be smaller than given size.)
                 "minimal": Scale as least as possible.  (Output size might be smaller than given size.)
                 Defaults to "lower_bound".
+            cache_size (int, optional):
+                Number of input resolutions whose output size is memoized (LRU).
+                0 disables the cache. Defaults to 16.
         """
         self.__width = width
         self.__height = height
@@ -97,18 +96,44 @@ class Resize(object):
         self.__resize_method = resize_method
         self.__image_interpolation_method = image_interpolation_method
 
+        # (width, height) -> (new_width, new_height); a camera stream almost
+        # never changes resolution, so this is computed once per stream
+        self.__cache_size = cache_size
+        self.__size_cache = OrderedDict()
+
     def constrain_to_multiple_of(self, x, min_val=0, max_val=None):
-        y = (np.round(x / self.__multiple_of) * self.__multiple_of).astype(int)
+        # round() rounds half to even, same as np.round
+        y = int(round(x / self.__multiple_of)) * self.__multiple_of
 
         if max_val is not None and y > max_val:
-            y = (np.floor(x / self.__multiple_of) * self.__multiple_of).astype(int)
+            y = math.floor(x / self.__multiple_of) * self.__multiple_of
 
         if y < min_val:
-            y = (np.ceil(x / self.__multiple_of) * self.__multiple_of).astype(int)
+            y = math.ceil(x / self.__multiple_of) * self.__multiple_of
 
         return y
 
+    def clear_cache(self):
+        """Forget memoized output sizes (e.g. after switching the camera)."""
+        self.__size_cache.clear()
+
     def get_size(self, width, height):
+        key = (width, height)
+        size = self.__size_cache.get(key)
+        if size is not None:
+            self.__size_cache.move_to_end(key)
+            return size
+
+        size = self._compute_size(width, height)
+
+        if self.__cache_size > 0:
+            self.__size_cache[key] = size
+            if len(self.__size_cache) > self.__cache_size:
+                self.__size_cache.popitem(last=False)
+
+        return size
+
+    def _compute_size(self, width, height):
         # determine new height and width
         scale_height = self.__height / height
         scale_width = self.__width / width
@@ -194,6 +219,9 @@ class Resize(object):
                 # sample["semseg_mask"] = cv2.resize(
                 #     sample["semseg_mask"], (width, height), interpolation=cv2.INTER_NEAREST
                 # )
+                import torch
+                import torch.nn.functional as F
+
                 sample["semseg_mask"] = F.interpolate(torch.from_numpy(sample["semseg_mask"]).float()[None, None, ...], (height, width), mode='nearest').numpy()[0, 0]
                 
             if "mask" in sample:
@@ -208,6 +236,37 @@ class Resize(object):
         return sample
 
 
+class PatchBudgetResize(Resize):
+    """Resize sample so that the ViT sees at most a given number of patches.
+
+    Keeps the aspect ratio; both sides are multiples of the patch size.
+    Attention cost grows with the square of the patch count, so this bounds
+    the encoder cost independently of the camera aspect ratio.
+    """
+
+    def __init__(self, max_patches, patch_size=14, **kwargs):
+        """Init.
+
+        Args:
+            max_patches (int): upper bound for (height / patch_size) * (width / patch_size)
+            patch_size (int, optional): ViT patch size. Defaults to 14.
+            **kwargs: passed to Resize (resize_target, image_interpolation_method, cache_size)
+        """
+        side = int(math.sqrt(max_patches)) * patch_size
+        super().__init__(side, side, keep_aspect_ratio=True, ensure_multiple_of=patch_size, **kwargs)
+        self.__max_patches = max_patches
+        self.__patch_size = patch_size
+
+    def _compute_size(self, width, height):
+        p = self.__patch_size
+        scale = math.sqrt(self.__max_patches / ((width / p) * (height / p)))
+
+        new_width = max(p, math.floor(width * scale / p) * p)
+        new_height = max(p, math.floor(height * scale / p) * p)
+
+        return (new_width, new_height)
+
+
 class NormalizeImage(object):
     """Normlize image by given mean and std.
     """
@@ -246,3 +305,127 @@ class PrepareForNet(object):
             sample["semseg_mask"] = np.ascontiguousarray(sample["semseg_mask"])
 
         return sample
+
+
+class FusedPreprocess(object):
+    """Single-pass replacement for Resize -> NormalizeImage -> PrepareForNet.
+
+    Takes the raw uint8 BGR camera frame and writes the normalized CHW float32
+    network input. The image is resized first (while it is still uint8, or as
+    float32), so no full-resolution float64 copies are made, and normalization
+    plus the BGR->RGB swap and HWC->CHW transpose happen in one ufunc pass into
+    buffers that are reused across frames of the same size.
+
+    Compared with the reference chain on the same frame (normalized units):
+        resize_dtype="float32": max abs difference < 1e-3 (float rounding only).
+        resize_dtype="uint8": the resized image is quantized to 1/255, which
+            gives ~0.01 max / ~0.005 mean on camera images. Bicubic overshoot is
+            clipped to [0, 255] instead of leaving [0, 1], so pixel-level
+            black/white patterns can differ by up to ~2 at isolated pixels.
+    """
+
+    def __init__(
+        self,
+        resize,
+        mean,
+        std,
+        resize_dtype="uint8",
+        image_interpolation_method=cv2.INTER_CUBIC,
+        max_buffers=4,
+    ):
+        """Init.
+
+        Args:
+            resize (Resize): used for its (memoized) target size computation only
+            mean (list): per-channel RGB mean of the normalization
+            std (list): per-channel RGB std of the normalization
+            resize_dtype (str, optional):
+                "uint8": resize the raw frame, fastest.
+                "float32": convert to float32 first, matches the reference closely.
+                Defaults to "uint8".
+            image_interpolation_method (int, optional):
+                OpenCV interpolation flag. Defaults to cv2.INTER_CUBIC.
+            max_buffers (int, optional):
+                Number of input resolutions to keep buffers for (LRU).
+                Defaults to 4.
+        """
+        if resize_dtype not in ("uint8", "float32"):
+            raise ValueError(f"resize_dtype {resize_dtype} not implemented")
+
+        self.__resize = resize
+        self.__resize_dtype = resize_dtype
+        self.__image_interpolation_method = image_interpolation_method
+
+        mean = np.asarray(mean, dtype=np.float32)
+        std = np.asarray(std, dtype=np.float32)
+        # (x / 255 - mean) / std == x * scale + bias, channels in RGB order
+        self.__scale = (1.0 / (255.0 * std)).reshape(3, 1, 1)
+        self.__bias = (-mean / std).reshape(3, 1, 1)
+
+        # (height, width) -> reusable buffers, bounded like the Resize size cache
+        self.__buffers = OrderedDict()
+        self.__max_buffers = max_buffers
+
+    def get_size(self, width, height):
+        return self.__resize.get_size(width, height)
+
+    def reset(self):
+        """Drop cached sizes and buffers (e.g. after switching the camera)."""
+        self.__resize.clear_cache()
+        self.__buffers.clear()
+
+    def _get_buffers(self, height, width, new_height, new_width):
+        key = (height, width)
+        buffers = self.__buffers.get(key)
+        if buffers is not None:
+            self.__buffers.move_to_end(key)
+        else:
+            src = None
+            if self.__resize_dtype == "float32":
+                src = np.empty((height, width, 3), dtype=np.float32)
+            resized = np.empty(
+                (new_height, new_width, 3),
+                dtype=np.uint8 if self.__resize_dtype == "uint8" else np.float32,
+            )
+            out = np.empty((3, new_height, new_width), dtype=np.float32)
+            buffers = (src, resized, out)
+            self.__buffers[key] = buffers
+            if len(self.__buffers) > self.__max_buffers:
+                self.__buffers.popitem(last=False)
+        return buffers
+
+    def __call__(self, image, out=None):
+        """Preprocess one frame.
+
+        Args:
+            image (np.ndarray): uint8 BGR frame, (H, W, 3)
+            out (np.ndarray, optional): (3, H', W') float32 array to write into,
+                e.g. a slice of a batch. Defaults to an internal buffer that is
+                overwritten by the next call with the same input size.
+
+        Returns:
+            np.ndarray: normalized RGB input, (3, H', W') float32
+        """
+        height, width = image.shape[:2]
+        new_width, new_height = self.get_size(width, height)
+
+        src, resized, buf = self._get_buffers(height, width, new_height, new_width)
+        if out is None:
+            out = buf
+
+        if src is not None:
+            np.copyto(src, image, casting="unsafe")
+            image = src
+
+        cv2.resize(
+            image,
+            (new_width, new_height),
+            dst=resized,
+            interpolation=self.__image_interpolation_method,
+        )
+
+        # BGR -> RGB and HWC -> CHW as a strided view, then scale + shift in place
+        np.multiply(resized.transpose(2, 0, 1)[::-1], self.__scale, out=out)
+        np.add(out, self.__bias, out=out)
+
+        return out
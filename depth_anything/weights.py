@@ -0,0 +1,129 @@
+"""Offline, cached construction of pretrained Depth Anything models.
+
+`DepthAnything.from_pretrained` builds the network with random init and then
+copies the checkpoint over it. This module instead:
+
+    1. builds DPT_DINOv2 (with the local DINOv2, no torch.hub) on the meta
+       device, so no memory is allocated or initialized for the weights;
+    2. memory-maps a torch-format copy of the checkpoint kept in `cache_dir`
+       and assigns its tensors to the model, pages are read on first use.
+
+The cached copy is made once from the Hugging Face checkpoint (safetensors
+or pytorch_model.bin), which is looked up in the local HF cache first and
+only downloaded when it is not there. The safetensors file is only tried
+when the `safetensors` package is installed.
+"""
+import importlib.util
+import os
+import time
+
+import torch
+
+from depth_anything.backends import DEFAULT_CACHE_DIR
+from depth_anything.dpt import DPT_DINOv2
+
+# Same as config.json of the LiheYoung/depth_anything_*14 checkpoints
+MODEL_CONFIGS = {
+    "vits": {"encoder": "vits", "features": 64, "out_channels": [48, 96, 192, 384]},
+    "vitb": {"encoder": "vitb", "features": 128, "out_channels": [96, 192, 384, 768]},
+    "vitl": {"encoder": "vitl", "features": 256, "out_channels": [256, 512, 1024, 1024]},
+}
+
+HF_REPO = "LiheYoung/depth_anything_{}14"
+HF_WEIGHT_FILES = ("model.safetensors", "pytorch_model.bin")
+
+
+def cached_weights_path(encoder, cache_dir=None):
+    return os.path.join(cache_dir or DEFAULT_CACHE_DIR, f"depth_anything_{encoder}14.pt")
+
+
+def _weight_files():
+    """HF_WEIGHT_FILES that can be read here: safetensors is an optional dependency."""
+    if importlib.util.find_spec("safetensors") is None:
+        return tuple(name for name in HF_WEIGHT_FILES if not name.endswith(".safetensors"))
+    return HF_WEIGHT_FILES
+
+
+def _download_checkpoint(encoder, local_files_only=False):
+    from huggingface_hub import hf_hub_download
+
+    repo = HF_REPO.format(encoder)
+    # Local HF cache first: no network round trip when the files are there
+    attempts = (True,) if local_files_only else (True, False)
+    errors = []
+    for local_only in attempts:
+        for filename in _weight_files():
+            try:
+                return hf_hub_download(repo, filename, local_files_only=local_only)
+            except Exception as e:
+                errors.append(e)
+    raise FileNotFoundError(f"no checkpoint for {repo} found: {errors[-1]}")
+
+
+def _read_checkpoint(path):
+    if path.endswith(".safetensors"):
+        from safetensors.torch import load_file
+
+        return load_file(path)
+    return torch.load(path, map_location="cpu", weights_only=True)
+
+
+def load_state_dict(encoder, cache_dir=None, local_files_only=False):
+    """Memory-mapped state dict of the pretrained model.
+
+    Args:
+        encoder (str): 'vits', 'vitb' or 'vitl'
+        cache_dir (str, optional): where the torch-format copy is kept.
+            Defaults to DEFAULT_CACHE_DIR.
+        local_files_only (bool, optional): never go to the network.
+
+    Returns:
+        dict: name -> CPU tensor backed by the cached file
+    """
+    path = cached_weights_path(encoder, cache_dir)
+    if not os.path.exists(path):
+        state_dict = _read_checkpoint(_download_checkpoint(encoder, local_files_only))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        torch.save(state_dict, tmp)
+        os.replace(tmp, path)
+    return torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+
+
+def build_model(encoder, state_dict):
+    """DPT_DINOv2 with the given weights assigned (not copied) to it."""
+    with torch.device("meta"):
+        model = DPT_DINOv2(**MODEL_CONFIGS[encoder])
+    model.load_state_dict(state_dict, assign=True)
+    return model.eval()
+
+
+def load_depth_anything(encoder="vitl", device="cpu", cache_dir=None, local_files_only=False, timings=None):
+    """Pretrained Depth Anything from the local cache, without torch.hub.
+
+    Args:
+        encoder (str, optional): 'vits', 'vitb' or 'vitl'. Defaults to 'vitl'.
+        device (str, optional): target device. Defaults to 'cpu'.
+        cache_dir (str, optional): see load_state_dict.
+        local_files_only (bool, optional): see load_state_dict.
+        timings (dict, optional): filled with the seconds spent in
+            'weights', 'build' and 'to_device'.
+
+    Returns:
+        DPT_DINOv2: model in eval mode on `device`
+    """
+    if timings is None:
+        timings = {}
+
+    start = time.perf_counter()
+    state_dict = load_state_dict(encoder, cache_dir, local_files_only)
+    timings["weights"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model = build_model(encoder, state_dict)
+    timings["build"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model = model.to(device)
+    timings["to_device"] = time.perf_counter() - start
+    return model
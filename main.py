@@ -1,3 +1,4 @@
+import argparse
 import sys
 
 from PySide6.QtWidgets import QApplication
@@ -6,7 +7,14 @@ from MainWindow import MainWindow
 if __name__ == "__main__":
     app = QApplication(sys.argv)
 
-    window = MainWindow()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--metrics-jsonl", default=None,
+                        help="дописывать сюда замеры стадий конвейера (JSON lines, раз в 5 с)")
+    parser.add_argument("--stereo-calibration", default=None,
+                        help="калибровка пары камер (.npz или .yml) — включает стерео-режимы глубины")
+    args, _ = parser.parse_known_args(app.arguments()[1:])
+
+    window = MainWindow(metrics_jsonl=args.metrics_jsonl, stereo_calibration=args.stereo_calibration)
     available_geometry = window.screen().availableGeometry()
     window.resize(available_geometry.width() / 1.2, available_geometry.height() / 1.2)
     window.show()
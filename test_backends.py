@@ -0,0 +1,45 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from depth_anything.backends import _ShapeCachedBackend, cache_tag, make_backend  # noqa: E402
+
+# Не 518x518: позиционные эмбеддинги интерполируются (9x13 патчей)
+NON_SQUARE = (1, 3, 126, 182)
+
+
+@pytest.fixture
+def batch():
+    torch.manual_seed(1)
+    return torch.randn(*NON_SQUARE)
+
+
+def test_trace_non_square_matches_eager(vits_model, batch, tmp_path):
+    with torch.no_grad():
+        expected = vits_model(batch)
+    backend = make_backend("trace", vits_model, "vits_fp32", str(tmp_path))
+    depth = backend(batch)
+    assert depth.shape == expected.shape
+    torch.testing.assert_close(depth, expected, atol=1e-5, rtol=1e-4)
+    assert (tmp_path / "vits_fp32_1x126x182.pt").exists()
+
+
+def test_onnx_non_square_matches_eager(vits_model, batch, tmp_path):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    with torch.no_grad():
+        expected = vits_model(batch)
+    backend = make_backend("onnx", vits_model, "vits_fp32", str(tmp_path))
+    depth = backend(batch.numpy())
+    assert depth.shape == tuple(expected.shape)
+    torch.testing.assert_close(torch.from_numpy(depth), expected, atol=1e-4, rtol=1e-3)
+
+
+def test_cache_tag_separates_head_fusion():
+    assert cache_tag("vits", "fp32", fuse_head=False) != cache_tag("vits", "fp32", fuse_head=True)
+    assert cache_tag("vits", "int8", fuse_head=True) != cache_tag("vits", "fp32", fuse_head=True)
+
+
+def test_shape_cached_backend_is_abstract():
+    with pytest.raises(TypeError):
+        _ShapeCachedBackend(None, "tag")
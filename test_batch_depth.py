@@ -0,0 +1,104 @@
+import argparse
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from BatchDepth import process_source  # noqa: E402
+
+
+class _Transform:
+    """Кадр как есть, (C, H, W) float32."""
+
+    def get_size(self, w, h):
+        return w, h
+
+    def __call__(self, frame, out):
+        out[...] = frame.transpose(2, 0, 1)
+        return out
+
+
+class _FakeEstimator:
+    """depth — первый канал кадра: по значению видно, какой кадр источника записан."""
+
+    def make_transform(self):
+        return _Transform()
+
+    def forward(self, batch):
+        return batch[:, 0]
+
+
+def _write_images(folder, values):
+    for value in values:
+        cv2.imwrite(os.path.join(folder, f"{value:04d}.png"), np.full((4, 6, 3), value, np.uint8))
+
+
+def _run(folder, output, fmt):
+    args = argparse.Namespace(output=str(output), format=fmt, chunk_size=1, batch_size=2)
+    with ThreadPoolExecutor(2) as pool:
+        return process_source(_FakeEstimator(), str(folder), args, pool, threading.local())
+
+
+def _values(output, fmt):
+    if fmt == "npy":
+        return [int(depth[0, 0]) for depth in np.load(output / "frames.npy")]
+    folder = output / "frames"
+    chunks = sorted(name for name in os.listdir(folder) if name.endswith(".npy"))
+    return [int(depth[0, 0]) for name in chunks for depth in np.load(folder / name)]
+
+
+def test_chunks_resume_after_unreadable_image(tmp_path):
+    frames = tmp_path / "frames"
+    frames.mkdir()
+    _write_images(frames, [10, 30, 40])
+    (frames / "0020.png").write_bytes(b"broken")
+
+    assert _run(frames, tmp_path / "out", "chunks") == 3
+    # Запись продолжилась: продолжаем с кадра источника 4, а не с 3 (записанных depth)
+    _write_images(frames, [50, 60])
+    assert _run(frames, tmp_path / "out", "chunks") == 2
+    assert _values(tmp_path / "out", "chunks") == [10, 30, 40, 50, 60]
+
+
+def test_npy_resume_uses_source_position(tmp_path):
+    frames = tmp_path / "frames"
+    frames.mkdir()
+    _write_images(frames, [10, 30, 40, 50])
+    (frames / "0020.png").write_bytes(b"broken")
+    out = tmp_path / "out"
+    out.mkdir()
+
+    assert _run(frames, out, "npy") == 4
+    # Все картинки источника прочитаны, хотя записано меньше, чем их в папке
+    assert _run(frames, out, "npy") == 0
+    assert _values(out, "npy") == [10, 30, 40, 50, 0]
+
+
+@pytest.mark.parametrize("fmt", ["npy", "chunks"])
+def test_mixed_image_sizes_are_fitted_to_first_frame(tmp_path, fmt):
+    frames = tmp_path / "frames"
+    frames.mkdir()
+    _write_images(frames, [10, 20])
+    for value in (30, 40):
+        cv2.imwrite(str(frames / f"{value:04d}.png"), np.full((8, 4, 3), value, np.uint8))
+    _write_images(frames, [50])
+    out = tmp_path / "out"
+    out.mkdir()
+
+    args = argparse.Namespace(output=str(out), format=fmt, chunk_size=4, batch_size=2)
+    with ThreadPoolExecutor(2) as pool:
+        assert process_source(_FakeEstimator(), str(frames), args, pool, threading.local()) == 5
+
+    if fmt == "npy":
+        depths = list(np.load(out / "frames.npy"))
+    else:
+        depths = [depth for name in sorted(os.listdir(out / "frames")) if name.endswith(".npy")
+                  for depth in np.load(out / "frames" / name)]
+    assert [depth.shape for depth in depths] == [(4, 6)] * 5
+    assert [float(depth.min()) for depth in depths] == [float(depth.max()) for depth in depths]
+    assert _values(out, fmt) == [10, 20, 30, 40, 50]
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QApplication
+
+from Camera import CameraWidget
+from Reimage import ImageProcessor
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def widget(app):
+    widget = CameraWidget(ImageProcessor(), camera_index="unused.mp4")
+    shown = []
+    # Presenter живёт в displayThread (здесь не запущен): _present() зовём сами, в этом потоке
+    widget.processedPresenter.imageReady.connect(lambda image: shown.append(image[1].copy()), Qt.DirectConnection)
+    widget.shown = shown
+    yield widget
+    widget.displayThread.quit()
+    widget.displayThread.wait()
+
+
+def test_processed_frame_is_copied_before_presenter_reads_it(widget):
+    presenter = widget.processedPresenter
+    colored = np.full((6, 8, 3), 10, np.uint8)     # буфер кольца DepthColorizer
+    widget.updateProcessedFrame(colored)
+    # Обработчик обогнал показ: тот же буфер раскраски уже с новым кадром
+    colored[...] = 99
+    presenter._present()
+    assert len(widget.shown) == 1 and (widget.shown[0] == 10).all()
+
+    # Слот отпущен сразу после масштабирования; на экране — буфер presenter'а
+    assert widget.processedRing.in_use() == 0
+    presenter.imageShown()
+    widget.updateProcessedFrame(colored)
+    presenter._present()
+    assert (widget.shown[-1] == 99).all()
+
+
+def test_processed_ring_follows_frame_size(widget):
+    widget.updateProcessedFrame(np.zeros((6, 8, 3), np.uint8))
+    first = widget.processedRing
+    widget.updateProcessedFrame(np.zeros((12, 16, 3), np.uint8))
+    assert widget.processedRing is not first and widget.processedRing.shape == (12, 16, 3)
+    # Вытесненный в ящике presenter'а кадр старого размера отпущен
+    assert first.in_use() == 0
@@ -0,0 +1,111 @@
+import time
+
+import numpy as np
+import pytest
+
+import Camera
+from Camera import CaptureWorker
+from DepthRecording import DepthRecorder, DepthRecording, ReplayCapture
+
+
+def _frames(count, h=24, w=32):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (h, w, 3), dtype=np.uint8) for _ in range(count)]
+
+
+@pytest.fixture
+def recording(tmp_path):
+    """Запись на 2 источника по 5 кадров, чанки по 4 кадра, depth у чётных кадров."""
+    path = str(tmp_path / "drive.depthrec")
+    frames = _frames(10)
+    with DepthRecorder(path, chunk_frames=4) as rec:
+        for i, frame in enumerate(frames):
+            depth = np.full((6, 8), i, np.float32) if i % 2 == 0 else None
+            rec.write(frame, depth, timestamp=100.0 + i * 0.01, source=i % 2)
+    return path, frames
+
+
+@pytest.mark.parametrize("compression", ["zlib", "none"])
+def test_round_trip(tmp_path, compression):
+    path = str(tmp_path / "r.depthrec")
+    frames = _frames(5)
+    with DepthRecorder(path, chunk_frames=2, compression=compression) as rec:
+        for i, frame in enumerate(frames):
+            rec.write(frame, np.full((3, 4), i / 7, np.float32), timestamp=float(i), source=0)
+
+    with DepthRecording(path) as recording:
+        assert len(recording) == 5
+        for i, frame in enumerate(frames):
+            item = recording[i]
+            np.testing.assert_array_equal(item.frame, frame)
+            assert item.depth.dtype == np.float16
+            np.testing.assert_allclose(item.depth, np.float16(i / 7))
+            assert item.timestamp == float(i)
+
+
+def test_sources_and_seek(recording):
+    path, frames = recording
+    with DepthRecording(path) as rec:
+        assert rec.sources == [0, 1]
+        np.testing.assert_array_equal(rec.frame_indices(1), [1, 3, 5, 7, 9])
+        assert rec.depth(3) is None
+        assert rec.seek(100.035, source=0) == 4
+        assert rec.seek(200.0) is None
+
+
+def test_replay_reads_one_source_then_ends(recording):
+    path, frames = recording
+    cap = ReplayCapture(path, source=1, realtime=False)
+    out = np.empty_like(frames[0])
+    for i in (1, 3, 5, 7, 9):
+        ok, frame = cap.read(image=out)
+        assert ok and frame is out
+        np.testing.assert_array_equal(frame, frames[i])
+    assert cap.read() == (False, None)
+    cap.release()
+
+
+def test_capture_worker_stops_at_end_of_recording(recording):
+    path, frames = recording
+    worker = CaptureWorker(f"{path}#0")
+    captured, ended = [], []
+    worker.rawFrameCaptured.connect(lambda handle: captured.append(handle.array.copy()))
+    worker.captureEnded.connect(ended.append)
+
+    start = time.perf_counter()
+    worker.startCapture()   # в этом же потоке: должен вернуться сам, а не крутиться на конце записи
+    assert time.perf_counter() - start < 5
+    assert len(captured) == 5
+    np.testing.assert_array_equal(captured[-1], frames[8])
+    assert len(ended) == 1
+
+
+class _DeadCamera:
+    """Камера, которая открылась, но кадров не отдаёт (отключили)."""
+
+    def __init__(self):
+        self.reads = 0
+
+    def isOpened(self):
+        return True
+
+    def read(self, image=None):
+        self.reads += 1
+        return False, None
+
+    def release(self):
+        pass
+
+
+def test_capture_worker_backs_off_and_gives_up_on_dead_camera(monkeypatch):
+    camera = _DeadCamera()
+    monkeypatch.setattr(Camera, "open_capture", lambda index: camera)
+    worker = CaptureWorker(0)
+    worker.max_failures = 4
+    worker.max_backoff = 0.02
+    ended = []
+    worker.captureEnded.connect(ended.append)
+
+    worker.startCapture()
+    assert camera.reads == 4
+    assert len(ended) == 1
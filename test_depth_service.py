@@ -0,0 +1,99 @@
+import threading
+import time
+import types
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+import DepthService as service_module  # noqa: E402
+from depth_anything.util.postprocess import DepthColorizer  # noqa: E402
+
+
+class FakeEstimator:
+    """Вместо DepthEstimator: первый infer() падает, дальше depth из единиц."""
+
+    def __init__(self, *args, **kwargs):
+        self.colorizer = DepthColorizer()
+        self.temporal = None
+        self.calls = 0
+
+    def set_temporal_reuse(self, *args):
+        pass
+
+    def set_metrics(self, metrics):
+        pass
+
+    def infer(self, frames, keys=None):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError("backend error")
+        return [torch.ones(4, 4) for _ in frames]
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(service_module, "DepthEstimator", FakeEstimator)
+    service = service_module.DepthService(["a", "b"])
+    # Вместо asyncio-цикла: результаты просто собираем
+    published = []
+    service._loop = types.SimpleNamespace(call_soon_threadsafe=lambda callback, results: published.extend(results))
+    service.published = published
+    return service
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_inference_error_is_reported_and_loop_continues(service):
+    service._is_running = True
+    thread = threading.Thread(target=service._inference_loop)
+    thread.start()
+    try:
+        frame = np.zeros((8, 8, 3), np.uint8)
+        service.mailboxes[0].put(frame)
+        service.mailboxes[1].put(frame)
+        assert _wait_for(lambda: service.inference_errors == 1)
+
+        status = service.status()
+        assert status["inference"] == "running" and status["inference_errors"] == 1
+        assert status["last_error"]["sources"] == [0, 1]
+        assert status["last_error"]["error"] == "RuntimeError: backend error"
+
+        service.mailboxes[1].put(frame)
+        assert _wait_for(lambda: len(service.published) == 1)
+        assert service.published[0].source_id == 1
+    finally:
+        service._is_running = False
+        with service._cond:
+            service._cond.notify_all()
+        thread.join(timeout=5)
+    assert not thread.is_alive()
+
+
+def test_pool_without_workers_marks_inference_failed(service):
+    class DeadPool:
+        def can_submit(self):
+            return False
+
+        def busy(self):
+            return 0
+
+        def results(self, timeout=0.0):
+            raise RuntimeError("InferencePool: no worker could load the model: weights missing")
+
+        def stats(self):
+            return {}
+
+    service.pool = DeadPool()
+    service._is_running = True
+    service._pool_loop()        # возвращается сам, а не крутится
+
+    status = service.status()
+    assert status["inference"] == "failed"
+    assert "weights missing" in status["last_error"]["error"]
@@ -0,0 +1,79 @@
+import cv2
+import numpy as np
+import pytest
+
+from FilterGraph import Blur, ColorMap, ConvertColor, Crop, FilterGraph, Resize
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    return cv2.GaussianBlur(rng.integers(0, 256, (120, 160, 3), dtype=np.uint8), (0, 0), 2.0)
+
+
+# Цепочки, где компиляция не меняет результат ни на бит
+EXACT = {
+    "camerasCheck": [Resize(scale=0.5), Blur(10), Resize(size="input"), ConvertColor(cv2.COLOR_BGR2RGB)],
+    "crop_resize_rgb": [Crop(10, 20, 100, 60), ConvertColor("BGR2RGB"), Resize(size=(50, 30))],
+    "swap_cancels": [ConvertColor("BGR2RGB"), Blur(1.5), ConvertColor("RGB2BGR")],
+    "colormap_rgb": [ConvertColor("BGR2GRAY"), ColorMap("INFERNO"), ConvertColor("BGR2RGB")],
+    "crop_last": [Resize(scale=0.5), Crop(5, 5, 40, 30)],
+}
+
+
+@pytest.mark.parametrize("name", list(EXACT))
+def test_compiled_matches_naive(frame, name):
+    graph = FilterGraph(EXACT[name])
+    expected = graph.naive(frame)
+    np.testing.assert_array_equal(graph(frame), expected)
+    # Повторный вызов — на тех же буферах, без перекомпиляции
+    np.testing.assert_array_equal(graph(frame), expected)
+
+
+def test_gray_moved_before_blur_is_close(frame):
+    graph = FilterGraph([Blur(3), ConvertColor(cv2.COLOR_BGR2GRAY)])
+    expected = graph.naive(frame)
+    out = graph(frame)
+    assert out.shape == expected.shape
+    assert np.abs(out.astype(int) - expected).max() <= 2
+
+
+def test_optimizations_show_in_plan(frame):
+    graph = FilterGraph(EXACT["camerasCheck"])
+    graph(frame)
+    # BGR2RGB — на уменьшенном кадре, последний resize сразу даёт RGB в выход
+    steps = [repr(step) for step, _ in graph.plan]
+    assert steps.index("convert BGR2RGB") < len(steps) - 1
+    assert steps[-1] == "resize 160x120"
+
+    graph = FilterGraph(EXACT["swap_cancels"])
+    graph(frame)
+    assert "BGR2RGB" not in graph.describe() and "RGB2BGR" not in graph.describe()
+
+
+def test_output_ring_keeps_previous_results(frame):
+    graph = FilterGraph([Resize(scale=0.5)], outputs=2)
+    first = graph(frame)
+    kept = first.copy()
+    second = graph(frame[::-1].copy())
+    assert second is not first
+    np.testing.assert_array_equal(first, kept)
+    assert graph(frame) is first
+
+
+def test_recompiles_on_new_size(frame):
+    graph = FilterGraph(EXACT["camerasCheck"])
+    graph(frame)
+    small = cv2.resize(frame, (80, 60))
+    np.testing.assert_array_equal(graph(small), graph.naive(small))
+
+
+def test_from_spec(frame):
+    graph = FilterGraph.from_spec([
+        {"op": "crop", "x": 0, "y": 0, "width": 64, "height": 48},
+        {"op": "convert", "code": "BGR2GRAY"},
+        {"op": "colormap", "colormap": "INFERNO"},
+    ])
+    out = graph(frame)
+    assert out.shape == (48, 64, 3)
+    np.testing.assert_array_equal(out, graph.naive(frame))
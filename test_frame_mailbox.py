@@ -0,0 +1,55 @@
+import threading
+
+import numpy as np
+
+from FrameMailbox import LatestFrameMailbox
+from SharedRing import FrameRing
+
+
+def test_latest_frame_wins():
+    mailbox = LatestFrameMailbox()
+    for i in range(3):
+        mailbox.put(i)
+    assert mailbox.poll() == 2
+    assert mailbox.poll() is None
+    assert mailbox.stats() == {"captured": 3, "dropped": 2, "taken": 1}
+
+
+def test_take_waits_for_frame_and_close_wakes_waiters():
+    mailbox = LatestFrameMailbox()
+    assert mailbox.take(timeout=0.01) is None
+    threading.Timer(0.05, mailbox.put, ("frame",)).start()
+    assert mailbox.take(timeout=5) == "frame"
+
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(mailbox.take()))
+    waiter.start()
+    mailbox.close()
+    waiter.join(5)
+    assert result == [None] and mailbox.closed
+    mailbox.reopen()
+    mailbox.put("next")
+    assert mailbox.take(timeout=0) == "next"
+
+
+def test_shared_condition_wakes_one_consumer_for_many_mailboxes():
+    first = LatestFrameMailbox()
+    second = LatestFrameMailbox(first.condition)
+    with first.condition:
+        threading.Timer(0.05, second.put, ("frame",)).start()
+        assert first.condition.wait_for(lambda: first.has_frame() or second.has_frame(), 5)
+    assert second.poll() == "frame"
+
+
+def test_displaced_and_cleared_handles_are_released():
+    ring = FrameRing(2, (4, 4, 3), np.uint8)
+    try:
+        mailbox = LatestFrameMailbox()
+        mailbox.put(ring.acquire())
+        mailbox.put(ring.acquire())          # первый вытеснен и отпущен
+        assert ring.acquire() is not None    # его слот снова свободен
+        mailbox.clear()
+        assert not mailbox.has_frame()
+        assert ring.acquire() is not None
+    finally:
+        ring.close()
@@ -0,0 +1,59 @@
+import copy
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from depth_anything.fused_head import FoldedConv, FusedDPTHead, fuse_depth_head  # noqa: E402
+from depth_anything.precision import PrecisionModel  # noqa: E402
+
+
+@pytest.fixture
+def batch():
+    torch.manual_seed(2)
+    return torch.randn(2, 3, 126, 182)
+
+
+@pytest.fixture
+def randomized(vits_model):
+    """Копия vits с ненулевыми весами головы: у нулевых bias свёртка проекции не видна."""
+    model = copy.deepcopy(vits_model)
+    torch.manual_seed(3)
+    with torch.no_grad():
+        for p in model.depth_head.parameters():
+            p.normal_(std=0.05)
+    return model
+
+
+def test_fused_head_matches_dpt_head(randomized, batch):
+    fused = fuse_depth_head(copy.deepcopy(randomized))
+    assert isinstance(fused.depth_head, FusedDPTHead)
+    assert any(isinstance(m, FoldedConv) for m in fused.depth_head.modules())
+    with torch.no_grad():
+        expected = randomized(batch)
+        depth = fused(batch)
+    torch.testing.assert_close(depth, expected, atol=1e-4, rtol=1e-3)
+
+
+def _quantized_linears(module):
+    return [m for m in module.modules() if isinstance(m, torch.ao.nn.quantized.dynamic.Linear)]
+
+
+@pytest.mark.parametrize("fuse", [False, True])
+def test_int8_quantizes_head(randomized, batch, fuse):
+    model = fuse_depth_head(copy.deepcopy(randomized)) if fuse else randomized
+    int8 = PrecisionModel(model, "int8").eval()
+
+    head = int8.model.depth_head
+    assert len(_quantized_linears(head)) >= 4
+    # 1x1 свёрток в ветвях головы не осталось — все ушли в int8
+    branches = head.branches if fuse else head.projects
+    assert not [m for m in branches.modules()
+                if isinstance(m, torch.nn.Conv2d) and m.kernel_size == (1, 1)]
+
+    with torch.no_grad():
+        expected = model(batch)
+        depth = int8(batch)
+    # Веса случайные и ошибка int8 на них велика; проверяем, что карта та же по форме
+    correlation = torch.corrcoef(torch.stack([depth.flatten(), expected.flatten()]))[0, 1]
+    assert correlation > 0.95
@@ -0,0 +1,101 @@
+import sys
+import threading
+import types
+from multiprocessing import Pipe
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from InferencePool import _worker_main  # noqa: E402
+from SharedRing import ShmSlots  # noqa: E402
+
+
+class _FakeEstimator:
+    """Вместо DepthEstimator: depth — первый канал кадра в float, размер как у кадра."""
+
+    def __init__(self, **kwargs):
+        pass
+
+    def infer(self, frames):
+        return [torch.from_numpy(frames[0][:, :, 0].astype(np.float32))]
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    monkeypatch.setitem(sys.modules, "DepthEstimator", types.SimpleNamespace(DepthEstimator=_FakeEstimator))
+    # Кадр 8x8x3 влезает, а его depth 8x8 float32 (256 байт) в слот depth на 128 байт — нет
+    frames = ShmSlots(2, 8 * 8 * 3)
+    depths = ShmSlots(2, 128)
+    parent, child = Pipe()
+    errors = []
+
+    def run():
+        try:
+            _worker_main(0, child, frames.spec(), depths.spec(), {}, threads=None)
+        except BaseException as e:  # noqa: B036 - BufferError из close() и т. п.
+            errors.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert parent.recv() == ("ready", 0)
+    yield parent, frames, depths, errors
+    thread.join(timeout=5)
+    for ring in (frames, depths):
+        ring.close()
+        ring.unlink()
+
+
+def test_worker_reports_oversized_depth_and_closes_cleanly(worker):
+    conn, frames, depths, errors = worker
+    frame = np.arange(8 * 8 * 3, dtype=np.uint8).reshape(8, 8, 3)
+
+    small = frame[:4, :4].copy()
+    frames.write(0, small)
+    conn.send((0, small.shape))
+    assert conn.recv() == (0, (4, 4), None)
+    np.testing.assert_array_equal(depths.view(0, (4, 4), np.float32), small[:, :, 0])
+
+    # Ошибка записи depth — последний запрос перед остановкой процесса
+    frames.write(1, frame)
+    conn.send((1, frame.shape))
+    slot, shape, error = conn.recv()
+    assert slot == 1 and shape is None and "не влезает" in error
+
+    conn.send(None)
+    conn.close()
+    assert not errors
+
+
+class _BrokenEstimator:
+    def __init__(self, **kwargs):
+        raise FileNotFoundError("weights missing")
+
+
+def test_pool_backs_off_and_gives_up_when_workers_cannot_start(monkeypatch):
+    import multiprocessing as mp
+
+    import InferencePool as pool_module
+
+    # fork: процессы пула видят подменённый DepthEstimator (spawn импортировал бы настоящий)
+    monkeypatch.setitem(sys.modules, "DepthEstimator", types.SimpleNamespace(DepthEstimator=_BrokenEstimator))
+    fork = mp.get_context("fork")
+    monkeypatch.setattr(pool_module.mp, "get_context", lambda method=None: fork)
+    pool = pool_module.InferencePool(num_workers=1, slots_per_worker=1, max_frame_shape=(8, 8, 3),
+                                     max_depth_pixels=64, threads_per_worker=1)
+    pool.max_startup_failures = 3
+    pool.max_backoff = 0.2
+    try:
+        polls = 0
+        with pytest.raises(RuntimeError, match="weights missing"):
+            while polls < 2000:
+                polls += 1
+                pool.results(timeout=0.01)
+        worker = pool.workers[0]
+        # Три запуска, а не по одному на каждый опрос results()
+        assert worker.gave_up and worker.restarts == 2 and polls > 10
+        assert pool.stats()["errors"] == ["FileNotFoundError: weights missing"]
+        assert not pool.can_submit()
+    finally:
+        pool.close()
@@ -0,0 +1,49 @@
+import pytest
+
+from InferenceResolution import RESOLUTION_PRESETS, AdaptiveResolution, parse_resolution
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("full", ("short_side", 518)),
+    (" Low ", ("short_side", 280)),
+    (500, ("short_side", 504)),
+    ("3", ("short_side", 14)),
+    ("patches:1000", ("patches", 1000)),
+    ("adaptive", ("adaptive", None)),
+])
+def test_parse_resolution(spec, expected):
+    assert parse_resolution(spec) == expected
+
+
+def test_parse_resolution_rejects_unknown():
+    with pytest.raises(ValueError):
+        parse_resolution("huge")
+
+
+def _settle(adaptive, latency, passes=50):
+    for _ in range(passes):
+        adaptive.update(latency)
+    return adaptive.short_side
+
+
+def test_adaptive_steps_down_over_budget_and_back_up():
+    adaptive = AdaptiveResolution(target_fps=10, cooldown=3)
+    assert adaptive.short_side == RESOLUTION_PRESETS["full"]
+    # Задержка растёт с квадратом стороны: у сети, которая на 518 идёт 0.2 с, бюджет 0.1 с
+    cost = lambda side: 0.2 * (side / 518) ** 2  # noqa: E731
+    for _ in range(100):
+        adaptive.update(cost(adaptive.short_side))
+    assert cost(adaptive.short_side) <= adaptive.budget
+    assert adaptive.short_side < RESOLUTION_PRESETS["full"]
+
+    assert _settle(adaptive, 0.001) == RESOLUTION_PRESETS["full"]
+
+
+def test_adaptive_waits_cooldown_between_steps():
+    adaptive = AdaptiveResolution(target_fps=10, cooldown=5)
+    sides = [adaptive.update(1.0) for _ in range(10)]
+    assert sides[:4] == [518] * 4
+    assert sides[4] == RESOLUTION_PRESETS["high"]
+    assert sides[5:9] == [RESOLUTION_PRESETS["high"]] * 4
+    assert sides[9] == RESOLUTION_PRESETS["medium"]
+    assert _settle(adaptive, 1.0) == min(RESOLUTION_PRESETS.values())
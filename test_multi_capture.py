@@ -0,0 +1,69 @@
+import time
+
+import numpy as np
+
+import MultiCapture
+from DepthRecording import DepthRecorder
+from MultiCapture import SyncCaptureWorker
+
+
+def _record(path, count):
+    frames = []
+    with DepthRecorder(path, chunk_frames=4) as rec:
+        for i in range(count):
+            for source in (0, 1):
+                frame = np.full((12, 16, 3), i * 2 + source, np.uint8)
+                rec.write(frame, timestamp=i * 0.02, source=source)
+                frames.append(frame)
+    return frames
+
+
+def test_sync_capture_pairs_frames_and_stops_at_end(tmp_path):
+    path = str(tmp_path / "pair.depthrec")
+    _record(path, 6)
+    worker = SyncCaptureWorker([f"{path}#0", f"{path}#1"], tolerance=0.05)
+    sets, ended = [], []
+    worker.frameSetCaptured.connect(
+        lambda frame_set: sets.append([int(frame.array[0, 0, 0]) for frame in frame_set.frames]))
+    worker.captureEnded.connect(ended.append)
+
+    start = time.perf_counter()
+    worker.startCapture()   # в этом же потоке: должен вернуться сам на конце записи
+    assert time.perf_counter() - start < 5
+    assert sets == [[i * 2, i * 2 + 1] for i in range(6)]
+    assert worker.stats()["sets"] == 6
+    assert worker.stats()["skew"]["count"] == 6
+    assert len(ended) == 1
+
+
+class _DeadCamera:
+    def __init__(self):
+        self.grabs = 0
+
+    def isOpened(self):
+        return True
+
+    def set(self, prop, value):
+        return True
+
+    def grab(self):
+        self.grabs += 1
+        return False
+
+    def release(self):
+        pass
+
+
+def test_sync_capture_backs_off_and_gives_up_on_dead_camera(monkeypatch):
+    cameras = []
+    monkeypatch.setattr(MultiCapture, "open_capture", lambda index: cameras.append(_DeadCamera()) or cameras[-1])
+    worker = SyncCaptureWorker([0, 1])
+    worker.max_failures = 4
+    worker.max_backoff = 0.02
+    ended = []
+    worker.captureEnded.connect(ended.append)
+
+    worker.startCapture()
+    assert cameras[0].grabs == 4
+    assert worker.stats()["failed"] == 4
+    assert len(ended) == 1
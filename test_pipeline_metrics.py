@@ -0,0 +1,86 @@
+import pytest
+
+from PipelineMetrics import LatencyHistogram, PipelineMetrics, format_overlay
+
+
+def test_histogram_percentiles_within_bucket_precision():
+    histogram = LatencyHistogram()
+    for ms in range(1, 101):
+        histogram.record(ms / 1000.0)
+    stats = histogram.stats()
+
+    assert stats["count"] == 100
+    assert stats["mean_ms"] == pytest.approx(50.5)
+    # Шкала логарифмическая с шагом 10%: перцентиль — середина бакета, ошибка до ~5%
+    assert stats["p50_ms"] == pytest.approx(50, rel=0.06)
+    assert stats["p95_ms"] == pytest.approx(95, rel=0.06)
+    assert stats["p99_ms"] == pytest.approx(99, rel=0.06)
+    assert stats["max_ms"] == pytest.approx(100, rel=0.06)
+
+
+def test_histogram_extremes_and_empty():
+    assert LatencyHistogram().stats() == {"count": 0}
+    histogram = LatencyHistogram()
+    histogram.record(0.0)
+    histogram.record(1000.0)   # за верхней границей шкалы — в последний бакет
+    stats = histogram.stats()
+    assert stats["count"] == 2
+    assert stats["p50_ms"] == pytest.approx(0.05)
+
+
+def test_snapshot_groups_by_source():
+    metrics = PipelineMetrics()
+    metrics.record("forward", 0.1)
+    metrics.record("capture", 0.02, source=0)
+    metrics.record("capture", 0.03, source=1)
+    with metrics.timer("postprocess", source=1):
+        pass
+
+    snapshot = metrics.snapshot()
+    assert set(snapshot) == {"all", "0", "1"}
+    assert snapshot["all"]["forward"]["count"] == 1
+    assert list(snapshot["1"]) == ["capture", "postprocess"]   # в порядке STAGES
+
+
+def test_pool_stage_is_reported_in_order():
+    metrics = PipelineMetrics()
+    metrics.record("end_to_end", 0.3, source=0)
+    metrics.record("pool", 0.2, source=0)
+    metrics.record("capture", 0.01, source=0)
+    assert list(metrics.snapshot()["0"]) == ["capture", "pool", "end_to_end"]
+    assert format_overlay(metrics.snapshot()["0"]).splitlines()[1].startswith("pool")
+
+
+def test_window_counts_only_new_samples():
+    metrics = PipelineMetrics()
+    metrics.record("display", 0.01, source=0)
+    window = metrics.window()
+    assert window.snapshot()["0"]["display"]["count"] == 0
+
+    for _ in range(3):
+        metrics.record("display", 0.01, source=0)
+    stats = window.snapshot()["0"]["display"]
+    assert stats["count"] == 3
+    assert stats["fps"] > 0
+    assert metrics.snapshot()["0"]["display"]["count"] == 4
+
+
+def test_disabled_records_nothing():
+    metrics = PipelineMetrics(enabled=False)
+    metrics.record("forward", 0.1)
+    assert metrics.snapshot() == {}
+
+
+def test_prometheus_and_overlay():
+    metrics = PipelineMetrics()
+    metrics.record("end_to_end", 0.2, source=0)
+    text = metrics.to_prometheus()
+    assert 'depth_stage_latency_seconds_count{stage="end_to_end",source="0"} 1' in text
+    assert 'quantile="0.95"' in text
+
+    overlay = format_overlay(metrics.window().snapshot().get("0", {}))
+    assert overlay == ""
+    metrics_window = metrics.window()
+    metrics.record("end_to_end", 0.2, source=0)
+    overlay = format_overlay(metrics_window.snapshot()["0"])
+    assert overlay.startswith("end_to_end") and "FPS" in overlay
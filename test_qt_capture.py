@@ -0,0 +1,130 @@
+import types
+
+import cv2
+import numpy as np
+import pytest
+
+from QtCapture import VideoFrameConverter, map_plane
+
+W, H = 10, 8   # ширина не кратна выравниванию строк: у плоскостей Qt бывает хвост в bytesPerLine
+
+
+def _planes(fmt):
+    """Плоскости кадра fmt без выравнивания (rows, row_bytes) и ожидаемый BGR по cv2.cvtColor."""
+    rng = np.random.default_rng(0)
+
+    def plane(rows, row_bytes):
+        return rng.integers(16, 240, (rows, row_bytes), dtype=np.uint8)
+
+    if fmt in ("NV12", "NV21"):
+        y, uv = plane(H, W), plane(H // 2, W)
+        code = cv2.COLOR_YUV2BGR_NV12 if fmt == "NV12" else cv2.COLOR_YUV2BGR_NV21
+        return [y, uv], cv2.cvtColor(np.vstack([y, uv]), code)
+    if fmt in ("YUYV", "UYVY"):
+        packed = plane(H, W * 2)
+        code = cv2.COLOR_YUV2BGR_YUYV if fmt == "YUYV" else cv2.COLOR_YUV2BGR_UYVY
+        return [packed], cv2.cvtColor(packed.reshape(H, W, 2), code)
+    if fmt in ("YUV420P", "YV12"):
+        y, first, second = plane(H, W), plane(H // 2, W // 2), plane(H // 2, W // 2)
+        code = cv2.COLOR_YUV2BGR_I420 if fmt == "YUV420P" else cv2.COLOR_YUV2BGR_YV12
+        i420 = np.vstack([y, first.reshape(H // 4, W), second.reshape(H // 4, W)])
+        return [y, first, second], cv2.cvtColor(i420, code)
+    if fmt == "BGRA8888":
+        bgra = plane(H, W * 4)
+        return [bgra], cv2.cvtColor(bgra.reshape(H, W, 4), cv2.COLOR_BGRA2BGR)
+    if fmt == "Y8":
+        gray = plane(H, W)
+        return [gray], cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+    raise ValueError(fmt)
+
+
+FORMATS = ["NV12", "NV21", "YUYV", "UYVY", "YUV420P", "YV12", "BGRA8888", "Y8"]
+
+
+def _fill(buf, stride, plane):
+    """Плоскость в буфер с шагом строки stride; хвосты строк — мусор, его читать нельзя."""
+    buf[:] = 0xEE
+    rows, row_bytes = plane.shape
+    for row in range(rows):
+        buf[row * stride:row * stride + row_bytes] = plane[row]
+
+
+class PaddedFrame:
+    """Отображённый кадр как у QVideoFrame: плоскости с шагом строки больше ширины."""
+
+    def __init__(self, fmt, planes, pad):
+        self.format = types.SimpleNamespace(name="Format_" + fmt)
+        self.strides = [plane.shape[1] + pad for plane in planes]
+        self.buffers = []
+        for plane, stride in zip(planes, self.strides):
+            buf = np.empty(plane.shape[0] * stride, np.uint8)
+            _fill(buf, stride, plane)
+            self.buffers.append(buf)
+
+    def pixelFormat(self):
+        return self.format
+
+    def bytesPerLine(self, plane):
+        return self.strides[plane]
+
+    def bits(self, plane):
+        return memoryview(self.buffers[plane])
+
+    def mappedBytes(self, plane):
+        return self.buffers[plane].size
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+@pytest.mark.parametrize("pad", [0, 6])
+def test_converter_respects_bytes_per_line(fmt, pad):
+    planes, expected = _planes(fmt)
+    out = np.empty((H, W, 3), np.uint8)
+    assert VideoFrameConverter().convert(PaddedFrame(fmt, planes, pad), out)
+    np.testing.assert_array_equal(out, expected)
+
+
+def test_map_plane_is_a_strided_view_without_padding():
+    frame = PaddedFrame("Y8", [np.arange(H * W, dtype=np.uint8).reshape(H, W)], pad=6)
+    view = map_plane(frame, 0, H, W)
+    assert view.shape == (H, W) and view.strides == (W + 6, 1)
+    assert not view.flags.writeable
+    assert np.shares_memory(view, frame.buffers[0])
+    np.testing.assert_array_equal(view, np.arange(H * W).reshape(H, W))
+    with pytest.raises(ValueError):
+        map_plane(frame, 0, H + 1, W)
+
+
+@pytest.fixture(scope="module")
+def multimedia():
+    # Без системных библиотек (libpulse и т. п.) модуль не грузится: ImportError, не ModuleNotFoundError
+    return pytest.importorskip("PySide6.QtMultimedia", exc_type=ImportError)
+
+
+def _video_frame(multimedia, fmt, planes):
+    """Настоящий QVideoFrame с плоскостями planes, записанными с шагом, который выбрал Qt."""
+    from PySide6.QtCore import QSize
+
+    QVideoFrame, QVideoFrameFormat = multimedia.QVideoFrame, multimedia.QVideoFrameFormat
+    frame = QVideoFrame(QVideoFrameFormat(QSize(W, H), getattr(QVideoFrameFormat.PixelFormat, "Format_" + fmt)))
+    assert frame.map(QVideoFrame.MapMode.WriteOnly)
+    try:
+        assert frame.planeCount() == len(planes)
+        for i, plane in enumerate(planes):
+            buf = np.frombuffer(frame.bits(i), np.uint8, frame.mappedBytes(i))
+            _fill(buf, frame.bytesPerLine(i), plane)
+    finally:
+        frame.unmap()
+    return frame
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_converter_on_qvideoframe(multimedia, fmt):
+    planes, expected = _planes(fmt)
+    frame = _video_frame(multimedia, fmt, planes)
+    out = np.empty((H, W, 3), np.uint8)
+    assert frame.map(multimedia.QVideoFrame.MapMode.ReadOnly)
+    try:
+        assert VideoFrameConverter().convert(frame, out)
+    finally:
+        frame.unmap()
+    np.testing.assert_array_equal(out, expected)
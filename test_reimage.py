@@ -0,0 +1,94 @@
+import cv2
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from depth_anything.util.postprocess import DepthColorizer  # noqa: E402
+from Reimage import ImageProcessor  # noqa: E402
+from StereoDepth import StereoCalibration  # noqa: E402
+
+W, H = 320, 240
+FOCAL = 256.0
+SHIFT = 40
+
+
+class FakeEstimator:
+    """Вместо DepthEstimator: сеть отдаёт константную depth, раскраска настоящая."""
+
+    def __init__(self):
+        self.colorizer = DepthColorizer()
+        self.temporal = None
+
+    def prepare(self, frames, keys):
+        return [frame.shape[:2] for frame in frames]
+
+    def run_prepared(self, prepared):
+        return [torch.ones(h // 14, w // 14) for h, w in prepared]
+
+    def colorize(self, depth, size, key=None):
+        return self.colorizer(depth, size, key)
+
+
+@pytest.fixture
+def calibration_path(tmp_path):
+    K = np.array([[FOCAL, 0, W / 2], [0, FOCAL, H / 2], [0, 0, 1]])
+    path = str(tmp_path / "rig.npz")
+    StereoCalibration(K, np.zeros(5), K, np.zeros(5), np.eye(3), [-0.1, 0, 0], (W, H)).save(path)
+    return path
+
+
+@pytest.fixture
+def processor():
+    processor = ImageProcessor()
+    processor.estimator = FakeEstimator()
+    processor._is_running = True
+    for _ in range(2):
+        processor.addSource()
+    shown = []
+    processor.processedFrame.connect(lambda source_id, colored, captured_at: shown.append(source_id))
+    processor.shown = shown
+    return processor
+
+
+def _putPair(processor):
+    rng = np.random.default_rng(0)
+    texture = cv2.GaussianBlur(rng.integers(0, 256, (H, W + SHIFT, 3), dtype=np.uint8), (0, 0), 1.0)
+    processor.mailboxes[0].put(np.ascontiguousarray(texture[:, :W]))
+    processor.mailboxes[1].put(np.ascontiguousarray(texture[:, SHIFT:SHIFT + W]))
+
+
+def _step(processor, item):
+    """Хвост итерации run() после _applyRequests(): forward и показ."""
+    depths = processor.estimator.run_prepared(item.prepared) if item.prepared is not None else []
+    if item.stereo is not None:
+        processor._emitStereo(item.stereo, depths[len(item.source_ids):])
+
+
+@pytest.mark.parametrize("mode", ["stereo", "hybrid"])
+@pytest.mark.parametrize("switch_to", [None, "stereo"])
+def test_stereo_change_while_step_pending(processor, calibration_path, mode, switch_to):
+    processor.setStereo(mode, calibration_path, hybrid_interval=1)
+    processor._applyRequests()
+    _putPair(processor)
+
+    # Шаг подготовлен (как в потоке prefetch), затем GUI меняет режим пары
+    item = processor._prepareNext()
+    assert item.stereo is not None and item.stereo.reference == (mode == "hybrid")
+    started_with = processor.stereo
+    processor.setStereo(switch_to, calibration_path)
+    processor._applyRequests()
+    assert processor.stereo is not started_with
+
+    _step(processor, item)
+    assert processor.shown == [0, 1]
+    if mode == "hybrid":
+        assert started_with.reference is not None
+
+    # Дальше пара идёт уже по новому режиму
+    _putPair(processor)
+    item = processor._prepareNext()
+    if switch_to is None:
+        assert item.stereo is None and item.source_ids == [0, 1]
+    else:
+        assert item.stereo.stereo is processor.stereo
@@ -0,0 +1,105 @@
+import threading
+
+import numpy as np
+import pytest
+
+from SharedRing import FrameRing, ShmSlots, as_array, release
+
+
+def test_refcount_frees_slot_after_last_release():
+    ring = FrameRing(2, (4, 4, 3))
+    a = ring.acquire()
+    a.retain()                      # ещё одна ссылка, например ящик обработчика
+    b = ring.acquire()
+    assert ring.acquire() is None   # политика drop: оба слота заняты
+    assert ring.stats() == {"slots": 2, "in_use": 2, "dropped": 1}
+
+    a.release()
+    assert ring.in_use() == 2       # ссылка ящика ещё держит слот
+    a.release()
+    assert ring.in_use() == 1
+    c = ring.acquire()
+    assert c.slot == a.slot and c.frame_id != a.frame_id
+    b.release()
+    c.release()
+    assert ring.in_use() == 0
+
+
+def test_stale_handle_is_rejected():
+    ring = FrameRing(1, (2, 2))
+    old = ring.acquire()
+    old.release()
+    new = ring.acquire()
+    # Слот уже отдан под другой кадр: старый handle его не трогает
+    with pytest.raises(RuntimeError):
+        old.release()
+    with pytest.raises(RuntimeError):
+        old.retain()
+    new.release()
+
+
+def test_slots_are_preallocated_and_rotate():
+    ring = FrameRing(3, (2, 2))
+    slots = []
+    for _ in range(4):
+        handle = ring.acquire()
+        slots.append(handle.slot)
+        assert np.shares_memory(handle.array, ring.arrays)
+        handle.release()
+    # Только что отпущенный слот сразу не берётся
+    assert slots == [0, 1, 2, 0]
+
+
+def test_wait_policy_blocks_until_release():
+    ring = FrameRing(1, (2, 2), policy="wait")
+    held = ring.acquire()
+    assert ring.acquire(timeout=0.01) is None
+
+    timer = threading.Timer(0.05, held.release)
+    timer.start()
+    handle = ring.acquire(timeout=2.0)
+    timer.join()
+    assert handle is not None
+    handle.release()
+
+
+def test_context_manager_and_helpers():
+    ring = FrameRing(1, (2, 2))
+    with ring.acquire() as handle:
+        handle.array[...] = 7
+        assert as_array(handle) is handle.array
+    assert ring.in_use() == 0
+    plain = np.zeros(2)
+    assert as_array(plain) is plain
+    release(plain)   # обычный массив ничего не держит
+
+
+def test_shared_ring_token_round_trip():
+    ring = FrameRing(2, (3, 3), shared=True)
+    try:
+        peer = FrameRing.attach(ring.spec())
+        handle = ring.acquire()
+        handle.array[...] = 5
+        handle.retain()             # ссылка за получателя
+        received = peer.open(handle.token())
+        np.testing.assert_array_equal(received.array, 5)
+        received.release()
+        handle.release()
+        assert ring.in_use() == 0
+        with pytest.raises(RuntimeError):
+            peer.open(handle.token())
+        peer.close()
+    finally:
+        ring.close()
+
+
+def test_shm_slots_reject_oversized_array():
+    slots = ShmSlots(2, 16)
+    try:
+        slots.write(1, np.arange(4, dtype=np.float32))
+        np.testing.assert_array_equal(slots.view(1, (4,), np.float32), np.arange(4))
+        with pytest.raises(ValueError):
+            slots.write(0, np.zeros(5, np.float32))
+    finally:
+        slots.close()
+        slots.unlink()
@@ -0,0 +1,98 @@
+import cv2
+import numpy as np
+import pytest
+
+from StereoDepth import StereoCalibration, StereoDepth
+
+W, H = 320, 240
+FOCAL = 256.0
+BASELINE = 0.1
+SHIFT = 40  # диспаратность, px: depth = FOCAL * BASELINE / SHIFT
+
+
+@pytest.fixture
+def calibration():
+    K = np.array([[FOCAL, 0, W / 2], [0, FOCAL, H / 2], [0, 0, 1]])
+    return StereoCalibration(K, np.zeros(5), K, np.zeros(5), np.eye(3), [-BASELINE, 0, 0], (W, H))
+
+
+def _pair(shift=SHIFT, flat=None):
+    """Текстура и её сдвиг на shift px: точка x левого кадра — в x - shift правого."""
+    rng = np.random.default_rng(0)
+    texture = cv2.GaussianBlur(rng.integers(0, 256, (H, W + shift, 3), dtype=np.uint8), (0, 0), 1.0)
+    left = np.ascontiguousarray(texture[:, :W])
+    right = np.ascontiguousarray(texture[:, shift:shift + W])
+    if flat is not None:
+        left[flat] = 128
+        right[flat] = 128
+    return left, right
+
+
+def test_compute_recovers_metric_depth(calibration):
+    stereo = StereoDepth(calibration, num_disparities=64)
+    left, right = _pair()
+    result = stereo.compute(left, right)
+
+    assert result.rectified.shape == (H, W, 3)
+    assert result.valid.mean() > 0.5
+    assert np.median(result.disparity[result.valid]) == pytest.approx(SHIFT, abs=0.5)
+    assert np.median(result.depth[result.valid]) == pytest.approx(FOCAL * BASELINE / SHIFT, rel=0.02)
+    assert not result.depth[~result.valid].any()
+
+
+def test_downscale_keeps_depth_metric(calibration):
+    stereo = StereoDepth(calibration, num_disparities=64, downscale=2)
+    left, right = _pair()
+    result = stereo.compute(left, right)
+
+    assert result.depth.shape == (H // 2, W // 2)
+    assert np.median(result.disparity[result.valid]) == pytest.approx(SHIFT / 2, abs=0.5)
+    assert np.median(result.depth[result.valid]) == pytest.approx(FOCAL * BASELINE / SHIFT, rel=0.03)
+
+
+def test_calibration_save_load_and_scaled(calibration, tmp_path):
+    path = str(tmp_path / "rig.npz")
+    calibration.save(path)
+    loaded = StereoCalibration.load(path)
+    np.testing.assert_array_equal(loaded.K1, calibration.K1)
+    np.testing.assert_array_equal(loaded.T, calibration.T)
+    assert loaded.image_size == (W, H)
+
+    K1, _ = calibration.scaled((W * 2, H))
+    assert K1[0, 0] == FOCAL * 2 and K1[0, 2] == W
+    assert K1[1, 1] == FOCAL and K1[1, 2] == H / 2
+
+
+def test_hybrid_fills_holes_from_reference(calibration):
+    stereo = StereoDepth(calibration, num_disparities=64, hybrid_interval=3)
+    flat = (slice(80, 160), slice(100, 200))
+    left, right = _pair(flat=flat)
+
+    result = stereo.compute(left, right)
+    assert stereo.needs_reference()
+    assert stereo.fuse(result) is result.depth   # без reference — стерео как есть
+    assert not result.valid[flat].all()
+
+    # Сеть даёт обратную глубину с точностью до масштаба и сдвига: 1/Z = s * rel + t
+    inverse = SHIFT / (FOCAL * BASELINE)
+    stereo.set_reference(np.full((H // 2, W // 2), (inverse - 0.5) / 3.0, np.float32))
+    fused = stereo.fuse(result)
+
+    assert (fused > 0).all()
+    np.testing.assert_array_equal(fused[result.valid], result.depth[result.valid])
+    # Подгонка МНК по всем валидным пикселям, включая редкие ложные совпадения у краёв
+    assert np.median(fused[~result.valid]) == pytest.approx(FOCAL * BASELINE / SHIFT, rel=0.05)
+    assert stereo.fit is not None
+
+    stereo.compute(left, right)
+    assert not stereo.needs_reference()
+    stereo.compute(left, right)
+    assert stereo.needs_reference()
+
+
+def test_quantize_is_inverse_depth():
+    depth = np.array([[0.0, 1.0], [2.0, 4.0]], np.float32)
+    u8 = StereoDepth.quantize(depth)
+    assert u8.dtype == np.uint8
+    assert u8[0, 0] == 0
+    assert u8[0, 1] > u8[1, 0] > u8[1, 1] > 0
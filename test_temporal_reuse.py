@@ -0,0 +1,78 @@
+import cv2
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from TemporalReuse import TemporalReuse  # noqa: E402
+
+DEPTH_SIZE = (56, 70)
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    # Крупная текстура: детали переживают уменьшение до миниатюры
+    coarse = rng.integers(0, 256, (24, 32, 3), dtype=np.uint8)
+    return cv2.resize(coarse, (320, 240), interpolation=cv2.INTER_CUBIC)
+
+
+def _computed(reuse, key, frame, value=1.0):
+    """Кадр «посчитан сетью»: становится keyframe'ом источника key."""
+    thumb = reuse.thumbnail(frame)
+    depth = torch.full(DEPTH_SIZE, value)
+    reuse.update(key, thumb, depth)
+    return depth
+
+
+def test_static_frame_reuses_keyframe_depth(frame):
+    reuse = TemporalReuse(threshold=0.02)
+    depth = _computed(reuse, 0, frame)
+    noisy = cv2.add(frame, np.full_like(frame, 1))
+    assert reuse.lookup(0, reuse.thumbnail(noisy), DEPTH_SIZE) is depth
+    assert reuse.stats(0)["reused"] == 1
+    assert reuse.stats(0)["motion"] < 0.02
+
+
+def test_changed_frame_is_recomputed(frame):
+    reuse = TemporalReuse(threshold=0.02)
+    _computed(reuse, 0, frame)
+    assert reuse.lookup(0, reuse.thumbnail(255 - frame), DEPTH_SIZE) is None
+    assert reuse.stats(0)["motion"] > 0.02
+
+
+def test_keyframe_interval_bounds_reuse(frame):
+    reuse = TemporalReuse(threshold=0.02, keyframe_interval=3)
+    _computed(reuse, 0, frame)
+    thumb = reuse.thumbnail(frame)
+    hits = [reuse.lookup(0, thumb, DEPTH_SIZE) is not None for _ in range(5)]
+    assert hits == [True, True, True, False, False]
+    _computed(reuse, 0, frame)
+    assert reuse.lookup(0, thumb, DEPTH_SIZE) is not None
+
+
+def test_sources_resolution_and_reset(frame):
+    reuse = TemporalReuse()
+    _computed(reuse, 0, frame)
+    thumb = reuse.thumbnail(frame)
+    assert reuse.lookup(1, thumb, DEPTH_SIZE) is None           # у другой камеры свой keyframe
+    assert reuse.lookup(0, thumb, (28, 35)) is None             # разрешение сети сменилось
+    reuse.reset(0)
+    assert reuse.lookup(0, thumb, DEPTH_SIZE) is None
+    assert reuse.stats(0)["recomputed"] == 1
+
+
+def test_warp_follows_slow_pan(frame):
+    shifted = np.roll(frame, 10, axis=1)   # панорама: 10 px по x = 2 px миниатюры 64 px
+    plain = TemporalReuse(threshold=0.02)
+    _computed(plain, 0, frame)
+    assert plain.lookup(0, plain.thumbnail(shifted), DEPTH_SIZE) is None
+
+    warp = TemporalReuse(threshold=0.02, warp=True)
+    keyframe_depth = torch.arange(DEPTH_SIZE[1], dtype=torch.float32).expand(DEPTH_SIZE).clone()
+    warp.update(0, warp.thumbnail(frame), keyframe_depth)
+    depth = warp.lookup(0, warp.thumbnail(shifted), DEPTH_SIZE)
+    assert depth is not None and depth.shape == DEPTH_SIZE
+    # Карта сдвинута вслед за кадром: примерно на 10 * 70 / 320 ≈ 2.2 px depth
+    offset = (keyframe_depth[:, 20:50] - depth[:, 20:50]).mean().item()
+    assert offset == pytest.approx(10 * DEPTH_SIZE[1] / 320, abs=0.5)
@@ -0,0 +1,31 @@
+import importlib.util
+import os
+
+import pytest
+
+torch = pytest.importorskip("torch")
+huggingface_hub = pytest.importorskip("huggingface_hub")
+
+from depth_anything import weights  # noqa: E402
+
+
+@pytest.mark.skipif(importlib.util.find_spec("safetensors") is not None,
+                    reason="проверяется путь без пакета safetensors")
+def test_cache_built_from_bin_without_safetensors(tmp_path, monkeypatch):
+    hub = tmp_path / "hub"
+    hub.mkdir()
+    (hub / "model.safetensors").write_bytes(b"not readable without safetensors")
+    torch.save({"w": torch.arange(4.0)}, hub / "pytorch_model.bin")
+
+    requested = []
+
+    def fake_download(repo, filename, local_files_only=False):
+        requested.append(filename)
+        return str(hub / filename)
+
+    monkeypatch.setattr(huggingface_hub, "hf_hub_download", fake_download)
+    state_dict = weights.load_state_dict("vits", cache_dir=str(tmp_path / "cache"))
+
+    assert requested == ["pytorch_model.bin"]
+    torch.testing.assert_close(state_dict["w"], torch.arange(4.0))
+    assert os.path.exists(weights.cached_weights_path("vits", str(tmp_path / "cache")))